@@ -0,0 +1,438 @@
+"""Headless batch rendering of images with a display recipe.
+
+A recipe (see render.recipe) describes how images are displayed (limits,
+stretch, colormap or the bands of a composite), batches use recipes
+without a source so the same recipe applies to every file. Every input
+file is opened with the same lazy readers the GUI uses, rendered with the
+recipe and streamed to an output file by writers.export.export_recipe, so
+batch outputs match what the viewer shows.
+
+Files are rendered in parallel by a process pool. Each file is rendered in
+isolation (a file which fails to render is recorded and the rest carry
+on), its timing is recorded, and every result is appended to a progress
+log in the output directory as soon as it arrives. Each record holds the
+digest of the recipe it was rendered with, re-running a batch skips the
+files already rendered with the same recipe, so an interrupted batch
+resumes where it stopped and only changed recipes cause re-renders.
+
+An example recipe (recipes can also be TOML):
+
+    {
+        "limits": {"mode": "percentile", "low": 0.5, "high": 99.5},
+        "stretch": {"name": "asinh", "param": 0.05},
+        "cmap": "viridis",
+        "hdu": 1
+    }
+
+A composite recipe lists its bands (the datasets/HDUs of each file):
+
+    {
+        "composite": [
+            {"hdu": 1, "color": [1, 0, 0], "limits": [0, 120]},
+            {"hdu": 2, "color": [0, 1, 0], "stretch": "sqrt"},
+            {"hdu": 3, "color": [0, 0, 1]}
+        ]
+    }
+
+Example usage:
+
+    image-mage --batch recipe.json -o rendered/ -f png nightly/*.fits
+"""
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from imagemage.readers.formats import INPUT_FORMATS
+from imagemage.render.recipe import Recipe
+from imagemage.writers.export import (
+    DEFAULT_STRIP_BYTES,
+    EXPORT_FORMATS,
+    export_recipe,
+)
+
+# The name of the progress log written to the output directory
+PROGRESS_LOG = "imagemage_batch.jsonl"
+
+# The number of times a file is attempted if its worker process dies
+MAX_ATTEMPTS = 2
+
+# The queue a worker process reports each file it starts on (see
+# _init_worker)
+_started = None
+
+
+def find_inputs(paths):
+    """
+    Expand the input paths, directories give every image file inside them.
+
+    Files found in a directory are named by their path relative to it, so
+    the directory's layout is mirrored in the output directory and files
+    with the same name in different subdirectories don't overwrite each
+    other.
+
+    Args:
+        paths (list): Files and directories.
+
+    Returns:
+        dict: The output name (see output_path) of each image file, in a
+            stable order.
+    """
+    inputs = {}
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() not in INPUT_FORMATS:
+                        continue
+                    filepath = os.path.join(root, name)
+                    inputs[filepath] = os.path.splitext(
+                        os.path.relpath(filepath, path)
+                    )[0]
+        else:
+            inputs[path] = os.path.splitext(os.path.basename(path))[0]
+    return inputs
+
+
+def output_path(name, output_dir, fmt):
+    """
+    Get the file an input is rendered to.
+
+    Args:
+        name (str): The input's output name (see find_inputs), a path
+            relative to the output directory without the extension.
+        output_dir (str): The directory outputs are written to.
+        fmt (str): The output file extension (without the dot).
+
+    Returns:
+        str: The path to the output file.
+    """
+    return os.path.join(output_dir, f"{name}.{fmt}")
+
+
+def _check_outputs(inputs, output_dir, fmt):
+    """
+    Get the output of each input, making sure no two inputs share one.
+
+    Args:
+        inputs (dict): The output name of each input file.
+        output_dir (str): The directory outputs are written to.
+        fmt (str): The output file extension (without the dot).
+
+    Returns:
+        dict: The path to the output file of each input file.
+
+    Raises:
+        ValueError: If two inputs would be rendered to the same file (e.g.
+            a.fits and a.h5 in the same directory).
+    """
+    outputs = {}
+    claimed = {}
+    for filepath, name in inputs.items():
+        output = output_path(name, output_dir, fmt)
+        key = os.path.normcase(os.path.abspath(output))
+        if key in claimed:
+            raise ValueError(
+                f"{claimed[key]} and {filepath} would both be rendered to "
+                f"{output}"
+            )
+        claimed[key] = filepath
+        outputs[filepath] = output
+    return outputs
+
+
+def _init_worker(started):
+    """Set up a worker process to report the files it starts on."""
+    global _started
+    _started = started
+
+
+def render_file(filepath, recipe, output, strip_bytes):
+    """
+    Render one file with a recipe.
+
+    This runs in a worker process, any error is caught and returned in the
+    file's record rather than stopping the batch.
+
+    Args:
+        filepath (str): The path to the input file.
+        recipe (Recipe): The display recipe.
+        output (str): The path to the output file.
+        strip_bytes (int): The memory available for one rendered strip.
+
+    Returns:
+        dict: The file's record (input, output, recipe digest, status,
+            seconds and the error if it failed).
+    """
+    # Let the batch know this file was running if the worker dies
+    if _started is not None:
+        _started.put(filepath)
+
+    start = time.perf_counter()
+    record = {
+        "input": filepath,
+        "output": output,
+        "recipe": recipe.digest(include_source=False),
+        "status": "ok",
+    }
+
+    try:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        export_recipe(
+            output,
+            recipe,
+            source=filepath,
+            strip_bytes=strip_bytes,
+        )
+    except Exception as err:
+        record["status"] = "failed"
+        record["error"] = f"{type(err).__name__}: {err}"
+        record["traceback"] = traceback.format_exc()
+
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def read_progress(log_path):
+    """
+    Read the records of the files a previous batch finished.
+
+    Args:
+        log_path (str): The path to the progress log.
+
+    Returns:
+        dict: The latest record of each input file.
+    """
+    records = {}
+    if not os.path.exists(log_path):
+        return records
+
+    with open(log_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted batch
+                continue
+            records[record["input"]] = record
+
+    return records
+
+
+def run_batch(
+    inputs,
+    recipe,
+    output_dir,
+    fmt="png",
+    workers=None,
+    resume=True,
+    strip_bytes=DEFAULT_STRIP_BYTES,
+    report=None,
+):
+    """
+    Render many files with a recipe in parallel.
+
+    Args:
+        inputs (list/dict): The paths to the input files, or the output
+            name of each (see find_inputs, files are named by their name
+            without the extension if a list).
+        recipe (Recipe): The display recipe.
+        output_dir (str): The directory outputs (and the progress log) are
+            written to.
+        fmt (str): The output file extension (without the dot), one of
+            writers.export.EXPORT_FORMATS.
+        workers (int): The number of worker processes (one per core if
+            None).
+        resume (bool): Whether to skip files a previous run of the batch
+            rendered with the same recipe.
+        strip_bytes (int): The memory available to each worker for one
+            rendered strip.
+        report (callable): An optional function called with each file's
+            record (and the number done and total) as it finishes.
+
+    Returns:
+        list: The records of the files rendered by this run.
+
+    Raises:
+        ValueError: If the format isn't supported or two inputs would be
+            rendered to the same file.
+    """
+    if f".{fmt}" not in EXPORT_FORMATS:
+        raise ValueError(f"Can't export to {fmt} files")
+    if not isinstance(inputs, dict):
+        inputs = {
+            path: os.path.splitext(os.path.basename(path))[0]
+            for path in inputs
+        }
+    outputs = _check_outputs(inputs, output_dir, fmt)
+
+    os.makedirs(output_dir, exist_ok=True)
+    log_path = os.path.join(output_dir, PROGRESS_LOG)
+
+    # Skip what a previous run rendered with this recipe (and whose output
+    # still exists)
+    digest = recipe.digest(include_source=False)
+    pending = list(dict.fromkeys(inputs))
+    if resume:
+        done = read_progress(log_path)
+        pending = [
+            path
+            for path in pending
+            if not (
+                path in done
+                and done[path]["status"] == "ok"
+                and done[path].get("recipe") == digest
+                and done[path]["output"] == outputs[path]
+                and os.path.exists(done[path]["output"])
+            )
+        ]
+
+    records = []
+    attempts = dict.fromkeys(pending, 0)
+    total = len(pending)
+    with open(log_path, "a") as log:
+        # A worker dying (e.g. killed for using too much memory) breaks the
+        # pool, every file not yet finished is resubmitted to a fresh pool
+        # but only those which were running use up an attempt
+        while pending:
+            retry = []
+            broken = []
+            started = multiprocessing.SimpleQueue()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(started,),
+            ) as pool:
+                futures = {
+                    pool.submit(
+                        render_file,
+                        path,
+                        recipe,
+                        outputs[path],
+                        strip_bytes,
+                    ): path
+                    for path in pending
+                }
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool as err:
+                        broken.append((path, err))
+                        continue
+                    _log_record(log, record, records, total, report)
+
+            running = set()
+            while not started.empty():
+                running.add(started.get())
+            started.close()
+
+            # If no file was seen starting, count them all so a file which
+            # kills its worker can't be retried forever
+            crashed = [path for path, _ in broken if path in running]
+            if not crashed:
+                crashed = [path for path, _ in broken]
+
+            for path, err in broken:
+                if path not in crashed:
+                    retry.append(path)
+                    continue
+                attempts[path] += 1
+                if attempts[path] < MAX_ATTEMPTS:
+                    retry.append(path)
+                    continue
+                record = {
+                    "input": path,
+                    "output": outputs[path],
+                    "recipe": digest,
+                    "status": "failed",
+                    "error": f"Worker process died: {err}",
+                    "seconds": None,
+                }
+                _log_record(log, record, records, total, report)
+
+            pending = retry
+
+    return records
+
+
+def _log_record(log, record, records, total, report):
+    """Append a finished file's record to the progress log and report it."""
+    log.write(json.dumps(record) + "\n")
+    log.flush()
+    records.append(record)
+    if report is not None:
+        report(record, len(records), total)
+
+
+def print_record(record, ndone, total):
+    """
+    Print a line for a finished file.
+
+    Args:
+        record (dict): The file's record.
+        ndone (int): The number of files finished.
+        total (int): The number of files in the batch.
+    """
+    width = len(str(total))
+    seconds = record["seconds"]
+    timing = "      -" if seconds is None else f"{seconds:6.2f}s"
+    line = (
+        f"[{ndone:>{width}}/{total}] {record['status']:<6} {timing} "
+        f"{record['input']}"
+    )
+    if record["status"] != "ok":
+        line += f" ({record['error']})"
+    print(line, flush=True)
+
+
+def main(args):
+    """
+    Run a batch from the parsed command line arguments.
+
+    Args:
+        args (argparse.Namespace): The arguments (see run.main).
+
+    Returns:
+        int: The exit status, 1 if any file failed.
+    """
+    recipe = Recipe.load(args.batch)
+    inputs = find_inputs(args.files)
+    fmt = args.format.lstrip(".").lower()
+
+    start = time.perf_counter()
+    try:
+        records = run_batch(
+            inputs,
+            recipe,
+            args.output_dir,
+            fmt=fmt,
+            workers=args.workers,
+            resume=not args.no_resume,
+            report=print_record,
+        )
+    except ValueError as err:
+        print(f"Can't run the batch: {err}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - start
+
+    failed = [record for record in records if record["status"] != "ok"]
+    skipped = len(inputs) - len(records)
+    print(
+        f"Rendered {len(records) - len(failed)} files in {elapsed:.1f}s "
+        f"({len(failed)} failed, {skipped} already done)",
+        file=sys.stderr,
+    )
+    if failed:
+        print(
+            "Failures are recorded in "
+            f"{os.path.join(args.output_dir, PROGRESS_LOG)}",
+            file=sys.stderr,
+        )
+
+    return 1 if failed else 0
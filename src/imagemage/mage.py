@@ -1,10 +1,16 @@
+import os
+
 from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtCore import Qt, pyqtSignal, QSize
 from PyQt5 import QtCore, QtWidgets
 
 from imagemage import styles_dir
+from imagemage.readers.formats import source_location
+from imagemage.tools.cube import CubeWidget
+from imagemage.tools.gallery import GalleryWidget
 from imagemage.widgets.image import ImageView
 from imagemage.widgets.menu import MenuBar
+from imagemage.widgets.session_tabs import SessionTabs
 from imagemage.widgets.toolbar import ToolBar
 from imagemage.widgets.workspace import Workspace
 from imagemage.widgets.utility_widgets import SideGrip
@@ -16,9 +22,12 @@ class ImageMage(QMainWindow):
     # Signal emitted when the window is resized
     windowResized = pyqtSignal(QSize)
 
-    def __init__(self):
+    def __init__(self, memory_budget=None):
         super().__init__()
 
+        # The memory budget shared by the open images (bytes)
+        self.memory_budget = memory_budget
+
         self.setupMainWindowStyles()
         self.initUI()
         self.initSignals()
@@ -56,12 +65,34 @@ class ImageMage(QMainWindow):
         self.workspace = Workspace(self)
         self.setCentralWidget(self.workspace)
 
-        self.image_view = ImageView(self)
+        # The image view below a tab for each open image
+        image_panel = QtWidgets.QWidget(self)
+        self.session_tabs = SessionTabs(image_panel)
+        self.image_view = ImageView(image_panel)
+        if self.memory_budget is not None:
+            self.image_view.session.budget = self.memory_budget
+        layout = QtWidgets.QVBoxLayout(image_panel)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self.session_tabs)
+        layout.addWidget(self.image_view, stretch=1)
         self.addDockWidget(
             Qt.LeftDockWidgetArea,
-            self.createDockWidget(self.image_view, "Image"),
+            self.createDockWidget(image_panel, "Image"),
         )
 
+        # The plane controls, only shown while a data cube is open
+        self.cube_widget = CubeWidget(self)
+        self.cube_dock = self.createDockWidget(self.cube_widget, "Cube")
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.cube_dock)
+        self.cube_dock.hide()
+
+        # Thumbnails of the images in a directory (shown from the View menu)
+        self.gallery = GalleryWidget(self)
+        self.gallery_dock = self.createDockWidget(self.gallery, "Gallery")
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.gallery_dock)
+        self.gallery_dock.hide()
+
         self.menuBar = MenuBar(self)
         self.setMenuBar(self.menuBar)
 
@@ -82,6 +113,40 @@ class ImageMage(QMainWindow):
         self.toolbar.toolSelected.connect(self.workspace.toolSelected)
         self.workspace.histChanged.connect(self.image_view.update_vlims)
         self.image_view.imgOpened.connect(self.workspace.emit_img_loaded)
+        self.image_view.compositeChanged.connect(
+            self.workspace.emit_composite_changed
+        )
+        self.image_view.displayChanged.connect(
+            self.workspace.emit_display_changed
+        )
+        self.workspace.bandSelected.connect(self.image_view.set_active_band)
+        self.workspace.bandColorChanged.connect(self.image_view.set_band_color)
+        self.image_view.cubeOpened.connect(self.cube_widget.set_nplanes)
+        self.image_view.cubeOpened.connect(
+            lambda nplanes: self.cube_dock.setVisible(nplanes > 0)
+        )
+        self.image_view.cubeViewShown.connect(self.cube_widget.show_view)
+        self.cube_widget.planeSelected.connect(self.image_view.set_plane)
+        self.cube_widget.viewSelected.connect(self.image_view.set_cube_view)
+        self.image_view.sessionChanged.connect(self.session_tabs.set_session)
+        self.session_tabs.imageSelected.connect(self.image_view.switch_image)
+        self.session_tabs.imageClosed.connect(self.image_view.close_image)
+        self.gallery.imageActivated.connect(self.image_view.open_location)
+        self.gallery_dock.visibilityChanged.connect(self.follow_image)
+        self.image_view.sessionChanged.connect(self.follow_image)
+
+    def follow_image(self, *args):
+        """Show the directory of the image shown in the gallery (if it
+        doesn't have one yet)."""
+        if self.gallery.directory is not None:
+            return
+        if not self.gallery_dock.isVisible():
+            return
+        if self.image_view.img_reader is None:
+            return
+        source = source_location(self.image_view.img_reader)["source"]
+        if source is not None:
+            self.gallery.set_directory(os.path.dirname(source))
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -0,0 +1,480 @@
+"""Definition of the DataCube and CubePlane classes.
+
+A data cube is a 3D dataset (planes x rows x columns, e.g. wavelength or
+time x y x x) in an HDF5 or FITS file. The cube is never read into memory:
+it is displayed one plane at a time, each plane read from the lazy reader
+when it is needed.
+
+Scrubbing through the planes stays smooth because the planes around the
+one being shown are read ahead on a background thread, in the direction
+the user is moving, into a small least recently used cache of decoded
+planes (each with the pyramid it is rendered from). Reads which are no
+longer wanted, e.g. after a change of direction, are dropped before they
+start.
+
+Collapsed views (the sum, mean or maximum along an axis) are computed in
+chunks: the cube is streamed in storage order a block of planes (or rows
+of a plane) at a time within a byte budget and each block is folded into
+the result.
+
+Example usage:
+
+    cube = DataCube(HDF5Image("ifu.hdf5", "flux"))
+    pyramid = cube.plane_pyramid(250)
+    cube.prefetch(250, step=1)
+    white_light = cube.collapse("sum")
+"""
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from imagemage.readers.sampling import sample_pixels
+from imagemage.render.cache import RenderCache
+from imagemage.render.pyramid import ImagePyramid
+
+# The default memory budget for decoded planes and their pyramids (bytes)
+DEFAULT_PLANE_CACHE_BUDGET = 512 * 2**20
+
+# The number of planes read ahead in the direction of travel
+PREFETCH_AHEAD = 4
+
+# The number of planes read behind (for turning back)
+PREFETCH_BEHIND = 1
+
+# The approximate number of bytes read per chunk when collapsing
+COLLAPSE_CHUNK_BYTES = 64 * 2**20
+
+# The ways a cube can be collapsed along an axis
+COLLAPSE_OPS = ("sum", "mean", "max")
+
+# The maximum number of planes sampled for the cube's statistics
+SAMPLE_PLANES = 16
+
+
+def is_cube(reader):
+    """
+    Whether an image should be displayed as a data cube.
+
+    Colour images are also 3D but have 3 or 4 channels along their last
+    axis, anything else 3D is a stack of planes along the first axis.
+
+    Args:
+        reader (array-like): The image.
+
+    Returns:
+        bool: Whether the image is a cube.
+    """
+    return len(reader.shape) == 3 and reader.shape[-1] not in (3, 4)
+
+
+class CubePlane:
+    """
+    One plane of a cube as a lazy 2D image.
+
+    The object behaves like a read only 2D numpy array, slicing it only
+    reads the slice of its plane from the cube's reader.
+
+    Attributes:
+        reader (array-like): The cube's reader.
+        index (int): The index of the plane.
+    """
+
+    def __init__(self, reader, index):
+        """
+        Set up the plane.
+
+        Args:
+            reader (array-like): The cube's (lazy) reader.
+            index (int): The index of the plane.
+        """
+        self.reader = reader
+        self.index = index
+
+    @property
+    def shape(self):
+        return tuple(self.reader.shape[1:])
+
+    @property
+    def dtype(self):
+        return self.reader.dtype
+
+    @property
+    def ndim(self):
+        return 2
+
+    def __getitem__(self, key):
+        if key is Ellipsis:
+            key = ()
+        if not isinstance(key, tuple):
+            key = (key,)
+        return self.reader[(self.index,) + key]
+
+    def close(self):
+        """Nothing to close, the cube owns the reader."""
+
+
+class DataCube:
+    """
+    A lazy 3D cube displayed one plane at a time.
+
+    Attributes:
+        reader (array-like): The cube's (lazy) reader.
+        cache (RenderCache): The pyramids of recently read planes, keyed
+            by (plane,).
+        prefetch_ahead (int): The number of planes read ahead.
+        prefetch_behind (int): The number of planes read behind.
+    """
+
+    def __init__(
+        self,
+        reader,
+        cache_budget=DEFAULT_PLANE_CACHE_BUDGET,
+        prefetch_ahead=PREFETCH_AHEAD,
+        prefetch_behind=PREFETCH_BEHIND,
+    ):
+        """
+        Set up the cube (nothing is read).
+
+        Args:
+            reader (array-like): The (3D) reader.
+            cache_budget (int): The maximum number of bytes of decoded
+                planes to keep.
+            prefetch_ahead (int): The number of planes read ahead.
+            prefetch_behind (int): The number of planes read behind.
+        """
+        if len(reader.shape) != 3:
+            raise ValueError(
+                f"A data cube must be 3D, got shape {reader.shape}"
+            )
+
+        self.reader = reader
+        self.cache = RenderCache(cache_budget)
+        self.prefetch_ahead = prefetch_ahead
+        self.prefetch_behind = prefetch_behind
+
+        # Planes are read in the background one at a time (in the order
+        # they were asked for), the cache is shared with the reads
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="imagemage-cube"
+        )
+        self._pending = {}
+
+        # The collapsed views (small, expensive and never evicted), computed
+        # on their own thread so plane reads never queue behind a collapse
+        self._collapsed = {}
+        self._collapse_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="imagemage-collapse"
+        )
+
+    @property
+    def filepath(self):
+        return getattr(self.reader, "filepath", None)
+
+    @property
+    def shape(self):
+        return tuple(self.reader.shape)
+
+    @property
+    def dtype(self):
+        return self.reader.dtype
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def nplanes(self):
+        return self.reader.shape[0]
+
+    @property
+    def plane_shape(self):
+        return tuple(self.reader.shape[1:])
+
+    def plane_view(self, index):
+        """
+        Get a lazy view of a plane (nothing is read).
+
+        Args:
+            index (int): The index of the plane.
+
+        Returns:
+            CubePlane: The plane.
+        """
+        return CubePlane(self.reader, index)
+
+    def sample(self, nsamples):
+        """
+        Sample the cube's pixel values from planes spread through it.
+
+        Args:
+            nsamples (int): The (approximate) number of pixels to sample.
+
+        Returns:
+            np.ndarray: The flattened sample.
+        """
+        nplanes = min(self.nplanes, SAMPLE_PLANES)
+        indices = np.linspace(0, self.nplanes - 1, nplanes).round()
+        per_plane = max(1, nsamples // nplanes)
+        return np.concatenate(
+            [
+                sample_pixels(self.plane_view(int(index)), per_plane)
+                for index in indices
+            ]
+        )
+
+    def _read_plane(self, index):
+        """Read a plane and build its pyramid (any thread)."""
+        with self._lock:
+            pyramid = self.cache.get((index,))
+        if pyramid is not None:
+            return pyramid
+
+        # Planes too big to cache are rendered lazily like any large image
+        plane = self.plane_view(index)
+        plane_bytes = math.prod(self.plane_shape) * self.dtype.itemsize
+        if plane_bytes <= self.cache.budget // 2:
+            plane = np.asarray(plane[...])
+        pyramid = ImagePyramid(plane)
+
+        nbytes = sum(level.nbytes for level in pyramid.levels.values())
+        if isinstance(plane, np.ndarray):
+            nbytes += plane.nbytes
+        with self._lock:
+            self.cache.put((index,), pyramid, nbytes)
+        return pyramid
+
+    def cached_pyramid(self, index):
+        """
+        Get the pyramid of a plane if it has already been read.
+
+        Args:
+            index (int): The index of the plane.
+
+        Returns:
+            ImagePyramid: The pyramid (None if the plane isn't cached).
+        """
+        with self._lock:
+            return self.cache.get((index,))
+
+    def nbytes(self):
+        """The bytes held by the cached planes and finished collapses."""
+        with self._lock:
+            nbytes = self.cache.nbytes
+        for future in list(self._collapsed.values()):
+            if future.done() and future.exception() is None:
+                pyramid = future.result()
+                nbytes += sum(
+                    level.nbytes for level in pyramid.levels.values()
+                )
+                if isinstance(pyramid.source, np.ndarray):
+                    nbytes += pyramid.source.nbytes
+        return nbytes
+
+    def is_reading(self, index):
+        """Whether a plane is waiting to be (or being) read."""
+        return index in self._pending
+
+    def plane_pyramid(self, index):
+        """
+        Get the pyramid of a plane, reading the plane if needed.
+
+        Args:
+            index (int): The index of the plane.
+
+        Returns:
+            ImagePyramid: The pyramid.
+        """
+        if not 0 <= index < self.nplanes:
+            raise IndexError(f"Plane {index} is outside the cube")
+
+        # Don't read a plane twice if it's already being read
+        future = self._pending.get(index)
+        if future is not None and not future.cancel():
+            return future.result()
+        return self._read_plane(index)
+
+    def prefetch(self, index, step=1):
+        """
+        Read the planes around a plane in the background.
+
+        The plane itself comes first, then the planes ahead in the
+        direction of travel and finally those behind. Pending reads of any
+        other planes are dropped.
+
+        Args:
+            index (int): The plane being shown (or about to be).
+            step (int): The direction of travel (1 or -1).
+        """
+        step = 1 if step >= 0 else -1
+        wanted = [index]
+        wanted += [index + step * k for k in range(1, self.prefetch_ahead + 1)]
+        wanted += [
+            index - step * k for k in range(1, self.prefetch_behind + 1)
+        ]
+        wanted = [i for i in wanted if 0 <= i < self.nplanes]
+
+        # Drop reads which haven't started and are no longer wanted
+        for pending, future in list(self._pending.items()):
+            # (cancelling runs the callback removing it from _pending)
+            if pending not in wanted:
+                future.cancel()
+
+        for plane in wanted:
+            with self._lock:
+                cached = (plane,) in self.cache
+            if cached or plane in self._pending:
+                continue
+            future = self._executor.submit(self._read_plane, plane)
+            future.add_done_callback(
+                lambda _, plane=plane: self._pending.pop(plane, None)
+            )
+            self._pending[plane] = future
+
+    def _blocks(self, chunk_bytes):
+        """
+        Split the cube into blocks of planes (and rows) to read at once.
+
+        Blocks follow the storage order (whole planes where they fit) and
+        are aligned with any HDF5 chunks so no chunk is read twice.
+
+        Args:
+            chunk_bytes (int): The approximate number of bytes per block.
+
+        Returns:
+            list: The (plane slice, row slice) of each block.
+        """
+        nplanes, nrows, ncols = self.shape
+        row_bytes = ncols * self.dtype.itemsize
+        chunks = getattr(self.reader, "chunks", None) or (1, 1, 1)
+
+        if nrows * row_bytes <= chunk_bytes:
+            plane_step = chunk_bytes // (nrows * row_bytes)
+            row_step = nrows
+        else:
+            plane_step = 1
+            row_step = max(1, chunk_bytes // row_bytes)
+            row_step = max(chunks[1], row_step // chunks[1] * chunks[1])
+        plane_step = max(chunks[0], plane_step // chunks[0] * chunks[0])
+
+        return [
+            (
+                slice(plane, min(plane + plane_step, nplanes)),
+                slice(row, min(row + row_step, nrows)),
+            )
+            for row in range(0, nrows, row_step)
+            for plane in range(0, nplanes, plane_step)
+        ]
+
+    def collapse(
+        self,
+        op,
+        axis=0,
+        chunk_bytes=COLLAPSE_CHUNK_BYTES,
+        progress=None,
+    ):
+        """
+        Collapse the cube along an axis, reading it in chunks.
+
+        The cube is streamed in blocks (see _blocks) and each block's
+        reduction is folded into the result. NaNs are ignored, a pixel
+        which is NaN in every plane has a mean and maximum of NaN and a
+        sum of 0.
+
+        Args:
+            op (str): One of COLLAPSE_OPS.
+            axis (int): The axis to collapse (0 for an image of the sky).
+            chunk_bytes (int): The approximate number of bytes read per
+                chunk.
+            progress (callable): An optional function called with the
+                fraction done after each chunk, it may raise to stop.
+
+        Returns:
+            np.ndarray: The collapsed (2D) image, float32 for sums and
+                means, the cube's dtype for maxima.
+        """
+        if op not in COLLAPSE_OPS:
+            raise ValueError(
+                f"Unknown collapse {op}, options are {COLLAPSE_OPS}"
+            )
+        shape = self.shape
+        out_shape = shape[:axis] + shape[axis + 1 :]
+        is_float = np.issubdtype(self.dtype, np.floating)
+
+        if op == "max":
+            fill = np.nan if is_float else np.iinfo(self.dtype).min
+            out = np.full(out_shape, fill, dtype=self.dtype)
+        else:
+            out = np.zeros(out_shape, dtype=np.float64)
+            counts = np.zeros(out_shape, dtype=np.int64)
+
+        blocks = self._blocks(chunk_bytes)
+        for iblock, (planes, rows) in enumerate(blocks):
+            block = np.asarray(self.reader[planes, rows])
+            region = [planes, rows, slice(None)]
+            del region[axis]
+            region = tuple(region)
+
+            # fmax and nansum skip NaNs without warning about all NaN
+            # pixels (e.g. blank borders)
+            if op == "max":
+                np.fmax(
+                    out[region],
+                    np.fmax.reduce(block, axis=axis),
+                    out=out[region],
+                )
+            else:
+                out[region] += np.nansum(block, axis=axis, dtype=np.float64)
+                if op == "mean":
+                    if is_float:
+                        counts[region] += np.isfinite(block).sum(axis=axis)
+                    else:
+                        counts[region] += block.shape[axis]
+
+            if progress is not None:
+                progress((iblock + 1) / len(blocks))
+
+        if op == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out /= counts
+        return out.astype(np.float32) if op != "max" else out
+
+    def collapsed_pyramid(self, op, wait=True):
+        """
+        Get the pyramid of the cube collapsed along its plane axis.
+
+        The collapse is computed once (in the background when not
+        waiting) and kept.
+
+        Args:
+            op (str): One of COLLAPSE_OPS.
+            wait (bool): Whether to wait for the collapse, otherwise None
+                is returned until it is done.
+
+        Returns:
+            ImagePyramid: The pyramid of the collapsed image (None if it
+                isn't ready and wait is False).
+        """
+        future = self._collapsed.get(op)
+        if future is None:
+            future = self._collapse_executor.submit(
+                lambda: ImagePyramid(self.collapse(op))
+            )
+            self._collapsed[op] = future
+        if not wait and not future.done():
+            return None
+        return future.result()
+
+    def close(self):
+        """Stop any background reads and close the reader."""
+        # A read already running fails harmlessly once the reader closes
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._collapse_executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+        self._collapsed.clear()
+        with self._lock:
+            self.cache.clear()
+        if hasattr(self.reader, "close"):
+            self.reader.close()
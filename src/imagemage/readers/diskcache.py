@@ -0,0 +1,451 @@
+"""Definition of the DiskCache class.
+
+Opening a large image means sampling it for its statistics and streaming
+over all of it to build its pyramid, both of which only depend on the file.
+The disk cache keeps these derived products between sessions so reopening
+an image skips straight to displaying it.
+
+Each entry is a directory named by a digest of where the image comes from
+(its path, its dataset or HDU) and the file's size and modification time,
+so an entry is never used for a file which has since changed. An entry
+holds:
+
+    - meta.json: the key, the display limits for each automatic mode and
+      the histogram's details
+    - sample.npy: the sample of pixel values
+    - level<N>.npy: the pyramid's in memory levels
+    - hist_edges.npy, hist_cumulative.npy: the fine histogram
+
+The arrays are plain .npy files which are memory mapped when read, so a
+cached image costs next to nothing until its tiles are displayed. The
+thumbnails made by readers.thumbnails are kept in the cache directory too,
+one file per image file. The cache is limited in size (counting both), the
+entries and thumbnails used least recently are removed to make room for
+new ones.
+
+Example usage:
+
+    cache = get_disk_cache()
+    cached = cache.get(reader)
+    if cached is None:
+        ...
+        cache.put(reader, pyramid, sample)
+"""
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from imagemage.readers.formats import source_location
+from imagemage.render.histogram import HistogramIndex, index_for
+from imagemage.render.limits import AUTO_LIMITS, compute_limits
+
+# The version of the cache layout (entries written by other versions are
+# ignored)
+CACHE_VERSION = 1
+
+# The default directory of the cache
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "imagemage",
+)
+
+# The default maximum size of the cache (bytes)
+DEFAULT_CACHE_BYTES = 4 * 2**30
+
+# Images smaller than this are quicker to process again than to cache
+# (bytes)
+MIN_CACHED_BYTES = 64 * 2**20
+
+# The name of the file holding an entry's metadata
+META_FILE = "meta.json"
+
+# The directory (within the cache directory) holding thumbnails
+THUMBNAIL_DIR = "thumbnails"
+
+# The cache used by the loaders, created on first use (see get_disk_cache)
+_disk_cache = None
+
+# Whether the loaders use the disk cache
+_disk_cache_enabled = True
+
+
+@dataclass
+class CachedImage:
+    """
+    The derived products of an image read from the disk cache.
+
+    Attributes:
+        sample (np.ndarray): The sample of pixel values.
+        limits (dict): The (vmin, vmax) limits for each automatic mode.
+        levels (dict): The pyramid's in memory levels keyed by level index
+            (empty for data cubes).
+        histogram (HistogramIndex): The fine histogram of the sample.
+    """
+
+    sample: np.ndarray
+    limits: dict
+    levels: dict
+    histogram: HistogramIndex
+
+
+def _source_key(reader):
+    """
+    Get what identifies the image a reader holds.
+
+    Args:
+        reader (object): The reader (or DataCube).
+
+    Returns:
+        dict: The key (None if the image doesn't come from a file).
+    """
+    return _location_key(source_location(reader))
+
+
+def _location_key(location):
+    """
+    Get what identifies an image in a file.
+
+    Args:
+        location (dict): The "source" path and the "dataset" or "hdu" (see
+            readers.formats.source_location).
+
+    Returns:
+        dict: The key (None if the image doesn't come from a file).
+    """
+    if location["source"] is None:
+        return None
+    stat = os.stat(location["source"])
+    return {
+        "version": CACHE_VERSION,
+        **location,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+
+
+def _dir_nbytes(path):
+    """The bytes held by the files in a directory (and its subdirectories)."""
+    nbytes = 0
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            nbytes += _dir_nbytes(entry.path)
+        elif entry.is_file():
+            nbytes += entry.stat().st_size
+    return nbytes
+
+
+def _remove(path):
+    """Remove an entry (a directory) or a thumbnail (a file)."""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class DiskCache:
+    """
+    A size limited on disk cache of images' pyramids and statistics.
+
+    Attributes:
+        directory (str): The directory holding the cache.
+        max_bytes (int): The maximum size of the cache.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=None):
+        """
+        Set up the cache (the directory is created when first written).
+
+        Args:
+            directory (str): The directory holding the cache.
+            max_bytes (int): The maximum size of the cache
+                (DEFAULT_CACHE_BYTES if None).
+        """
+        self.directory = directory
+        self.max_bytes = (
+            max_bytes if max_bytes is not None else DEFAULT_CACHE_BYTES
+        )
+
+        # Writes (and the evictions they cause) happen one at a time
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, key):
+        """The directory of the entry for a key."""
+        digest = hashlib.sha1(
+            json.dumps(key, sort_keys=True).encode()
+        ).hexdigest()
+        return os.path.join(self.directory, digest)
+
+    @staticmethod
+    def is_worth_caching(reader):
+        """
+        Whether an image is big enough to be worth caching.
+
+        Args:
+            reader (object): The reader (or DataCube).
+
+        Returns:
+            bool: Whether to cache it.
+        """
+        nbytes = math.prod(reader.shape) * np.dtype(reader.dtype).itemsize
+        return nbytes >= MIN_CACHED_BYTES
+
+    def get(self, reader):
+        """
+        Read the cached products of an image.
+
+        Args:
+            reader (object): The reader (or DataCube).
+
+        Returns:
+            CachedImage: The products (None if the image isn't cached).
+        """
+        return self.get_location(source_location(reader))
+
+    def get_location(self, location):
+        """
+        Read the cached products of an image without opening it.
+
+        Args:
+            location (dict): The "source" path and the "dataset" or "hdu"
+                (see readers.formats.source_location).
+
+        Returns:
+            CachedImage: The products (None if the image isn't cached).
+        """
+        try:
+            key = _location_key(location)
+            if key is None:
+                return None
+            path = self._entry_dir(key)
+
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            if meta["key"] != key:
+                return None
+
+            def load(name):
+                return np.load(os.path.join(path, name), mmap_mode="r")
+
+            sample = load("sample.npy")
+            levels = {
+                int(level): load(f"level{level}.npy")
+                for level in meta["levels"]
+            }
+            histogram = HistogramIndex.from_cumulative(
+                load("hist_edges.npy"),
+                load("hist_cumulative.npy"),
+                exact=meta["hist_exact"],
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(os.path.join(path, META_FILE))
+        except OSError:
+            pass
+
+        return CachedImage(
+            sample=sample,
+            limits={
+                mode: tuple(limits) for mode, limits in meta["limits"].items()
+            },
+            levels=levels,
+            histogram=histogram,
+        )
+
+    def put(self, reader, pyramid, sample):
+        """
+        Cache the products of an image.
+
+        Entries are written to a temporary directory and moved into place
+        so a partly written entry is never read.
+
+        Args:
+            reader (object): The reader (or DataCube).
+            pyramid (ImagePyramid): The image's pyramid (None for data
+                cubes, whose planes aren't cached).
+            sample (np.ndarray): The sample of pixel values.
+        """
+        try:
+            key = _source_key(reader)
+        except OSError:
+            return
+        if key is None:
+            return
+        path = self._entry_dir(key)
+        if os.path.exists(path):
+            return
+
+        histogram = index_for(sample)
+        levels = pyramid.levels if pyramid is not None else {}
+        meta = {
+            "key": key,
+            "created": time.time(),
+            "levels": sorted(levels),
+            "limits": {
+                mode: compute_limits(None, mode, sample=sample)
+                for mode in AUTO_LIMITS
+            },
+            "hist_exact": histogram.exact,
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(tmp_path)
+            np.save(os.path.join(tmp_path, "sample.npy"), sample)
+            for ilevel, level in levels.items():
+                np.save(os.path.join(tmp_path, f"level{ilevel}.npy"), level)
+            np.save(os.path.join(tmp_path, "hist_edges.npy"), histogram.edges)
+            np.save(
+                os.path.join(tmp_path, "hist_cumulative.npy"),
+                histogram.cumulative,
+            )
+            with open(os.path.join(tmp_path, META_FILE), "w") as f:
+                json.dump(meta, f)
+
+            with self._lock:
+                os.rename(tmp_path, path)
+                self.evict(keep=path)
+        except OSError:
+            # Another loader cached the image first (or the disk is full)
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def discard(self, reader):
+        """
+        Remove the entry of an image (e.g. one which couldn't be used).
+
+        Args:
+            reader (object): The reader (or DataCube).
+        """
+        try:
+            key = _source_key(reader)
+        except OSError:
+            return
+        if key is not None:
+            with self._lock:
+                shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def entries(self):
+        """
+        List the cache's entries and thumbnails, least recently used first.
+
+        Returns:
+            list: The (path, last used, bytes) of each entry.
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        entries.extend(self._thumbnail_entries())
+        for entry in os.scandir(self.directory):
+            # Skip entries still being written
+            meta_path = os.path.join(entry.path, META_FILE)
+            if (
+                not entry.is_dir()
+                or ".tmp" in entry.name
+                or not os.path.exists(meta_path)
+            ):
+                continue
+            try:
+                used = os.stat(meta_path).st_mtime
+                entries.append((entry.path, used, _dir_nbytes(entry.path)))
+            except OSError:
+                continue
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def _thumbnail_entries(self):
+        """List the thumbnail files as (path, last used, bytes)."""
+        entries = []
+        thumbnail_dir = os.path.join(self.directory, THUMBNAIL_DIR)
+        if not os.path.isdir(thumbnail_dir):
+            return entries
+        for subdir in os.scandir(thumbnail_dir):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                # Skip thumbnails still being written
+                if ".tmp" in entry.name or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    @property
+    def nbytes(self):
+        """The size of the cache (bytes)."""
+        return sum(nbytes for _, _, nbytes in self.entries())
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until within max_bytes.
+
+        Args:
+            keep (str): The path of an entry which mustn't be removed.
+        """
+        entries = self.entries()
+        nbytes = sum(entry[2] for entry in entries)
+        for path, _, entry_bytes in entries:
+            if nbytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            _remove(path)
+            nbytes -= entry_bytes
+
+    def clear(self):
+        """
+        Remove every entry (including any left half written).
+
+        Returns:
+            int: The number of bytes freed.
+        """
+        freed = 0
+        if not os.path.isdir(self.directory):
+            return freed
+        with self._lock:
+            for entry in os.scandir(self.directory):
+                if entry.is_dir():
+                    freed += _dir_nbytes(entry.path)
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        return freed
+
+
+def get_disk_cache():
+    """
+    Get the disk cache used by the loaders (created on first use).
+
+    Returns:
+        DiskCache: The cache (None if caching has been turned off).
+    """
+    global _disk_cache
+    if not _disk_cache_enabled:
+        return None
+    if _disk_cache is None:
+        _disk_cache = DiskCache()
+    return _disk_cache
+
+
+def set_disk_cache(cache):
+    """
+    Replace the disk cache used by the loaders.
+
+    Args:
+        cache (DiskCache): The cache (None turns caching off).
+    """
+    global _disk_cache, _disk_cache_enabled
+    _disk_cache = cache
+    _disk_cache_enabled = cache is not None
@@ -0,0 +1,287 @@
+"""Definition of the Filmstrip and Prefetcher classes.
+
+A filmstrip steps through the image files in the directory of an image
+(e.g. a night's exposures), opening the same dataset or HDU of each file.
+While one file is displayed the prefetcher opens the files around it in
+the background, so stepping to the next file shows an image which is
+already prepared rather than waiting for it to load.
+
+The prefetch window is small (the next few files in the direction of
+travel and the file behind) and loads which fall out of it, e.g. when
+the direction of travel changes, are cancelled.
+
+Example usage:
+
+    filmstrip = Filmstrip("night/exp_0001.fits", hdu=1)
+    prefetcher = Prefetcher()
+    path = filmstrip.step(1)
+    prefetcher.set_window(filmstrip.window(1), filmstrip.open_func)
+    loaded = prefetcher.take(path)
+"""
+import os
+import re
+from functools import partial
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from imagemage.readers.formats import INPUT_FORMATS, open_source
+from imagemage.readers.loader import ImageLoader, get_loader_pool
+
+# The number of files prefetched ahead of the current file
+PREFETCH_AHEAD = 2
+
+# The number of files kept behind the current file
+PREFETCH_BEHIND = 1
+
+
+def _natural_key(name):
+    """A sort key ordering numbered files numerically (exp_2 < exp_10)."""
+    return [
+        int(part) if part.isdigit() else part.lower()
+        for part in re.split(r"(\d+)", name)
+    ]
+
+
+def list_images(directory):
+    """
+    List the image files in a directory.
+
+    Args:
+        directory (str): The directory.
+
+    Returns:
+        list: The paths of the files IMage can read, in natural order.
+    """
+    names = [
+        entry.name
+        for entry in os.scandir(directory)
+        if entry.is_file()
+        and os.path.splitext(entry.name)[1].lower() in INPUT_FORMATS
+    ]
+    return [
+        os.path.join(directory, name)
+        for name in sorted(names, key=_natural_key)
+    ]
+
+
+class Filmstrip:
+    """
+    The image files of a directory and the one being shown.
+
+    Attributes:
+        files (list): The paths of the image files in the directory.
+        index (int): The position of the file being shown.
+        dataset (str): The HDF5 dataset opened in each file.
+        hdu (int): The FITS HDU opened in each file.
+    """
+
+    def __init__(self, filepath, dataset=None, hdu=None):
+        """
+        Set up the filmstrip of a file's directory.
+
+        Args:
+            filepath (str): The file being shown.
+            dataset (str): The HDF5 dataset to open in each file.
+            hdu (int): The FITS HDU to open in each file.
+        """
+        filepath = os.path.abspath(filepath)
+        self.files = list_images(os.path.dirname(filepath))
+        self.index = self.files.index(filepath)
+        self.dataset = dataset
+        self.hdu = hdu
+
+    @property
+    def path(self):
+        """The path of the file being shown."""
+        return self.files[self.index]
+
+    def matches(self, location):
+        """
+        Whether the filmstrip is showing an image.
+
+        Args:
+            location (dict): Where the image comes from (see
+                readers.formats.source_location).
+
+        Returns:
+            bool: Whether the image is the filmstrip's current file.
+        """
+        return (
+            location["source"] == self.path
+            and location.get("dataset") == self.dataset
+            and location.get("hdu") == self.hdu
+        )
+
+    def step(self, step):
+        """
+        Move to another file.
+
+        Args:
+            step (int): The number of files to move by (negative to go
+                back).
+
+        Returns:
+            str: The path of the new file (None if there isn't one, the
+                filmstrip doesn't move).
+        """
+        index = self.index + step
+        if not 0 <= index < len(self.files):
+            return None
+        self.index = index
+        return self.path
+
+    def window(self, step):
+        """
+        Get the files to have ready around the current file.
+
+        Args:
+            step (int): The direction of travel (1 or -1).
+
+        Returns:
+            list: The paths in the order they should be loaded, the
+                current file first.
+        """
+        step = 1 if step >= 0 else -1
+        offsets = [0]
+        offsets += [step * k for k in range(1, PREFETCH_AHEAD + 1)]
+        offsets += [-step * k for k in range(1, PREFETCH_BEHIND + 1)]
+        return [
+            self.files[self.index + offset]
+            for offset in offsets
+            if 0 <= self.index + offset < len(self.files)
+        ]
+
+    def open_func(self, path):
+        """
+        Get the function opening a file of the filmstrip.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            callable: The function returning the file's reader.
+        """
+        return partial(open_source, path, self.dataset, self.hdu)
+
+
+class Prefetcher(QObject):
+    """
+    Loads files in the background and holds them until they are needed.
+
+    Attributes:
+        auto_limits (str): The mode used for the initial limits.
+    """
+
+    # The path of a file which is ready
+    prefetched = pyqtSignal(str)
+
+    # The path of a file which failed to load and the error message
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, auto_limits="minmax", parent=None):
+        """
+        Set up an empty prefetcher.
+
+        Args:
+            auto_limits (str): The mode used for the initial limits.
+            parent (QObject): The parent object.
+        """
+        super().__init__(parent)
+
+        self.auto_limits = auto_limits
+
+        # The loaders still running and the images they've prepared, both
+        # keyed by path, and the path each loader's signals belong to
+        self._loaders = {}
+        self._ready = {}
+        self._paths = {}
+
+    def set_window(self, paths, open_func):
+        """
+        Load the files in a window, dropping any outside it.
+
+        Args:
+            paths (list): The paths to have ready, the first is loaded
+                ahead of any other work on the loader pool.
+            open_func (callable): A function taking a path and returning
+                the function opening it.
+        """
+        for path in list(self._loaders):
+            if path not in paths:
+                self._loaders.pop(path).cancel()
+        for path in list(self._ready):
+            if path not in paths:
+                self._ready.pop(path).reader.close()
+
+        for priority, path in enumerate(paths):
+            if path in self._loaders or path in self._ready:
+                continue
+            loader = ImageLoader(open_func(path), auto_limits=self.auto_limits)
+            loader.signals.finished.connect(self._finished)
+            loader.signals.failed.connect(self._failed)
+            loader.signals.cancelled.connect(self._cancelled)
+            self._loaders[path] = loader
+            self._paths[loader.signals] = path
+            get_loader_pool().start(loader, -priority)
+
+    def is_loading(self, path):
+        """Whether a file is being loaded."""
+        return path in self._loaders
+
+    def take(self, path):
+        """
+        Take a file's prepared image (the prefetcher no longer holds it).
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            LoadedImage: The image (None if it isn't ready).
+        """
+        return self._ready.pop(path, None)
+
+    def put(self, path, loaded):
+        """
+        Hold an image which has already been prepared (e.g. the image
+        stepped away from).
+
+        Args:
+            path (str): The path of the file.
+            loaded (LoadedImage): The image.
+        """
+        if path in self._loaders:
+            self._loaders.pop(path).cancel()
+        old = self._ready.pop(path, None)
+        if old is not None and old.reader is not loaded.reader:
+            old.reader.close()
+        self._ready[path] = loaded
+
+    def clear(self):
+        """Cancel every load and close every image held."""
+        self.set_window([], None)
+
+    def _pop_path(self):
+        """The path of the loader which sent a signal (None if dropped)."""
+        path = self._paths.pop(self.sender(), None)
+        if path is None or path not in self._loaders:
+            return None
+        if self._loaders[path].signals is not self.sender():
+            return None
+        del self._loaders[path]
+        return path
+
+    def _finished(self, loaded):
+        path = self._pop_path()
+        if path is None:
+            loaded.reader.close()
+            return
+        self._ready[path] = loaded
+        self.prefetched.emit(path)
+
+    def _failed(self, message):
+        path = self._pop_path()
+        if path is not None:
+            self.failed.emit(path, message)
+
+    def _cancelled(self):
+        self._pop_path()
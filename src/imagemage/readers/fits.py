@@ -0,0 +1,309 @@
+"""Definition of the FITSImage class and FITS header parsing.
+
+A minimal native reader for FITS images. Headers are parsed directly from the
+2880 byte header blocks and the data unit of an HDU is memory mapped with
+numpy.memmap using the big-endian dtype given by BITPIX. Opening a file or
+listing its HDUs never reads any pixel data, pixels are only paged in from
+disk when they are sliced out of a FITSImage.
+
+Example usage:
+
+    hdus = list_hdus("mosaic.fits")
+    img = FITSImage("mosaic.fits", hdus[0].index)
+    region = img[1000:2000, 5000:6000]
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+# The size of a FITS block (bytes)
+BLOCK_SIZE = 2880
+
+# The size of a header card (bytes)
+CARD_SIZE = 80
+
+# Mapping from BITPIX to the (big-endian) on disk dtype
+BITPIX_DTYPES = {
+    8: np.dtype("u1"),
+    16: np.dtype(">i2"),
+    32: np.dtype(">i4"),
+    64: np.dtype(">i8"),
+    -32: np.dtype(">f4"),
+    -64: np.dtype(">f8"),
+}
+
+
+def _parse_value(value):
+    """
+    Convert the value field of a header card to a python object.
+
+    Args:
+        value (str): The value field (everything after "= ").
+
+    Returns:
+        str/bool/int/float: The parsed value.
+    """
+    value = value.strip()
+
+    # Strings are enclosed in single quotes with '' as an escaped quote
+    if value.startswith("'"):
+        end = 1
+        while True:
+            end = value.find("'", end)
+            if end < 0 or value[end : end + 2] != "''":
+                break
+            end += 2
+        return value[1:end].replace("''", "'").rstrip()
+
+    # Strip any comment
+    value = value.split("/", 1)[0].strip()
+
+    if value == "T":
+        return True
+    if value == "F":
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value.replace("D", "E"))
+    except ValueError:
+        return value
+
+
+def read_header(fileobj):
+    """
+    Read a single FITS header starting at the current file position.
+
+    On return the file position is at the start of the data unit.
+
+    Args:
+        fileobj (file): A binary file object.
+
+    Returns:
+        dict: The header keywords and their values (COMMENT, HISTORY and
+            blank cards are dropped). None if the end of file is reached.
+    """
+    header = {}
+    while True:
+        block = fileobj.read(BLOCK_SIZE)
+        if len(block) < BLOCK_SIZE:
+            return None
+        for i in range(0, BLOCK_SIZE, CARD_SIZE):
+            card = block[i : i + CARD_SIZE].decode("ascii", errors="replace")
+            key = card[:8].strip()
+            if key == "END":
+                return header
+            if card[8:10] == "= ":
+                header[key] = _parse_value(card[10:])
+
+
+@dataclass
+class FITSHDUInfo:
+    """
+    The metadata of an HDU needed to map its data without reading it.
+
+    Attributes:
+        index (int): The index of the HDU in the file (0 is the primary).
+        name (str): The EXTNAME of the HDU ("PRIMARY" for the primary).
+        header (dict): The parsed header.
+        data_offset (int): The byte offset of the data unit.
+        data_size (int): The size of the data unit in bytes (unpadded).
+    """
+
+    index: int
+    name: str
+    header: dict
+    data_offset: int
+    data_size: int
+
+    @property
+    def bitpix(self):
+        return self.header["BITPIX"]
+
+    @property
+    def shape(self):
+        """The numpy shape of the data (the reverse of the FITS axes)."""
+        naxis = self.header.get("NAXIS", 0)
+        return tuple(self.header[f"NAXIS{i}"] for i in range(naxis, 0, -1))
+
+    @property
+    def is_image(self):
+        xtension = self.header.get("XTENSION", "IMAGE")
+        return xtension == "IMAGE" and len(self.shape) >= 2
+
+    def __str__(self):
+        dims = "x".join(str(n) for n in self.shape)
+        return f"{self.index}: {self.name} ({dims}, BITPIX={self.bitpix})"
+
+
+def list_hdus(filepath, images_only=True):
+    """
+    List the HDUs in a FITS file without reading any pixel data.
+
+    Only the headers are read, the data units are skipped with a seek.
+
+    Args:
+        filepath (str): The path to the FITS file.
+        images_only (bool): Whether to only return HDUs holding (at least)
+            2D images.
+
+    Returns:
+        list: A FITSHDUInfo for each HDU.
+    """
+    hdus = []
+    with open(filepath, "rb") as fileobj:
+        index = 0
+        while True:
+            header = read_header(fileobj)
+            if header is None:
+                break
+
+            # Compute the size of the data unit
+            naxis = header.get("NAXIS", 0)
+            if naxis == 0:
+                data_size = 0
+            else:
+                data_size = (
+                    abs(header["BITPIX"])
+                    // 8
+                    * header.get("GCOUNT", 1)
+                    * (
+                        header.get("PCOUNT", 0)
+                        + math.prod(
+                            header[f"NAXIS{i}"] for i in range(1, naxis + 1)
+                        )
+                    )
+                )
+
+            hdus.append(
+                FITSHDUInfo(
+                    index=index,
+                    name=header.get(
+                        "EXTNAME", "PRIMARY" if index == 0 else ""
+                    ),
+                    header=header,
+                    data_offset=fileobj.tell(),
+                    data_size=data_size,
+                )
+            )
+
+            # Skip to the next header
+            padded = -(-data_size // BLOCK_SIZE) * BLOCK_SIZE
+            fileobj.seek(padded, 1)
+            index += 1
+
+    if images_only:
+        return [hdu for hdu in hdus if hdu.is_image]
+    return hdus
+
+
+class FITSImage:
+    """
+    A lazy image backed by a memory mapped FITS data unit.
+
+    The object behaves like a read only numpy array. Slicing only touches the
+    pages of the file behind the slice, which are then converted to native
+    byte order with BSCALE/BZERO applied.
+
+    Attributes:
+        filepath (str): The path to the FITS file.
+        hdu (FITSHDUInfo): The metadata of the HDU being read.
+        raw (np.memmap): The memory mapped (unscaled) data.
+        bscale (float): The BSCALE of the data.
+        bzero (float): The BZERO of the data.
+        blank (int): The BLANK value of integer data (None if not set).
+    """
+
+    def __init__(self, filepath, index=None):
+        """
+        Memory map the data unit of an HDU.
+
+        Args:
+            filepath (str): The path to the FITS file.
+            index (int): The index of the HDU to open, defaults to the first
+                image HDU in the file.
+        """
+        self.filepath = filepath
+
+        hdus = list_hdus(filepath, images_only=False)
+        if index is None:
+            images = [hdu for hdu in hdus if hdu.is_image]
+            if len(images) == 0:
+                raise ValueError(f"{filepath} contains no image HDUs")
+            self.hdu = images[0]
+        else:
+            self.hdu = hdus[index]
+
+        header = self.hdu.header
+        self.bscale = header.get("BSCALE", 1)
+        self.bzero = header.get("BZERO", 0)
+        self.blank = header.get("BLANK", None)
+
+        self.raw = np.memmap(
+            filepath,
+            dtype=BITPIX_DTYPES[self.hdu.bitpix],
+            mode="r",
+            offset=self.hdu.data_offset,
+            shape=self.hdu.shape,
+        )
+
+        # Work out how to turn raw values into physical values
+        raw_dtype = self.raw.dtype
+        self._unsigned = (
+            raw_dtype.kind == "i"
+            and self.bscale == 1
+            and self.bzero == 2 ** (raw_dtype.itemsize * 8 - 1)
+        )
+        if self._unsigned:
+            # The FITS convention for unsigned integers, flipping the sign
+            # bit is exact and avoids any floating point arithmetic
+            self._dtype = np.dtype(f"u{raw_dtype.itemsize}")
+        elif self.bscale != 1 or self.bzero != 0:
+            self._dtype = np.dtype(
+                np.float32 if raw_dtype.itemsize <= 2 else np.float64
+            )
+        else:
+            self._dtype = raw_dtype.newbyteorder("=")
+
+    @property
+    def shape(self):
+        return self.raw.shape
+
+    @property
+    def dtype(self):
+        """The dtype of the physical (scaled, native byte order) values."""
+        return self._dtype
+
+    @property
+    def ndim(self):
+        return self.raw.ndim
+
+    @property
+    def header(self):
+        return self.hdu.header
+
+    def __getitem__(self, key):
+        raw = np.asarray(self.raw[key])
+
+        if self._unsigned:
+            native = raw.astype(raw.dtype.newbyteorder("="))
+            return (
+                native ^ native.dtype.type(np.iinfo(native.dtype).min)
+            ).view(self._dtype)
+
+        data = raw.astype(self._dtype)
+        if self._dtype.kind == "f" and (self.bscale != 1 or self.bzero != 0):
+            if self.blank is not None:
+                mask = raw == self.blank
+            data *= self._dtype.type(self.bscale)
+            data += self._dtype.type(self.bzero)
+            if self.blank is not None:
+                data[mask] = np.nan
+        return data
+
+    def close(self):
+        """Release the memory map (it is unmapped once no slices use it)."""
+        self.raw = None
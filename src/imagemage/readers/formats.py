@@ -0,0 +1,102 @@
+"""Opening image files with the lazy reader for their format.
+
+Unlike the GUI, which asks the user which dataset or HDU to open, the
+functions here are given everything they need, so they can be used
+headlessly (e.g. by batch rendering and display recipes).
+
+Example usage:
+
+    reader = open_source("mosaic.fits", hdu=1)
+    region = reader[1000:2000, 5000:6000]
+"""
+import os
+
+from imagemage.readers.cube import DataCube
+from imagemage.registry import LazyRegistry
+
+# The reader used for each input file extension
+INPUT_FORMATS = {
+    ".png": "pil",
+    ".jpg": "pil",
+    ".jpeg": "pil",
+    ".bmp": "pil",
+    ".tif": "pil",
+    ".tiff": "pil",
+    ".h5": "hdf5",
+    ".hdf5": "hdf5",
+    ".fits": "fits",
+    ".fit": "fits",
+    ".fts": "fits",
+}
+
+# The module reading each format (imported when a file of the format is
+# first opened, e.g. h5py is only imported for HDF5 files)
+READERS = LazyRegistry(
+    {
+        "pil": "imagemage.readers.pil",
+        "hdf5": "imagemage.readers.hdf5",
+        "fits": "imagemage.readers.fits",
+    }
+)
+
+
+def open_source(filepath, dataset=None, hdu=None):
+    """
+    Open an image file with the lazy reader for its format.
+
+    Args:
+        filepath (str): The path to the image file.
+        dataset (str): The HDF5 dataset to open (the only one if None).
+        hdu (int): The index of the FITS HDU to open (the first image HDU
+            if None).
+
+    Returns:
+        object: The image's reader.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    match INPUT_FORMATS.get(ext):
+        case "pil":
+            return READERS["pil"].PILImage(filepath)
+        case "hdf5":
+            hdf5 = READERS["hdf5"]
+            if dataset is None:
+                keys = hdf5.list_datasets(filepath)
+                if len(keys) != 1:
+                    raise ValueError(
+                        f"{filepath} contains {len(keys)} datasets, one "
+                        "must be chosen"
+                    )
+                dataset = keys[0]
+            return hdf5.HDF5Image(filepath, dataset)
+        case "fits":
+            return READERS["fits"].FITSImage(filepath, hdu)
+        case _:
+            raise ValueError(f"Can't read {ext or filepath} files")
+
+
+def source_location(reader):
+    """
+    Get where a reader's image comes from.
+
+    Args:
+        reader (object): A reader returned by open_source (or a DataCube
+            wrapping one).
+
+    Returns:
+        dict: The "source" path and the "dataset" (HDF5) or "hdu" (FITS)
+            read from it.
+    """
+    if isinstance(reader, DataCube):
+        reader = reader.reader
+    filepath = getattr(reader, "filepath", None)
+    location = {
+        "source": os.path.abspath(filepath) if filepath is not None else None
+    }
+    # A reader can only be of a format whose module has been imported
+    hdf5 = READERS.loaded("hdf5")
+    fits = READERS.loaded("fits")
+    if hdf5 is not None and isinstance(reader, hdf5.HDF5Image):
+        location["dataset"] = reader.key
+    elif fits is not None and isinstance(reader, fits.FITSImage):
+        location["hdu"] = reader.hdu.index
+    return location
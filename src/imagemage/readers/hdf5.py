@@ -0,0 +1,128 @@
+"""Definition of the HDF5Image class.
+
+This class gives lazy access to an image stored as a dataset in an HDF5 file.
+Nothing is read when the file is opened, pixels are only read from disk (one
+chunk at a time) when they are sliced out of the dataset.
+
+Example usage:
+
+    datasets = list_datasets("sim.hdf5")
+    img = HDF5Image("sim.hdf5", datasets[0], chunk_cache_size=256 * 1024**2)
+    region = img[1000:2000, 5000:6000]
+"""
+import h5py
+
+# The default size of the HDF5 raw chunk cache (bytes)
+DEFAULT_CHUNK_CACHE_SIZE = 64 * 1024**2
+
+# The default number of hash table slots in the chunk cache. HDF5 recommends
+# a prime number roughly 100 times the number of chunks that fit in the cache
+DEFAULT_CHUNK_CACHE_SLOTS = 10007
+
+# The tile shape used when a dataset is stored contiguously
+DEFAULT_TILE_SHAPE = (256, 256)
+
+
+def list_datasets(filepath):
+    """
+    List all datasets in an HDF5 file which could be displayed as images.
+
+    Only the metadata is touched, no pixel data is read.
+
+    Args:
+        filepath (str): The path to the HDF5 file.
+
+    Returns:
+        list: The keys of all datasets with at least 2 dimensions.
+    """
+    keys = []
+
+    def _visit(name, obj):
+        if isinstance(obj, h5py.Dataset) and obj.ndim >= 2:
+            keys.append(name)
+
+    with h5py.File(filepath, "r") as hdf:
+        hdf.visititems(_visit)
+
+    return keys
+
+
+class HDF5Image:
+    """
+    A lazy image backed by an HDF5 dataset.
+
+    The object behaves like a read only numpy array, any slice is passed
+    straight to h5py so only the chunks intersecting the slice are read.
+
+    Attributes:
+        filepath (str): The path to the HDF5 file.
+        key (str): The key of the dataset within the file.
+        dataset (h5py.Dataset): The lazy dataset.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        key,
+        chunk_cache_size=DEFAULT_CHUNK_CACHE_SIZE,
+        chunk_cache_slots=DEFAULT_CHUNK_CACHE_SLOTS,
+    ):
+        """
+        Open the HDF5 file and get a handle on the dataset.
+
+        Args:
+            filepath (str): The path to the HDF5 file.
+            key (str): The key of the dataset within the file.
+            chunk_cache_size (int): The size of the raw chunk cache in bytes.
+                This should be large enough to hold a few rows of chunks to
+                avoid re-reading chunks while panning.
+            chunk_cache_slots (int): The number of hash table slots in the
+                chunk cache.
+        """
+        self.filepath = filepath
+        self.key = key
+
+        self._hdf = h5py.File(
+            filepath,
+            "r",
+            rdcc_nbytes=chunk_cache_size,
+            rdcc_nslots=chunk_cache_slots,
+        )
+        self.dataset = self._hdf[key]
+
+    @property
+    def shape(self):
+        return self.dataset.shape
+
+    @property
+    def dtype(self):
+        return self.dataset.dtype
+
+    @property
+    def ndim(self):
+        return self.dataset.ndim
+
+    @property
+    def chunks(self):
+        """The chunk shape of the dataset (None if stored contiguously)."""
+        return self.dataset.chunks
+
+    @property
+    def tile_shape(self):
+        """
+        The natural shape of a tile to read from this dataset.
+
+        For chunked datasets this is the (2D) chunk shape so a tile read
+        never touches more chunks than it has to.
+        """
+        if self.chunks is None:
+            return DEFAULT_TILE_SHAPE
+        return self.chunks[:2]
+
+    def __getitem__(self, key):
+        return self.dataset[key]
+
+    def close(self):
+        """Close the underlying HDF5 file."""
+        if self._hdf.id.valid:
+            self._hdf.close()
@@ -0,0 +1,294 @@
+"""Definition of the ImageLoader class.
+
+Opening an image involves decoding it (for formats which can't be read
+lazily), sampling it for its statistics and building the pyramid it is
+rendered from. An ImageLoader does all of this on a worker thread from the
+loader thread pool so the GUI stays responsive, reporting its progress,
+emitting a low resolution preview as soon as possible and supporting
+cancellation.
+
+Data cubes are prepared for display a plane at a time: the reader is
+wrapped in a DataCube, the statistics are sampled from planes spread
+through the cube and only the first plane's pyramid is built.
+
+Large images are looked up in the disk cache (see readers.diskcache)
+first: a cached image's sample, limits and pyramid levels are memory
+mapped rather than computed, so it is displayed without reading the image
+at all. Images which aren't cached are added to the cache once they are
+displayed.
+
+Example usage:
+
+    loader = ImageLoader(lambda: FITSImage(filepath))
+    loader.signals.finished.connect(view.set_loaded_image)
+    get_loader_pool().start(loader)
+"""
+import threading
+import traceback
+from dataclasses import dataclass
+
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from imagemage.readers.cube import DataCube, is_cube
+from imagemage.readers.diskcache import get_disk_cache
+from imagemage.readers.sampling import (
+    decimate,
+    sample_pixels,
+    samples_for_accuracy,
+)
+from imagemage.render.histogram import index_for, remember_index
+from imagemage.render.limits import DEFAULT_RANK_ERROR, compute_limits
+from imagemage.render.pyramid import ImagePyramid
+
+# The maximum number of pixels along either axis of the preview
+PREVIEW_SIZE = 512
+
+# The maximum number of pixels along either axis of the in memory overview
+OVERVIEW_SIZE = 2048
+
+# The number of images which can be loaded at once
+MAX_LOADER_THREADS = 2
+
+# The pool loaders run in (see get_loader_pool)
+_loader_pool = None
+
+
+class LoadCancelled(Exception):
+    """Raised inside a loader when its load has been cancelled."""
+
+
+@dataclass
+class LoadedImage:
+    """
+    Everything prepared for displaying a newly opened image.
+
+    Attributes:
+        reader (object): The reader holding the image (HDF5Image, FITSImage
+            or PILImage, or a DataCube wrapping the reader of a cube).
+        pyramid (ImagePyramid): The pyramid to render from (a cube's first
+            plane).
+        overview (np.ndarray): An in memory overview of the image.
+        sample (np.ndarray): A sample of the pixel values.
+        limits (tuple): The initial (vmin, vmax) display limits.
+    """
+
+    reader: object
+    pyramid: ImagePyramid
+    overview: np.ndarray
+    sample: np.ndarray
+    limits: tuple
+
+
+class LoaderSignals(QObject):
+    """
+    The signals emitted by an ImageLoader.
+
+    QRunnable is not a QObject so the signals live here.
+    """
+
+    # The progress as a percentage
+    progress = pyqtSignal(int)
+
+    # A low resolution preview and the limits to display it with
+    preview = pyqtSignal(object, float, float)
+
+    # The LoadedImage
+    finished = pyqtSignal(object)
+
+    # An error message
+    failed = pyqtSignal(str)
+
+    # Emitted instead of finished when cancelled
+    cancelled = pyqtSignal()
+
+
+class ImageLoader(QRunnable):
+    """
+    Opens and prepares an image on a worker thread.
+
+    Attributes:
+        open_func (callable): A function returning the image's reader.
+        preview_func (callable): An optional function returning a quick low
+            resolution copy of the image, used before open_func completes.
+        auto_limits (str): The mode used for the initial limits.
+        use_disk_cache (bool): Whether to use the disk cache.
+        signals (LoaderSignals): The signals reporting the load.
+    """
+
+    def __init__(
+        self,
+        open_func,
+        preview_func=None,
+        auto_limits="minmax",
+        use_disk_cache=True,
+    ):
+        """
+        Set up the loader.
+
+        Args:
+            open_func (callable): A function returning the image's reader.
+            preview_func (callable): An optional function returning a quick
+                low resolution copy of the image.
+            auto_limits (str): The mode used for the initial limits.
+            use_disk_cache (bool): Whether to use the disk cache (see
+                readers.diskcache).
+        """
+        super().__init__()
+
+        self.open_func = open_func
+        self.preview_func = preview_func
+        self.auto_limits = auto_limits
+        self.use_disk_cache = use_disk_cache
+        self.signals = LoaderSignals()
+
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Request that the load stops as soon as possible."""
+        self._cancel.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def _check(self, progress=None):
+        """Raise if cancelled, otherwise report progress."""
+        if self._cancel.is_set():
+            raise LoadCancelled()
+        if progress is not None:
+            self.signals.progress.emit(int(progress))
+
+    @staticmethod
+    def _cached_pyramid(reader, cached):
+        """
+        Get the pyramid of an image from its cached levels.
+
+        Args:
+            reader (object): The reader (or DataCube).
+            cached (CachedImage): The image's cached products.
+
+        Returns:
+            ImagePyramid: The pyramid (None if the cached levels can't be
+                used).
+        """
+        # Only the cube's sample is cached, its planes are read as usual
+        if isinstance(reader, DataCube):
+            return reader.plane_pyramid(0)
+        try:
+            return ImagePyramid(reader, levels=cached.levels)
+        except ValueError:
+            return None
+
+    def run(self):
+        reader = None
+        try:
+            # Loads cancelled before they started (e.g. prefetches) stop
+            self._check()
+
+            # Show something as soon as we can for slow to decode formats
+            if self.preview_func is not None:
+                preview = self.preview_func()
+                self._check(2)
+                self.signals.preview.emit(
+                    preview, *compute_limits(None, "minmax", sample=preview)
+                )
+
+            reader = self.open_func()
+            self._check(10)
+
+            # Cubes are shown a plane at a time starting with the first
+            image = reader
+            if is_cube(reader):
+                reader = DataCube(reader)
+                image = reader.plane_view(0)
+
+            # Large images may have been opened before
+            disk_cache = get_disk_cache() if self.use_disk_cache else None
+            if disk_cache is not None and not disk_cache.is_worth_caching(
+                reader
+            ):
+                disk_cache = None
+            cached = disk_cache.get(reader) if disk_cache else None
+            if cached is not None:
+                pyramid = self._cached_pyramid(reader, cached)
+                if pyramid is not None:
+                    sample = cached.sample
+                    remember_index(sample, cached.histogram)
+                    limits = cached.limits[self.auto_limits]
+                    overview = pyramid.overview(OVERVIEW_SIZE)
+                    self._check(100)
+                    self.signals.finished.emit(
+                        LoadedImage(reader, pyramid, overview, sample, limits)
+                    )
+                    return
+                disk_cache.discard(reader)
+
+            # Statistics from a sample of the image (of the whole cube so
+            # every plane is shown with the same limits)
+            nsamples = samples_for_accuracy(DEFAULT_RANK_ERROR)
+            if isinstance(reader, DataCube):
+                sample = reader.sample(nsamples)
+            else:
+                sample = sample_pixels(reader, nsamples)
+            limits = compute_limits(image, self.auto_limits, sample=sample)
+
+            # Build the fine histogram here rather than on the GUI thread
+            index_for(sample)
+            self._check(15)
+
+            if self.preview_func is None:
+                self.signals.preview.emit(
+                    decimate(image, PREVIEW_SIZE), *limits
+                )
+
+            # Build the pyramid (the expensive full pass)
+            if isinstance(reader, DataCube):
+                pyramid = reader.plane_pyramid(0)
+            else:
+                pyramid = ImagePyramid(
+                    reader,
+                    progress=lambda frac: self._check(15 + 80 * frac),
+                )
+            overview = pyramid.overview(OVERVIEW_SIZE)
+            self._check(100)
+
+            self.signals.finished.emit(
+                LoadedImage(reader, pyramid, overview, sample, limits)
+            )
+
+            # Cache the image for next time (once it's being displayed)
+            if disk_cache is not None:
+                disk_cache.put(
+                    reader,
+                    None if isinstance(reader, DataCube) else pyramid,
+                    sample,
+                )
+
+        except LoadCancelled:
+            if reader is not None:
+                reader.close()
+            self.signals.cancelled.emit()
+
+        except Exception:
+            if reader is not None:
+                reader.close()
+            self.signals.failed.emit(traceback.format_exc())
+
+
+def get_loader_pool():
+    """
+    Get the thread pool loaders run in (created on first use).
+
+    Loaders get their own pool rather than QThreadPool.globalInstance, Qt
+    uses the global pool internally (e.g. to convert QImages) and a long
+    running load must not starve it.
+
+    Returns:
+        QThreadPool: The pool.
+    """
+    global _loader_pool
+    if _loader_pool is None:
+        _loader_pool = QThreadPool()
+        _loader_pool.setMaxThreadCount(MAX_LOADER_THREADS)
+    return _loader_pool
@@ -0,0 +1,135 @@
+"""Definition of the PILImage class.
+
+A thin reader around images decoded with PIL (PNG, JPEG, BMP, TIFF, ...) so
+they can be used anywhere a lazy HDF5Image or FITSImage can. Unlike those
+formats PIL has to decode the whole image up front.
+
+Images keep their native bit depth and colour channels: 16 bit images are
+read as uint16, 32 bit integer and float images as int32 and float32, and
+colour images as (height, width, 3) or (height, width, 4) uint8 arrays.
+Only modes numpy can't represent directly (palettes, bilevel, CMYK, ...)
+are converted, to the nearest mode which it can.
+
+Example usage:
+
+    preview = read_pil_preview("photo.jpg", 512)
+    img = PILImage("photo.jpg")
+"""
+import numpy as np
+from PIL import Image
+
+from imagemage.readers.sampling import decimate
+
+# The modes numpy can represent directly (anything else is converted)
+NATIVE_MODES = ("L", "I;16", "I;16B", "I;16L", "I", "F", "RGB", "RGBA")
+
+
+def _native_mode(img):
+    """
+    Get the mode an image should be converted to for its pixel array.
+
+    Args:
+        img (PIL.Image): The image.
+
+    Returns:
+        str: The mode (the image's own mode if no conversion is needed).
+    """
+    if img.mode in NATIVE_MODES:
+        return img.mode
+    if img.mode in ("1", "LA"):
+        return "L"
+    if img.mode in ("P", "PA"):
+        has_alpha = img.mode == "PA" or "transparency" in img.info
+        return "RGBA" if has_alpha else "RGB"
+    if img.mode in ("I;16S", "I;32", "I;32S"):
+        return "I"
+    return "RGB"
+
+
+def to_array(img):
+    """
+    Get the pixels of a PIL image keeping its bit depth and channels.
+
+    Args:
+        img (PIL.Image): The image.
+
+    Returns:
+        np.ndarray: The pixel data (native byte order).
+    """
+    mode = _native_mode(img)
+    if mode != img.mode:
+        img = img.convert(mode)
+
+    arr = np.asarray(img)
+    if not arr.dtype.isnative:
+        arr = arr.astype(arr.dtype.newbyteorder("="))
+    return arr
+
+
+def read_pil_preview(filepath, max_size):
+    """
+    Quickly read a reduced resolution copy of an image.
+
+    For JPEGs the reduction happens during decoding (draft mode) so this is
+    much faster than decoding the full image, other formats are decoded in
+    full and then reduced. 8 bit images are reduced by PIL, other images
+    by striding the full resolution array.
+
+    Args:
+        filepath (str): The path to the image file.
+        max_size (int): The maximum number of pixels along either axis.
+
+    Returns:
+        np.ndarray: The reduced image.
+    """
+    with Image.open(filepath) as img:
+        img.draft(img.mode, (max_size, max_size))
+        mode = _native_mode(img)
+        if mode in ("L", "RGB", "RGBA"):
+            img = img.convert(mode)
+            img.thumbnail((max_size, max_size))
+            return np.array(img)
+
+        return decimate(to_array(img), max_size)
+
+
+class PILImage:
+    """
+    An image decoded with PIL.
+
+    Attributes:
+        filepath (str): The path to the image file.
+        pil_img (PIL.Image): The decoded PIL image.
+        array (np.ndarray): The pixel data in the image's native dtype,
+            with a trailing axis for colour images.
+    """
+
+    def __init__(self, filepath):
+        """
+        Decode the image.
+
+        Args:
+            filepath (str): The path to the image file.
+        """
+        self.filepath = filepath
+        self.pil_img = Image.open(filepath)
+        self.array = to_array(self.pil_img)
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    @property
+    def dtype(self):
+        return self.array.dtype
+
+    @property
+    def ndim(self):
+        return self.array.ndim
+
+    def __getitem__(self, key):
+        return self.array[key]
+
+    def close(self):
+        """Release the decoded image."""
+        self.pil_img.close()
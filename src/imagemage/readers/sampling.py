@@ -0,0 +1,109 @@
+"""Helpers for reading reduced versions of (possibly lazy) image arrays.
+
+The functions here work on anything that supports numpy style slicing with a
+step, i.e. in memory arrays, numpy memmaps and h5py datasets. Only the
+elements selected by the slice are ever read from disk.
+"""
+import math
+
+import numpy as np
+
+# The default number of pixels to sample for image statistics
+DEFAULT_NSAMPLES = 10**6
+
+
+def decimation_step(shape, max_size):
+    """
+    Compute the stride needed to fit an image inside max_size pixels.
+
+    Args:
+        shape (tuple): The shape of the image (rows, columns, ...).
+        max_size (int): The maximum number of pixels along either axis.
+
+    Returns:
+        int: The step to take along each axis (1 if no decimation needed).
+    """
+    return max(1, math.ceil(max(shape[0], shape[1]) / max_size))
+
+
+def decimate(source, max_size):
+    """
+    Read a strided copy of an image no larger than max_size on either axis.
+
+    Args:
+        source (array-like): The image array, can be lazy.
+        max_size (int): The maximum number of pixels along either axis.
+
+    Returns:
+        np.ndarray: The (possibly) decimated image held in memory.
+    """
+    step = decimation_step(source.shape, max_size)
+
+    # Nothing to do for small in memory arrays
+    if step == 1 and isinstance(source, np.ndarray):
+        return np.asarray(source)
+
+    return np.asarray(source[::step, ::step])
+
+
+def samples_for_accuracy(rank_error, confidence=0.99):
+    """
+    Compute the sample size needed for quantiles with a given accuracy.
+
+    From the Dvoretzky-Kiefer-Wolfowitz inequality, with this many uniformly
+    drawn samples every quantile of the sample is within rank_error (as a
+    fraction of the pixels) of the true quantile with the given confidence.
+
+    Args:
+        rank_error (float): The maximum error in the rank of a quantile as
+            a fraction of the number of pixels (e.g. 0.001 for 0.1%).
+        confidence (float): The probability of being within the bound.
+
+    Returns:
+        int: The number of samples.
+    """
+    return math.ceil(math.log(2 / (1 - confidence)) / (2 * rank_error**2))
+
+
+def sample_pixels(source, nsamples=DEFAULT_NSAMPLES, method="strided", seed=0):
+    """
+    Read a sample of an image's pixel values.
+
+    For lazy sources only the sampled rows are read from disk, so sampling a
+    memory mapped file only touches a fraction of its pages.
+
+    Args:
+        source (array-like): The image array, can be lazy.
+        nsamples (int): The (approximate) number of pixels to sample.
+        method (str): "strided" to take a regular grid of pixels or "random"
+            to take random pixels from a random subset of rows.
+        seed (int): The seed for the random method.
+
+    Returns:
+        np.ndarray: The flattened sample (the whole image if it has fewer
+            than nsamples pixels).
+    """
+    nrows, ncols = source.shape[:2]
+    npix = nrows * ncols
+
+    if npix <= nsamples:
+        return np.asarray(source[...]).ravel()
+
+    if method == "strided":
+        step = max(1, math.floor(math.sqrt(npix / nsamples)))
+        return np.asarray(source[::step, ::step]).ravel()
+
+    if method == "random":
+        rng = np.random.default_rng(seed)
+
+        # Read whole (sorted) rows and pick random pixels within them
+        nread = min(nrows, max(1, math.ceil(math.sqrt(nsamples))))
+        rows = np.sort(rng.choice(nrows, size=nread, replace=False))
+        data = np.asarray(source[rows])
+        per_row = max(1, nsamples // nread)
+        cols = rng.integers(0, ncols, size=(nread, per_row))
+        return np.take_along_axis(
+            data.reshape(nread, ncols, -1), cols[..., None], axis=1
+        ).ravel()
+
+    raise ValueError(f"Unknown sampling method {method}")
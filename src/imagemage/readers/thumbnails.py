@@ -0,0 +1,239 @@
+"""Making thumbnails of the images in a directory.
+
+A thumbnail is made for every image a file holds (every displayable HDF5
+dataset and FITS image HDU) while reading as little of the file as the
+format allows:
+
+    - JPEGs are decoded at reduced resolution (PIL's draft mode)
+    - images already in the disk cache use a coarse pyramid level
+    - FITS images are read with a stride from their memory map
+    - HDF5 datasets are read with a stride (only the chunks containing
+      the strided pixels are touched)
+    - data cubes show their first plane
+
+make_thumbnails works on one file and only touches the file, so files
+can be handled in parallel by a process pool. The thumbnails of a file
+are kept in the disk cache (keyed by the file's path, size and
+modification time) so a directory is only ever processed once. They count
+towards the disk cache's size limit and are evicted with its entries,
+least recently used first (see evict_cache).
+
+Example usage:
+
+    for name, thumbnail in make_thumbnails("night/exp_0001.fits"):
+        ...
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from imagemage.readers.cube import is_cube
+from imagemage.readers.diskcache import THUMBNAIL_DIR, DiskCache
+from imagemage.readers.formats import INPUT_FORMATS, READERS
+from imagemage.readers.sampling import decimate, decimation_step
+from imagemage.render.limits import compute_limits
+from imagemage.render.normalize import Normalizer
+
+# The maximum number of pixels along either axis of a thumbnail
+THUMBNAIL_SIZE = 128
+
+# The version of the thumbnail cache layout (bump when thumbnails change)
+THUMBNAIL_VERSION = 1
+
+# The queue a worker process reports the files it starts on to (see
+# init_worker)
+_started = None
+
+
+def init_worker(started):
+    """
+    Set up a worker process to report the files it starts on.
+
+    This tells which files were being worked on when a worker crashed.
+
+    Args:
+        started (multiprocessing.SimpleQueue): The queue make_thumbnails
+            puts each file path on.
+    """
+    global _started
+    _started = started
+
+
+def _thumbnail_path(cache_dir, filepath, size):
+    """The path of the cached thumbnails of a file."""
+    stat = os.stat(filepath)
+    key = json.dumps(
+        [
+            THUMBNAIL_VERSION,
+            os.path.abspath(filepath),
+            stat.st_size,
+            stat.st_mtime_ns,
+            size,
+        ]
+    )
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return os.path.join(cache_dir, THUMBNAIL_DIR, digest[:2], digest + ".npz")
+
+
+def _to_uint8(image, limits=None):
+    """
+    Scale an image to uint8 for display.
+
+    Args:
+        image (np.ndarray): The image.
+        limits (tuple): The (vmin, vmax) limits (percentiles of the image
+            if None).
+
+    Returns:
+        np.ndarray: The uint8 image (colour uint8 images are unchanged).
+    """
+    if image.dtype == np.uint8 and image.ndim == 3:
+        return np.ascontiguousarray(image[..., :3])
+    if image.ndim == 3:
+        image = image[..., :3]
+    if limits is None:
+        limits = compute_limits(None, "percentile", sample=image)
+    return Normalizer()(image, *limits).copy()
+
+
+def _image_thumbnail(source, size, location, disk_cache):
+    """
+    Make the thumbnail of a (possibly lazy) image array.
+
+    Args:
+        source (array-like): The image (a reader).
+        size (int): The maximum number of pixels along either axis.
+        location (dict): Where the image comes from (for the disk cache).
+        disk_cache (DiskCache): The disk cache (None to not use it).
+
+    Returns:
+        np.ndarray: The uint8 thumbnail.
+    """
+    # Cubes show their first plane
+    if is_cube(source):
+        step = decimation_step(source.shape[1:], size)
+        return _to_uint8(np.asarray(source[0, ::step, ::step]))
+
+    # A coarse pyramid level is already in the disk cache
+    cached = (
+        disk_cache.get_location(location) if disk_cache is not None else None
+    )
+    if cached is not None and cached.levels:
+        level = next(
+            (
+                cached.levels[ilevel]
+                for ilevel in sorted(cached.levels)
+                if max(cached.levels[ilevel].shape[:2]) <= 2 * size
+            ),
+            cached.levels[max(cached.levels)],
+        )
+        return _to_uint8(decimate(level, size), cached.limits["percentile"])
+
+    return _to_uint8(decimate(source, size))
+
+
+def make_thumbnails(filepath, size=THUMBNAIL_SIZE, cache_dir=None):
+    """
+    Make the thumbnails of every image in a file.
+
+    Args:
+        filepath (str): The path to the file.
+        size (int): The maximum number of pixels along either axis.
+        cache_dir (str): The disk cache directory (see readers.diskcache)
+            holding the thumbnail cache (None to not cache).
+
+    Returns:
+        list: The (dataset/HDU, thumbnail) of each image, the dataset key
+            (HDF5), HDU index (FITS) or None (other formats) and the uint8
+            thumbnail (rows, columns) or (rows, columns, 3).
+    """
+    if _started is not None:
+        _started.put(filepath)
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = _thumbnail_path(cache_dir, filepath, size)
+        try:
+            with np.load(cache_path) as cached:
+                names = json.loads(str(cached["names"]))
+                thumbnails = [
+                    (name, cached[f"thumb{i}"]) for i, name in enumerate(names)
+                ]
+            # Mark the thumbnails as recently used
+            os.utime(cache_path)
+            return thumbnails
+        except (OSError, KeyError, ValueError):
+            pass
+
+    filepath = os.path.abspath(filepath)
+    disk_cache = DiskCache(cache_dir) if cache_dir is not None else None
+    thumbnails = []
+    match INPUT_FORMATS.get(os.path.splitext(filepath)[1].lower()):
+        case "pil":
+            preview = READERS["pil"].read_pil_preview(filepath, size)
+            thumbnails.append((None, _to_uint8(preview)))
+        case "hdf5":
+            hdf5 = READERS["hdf5"]
+            for key in hdf5.list_datasets(filepath):
+                reader = hdf5.HDF5Image(filepath, key)
+                try:
+                    location = {"source": filepath, "dataset": key}
+                    thumbnails.append(
+                        (
+                            key,
+                            _image_thumbnail(
+                                reader, size, location, disk_cache
+                            ),
+                        )
+                    )
+                finally:
+                    reader.close()
+        case "fits":
+            fits = READERS["fits"]
+            for hdu in fits.list_hdus(filepath):
+                reader = fits.FITSImage(filepath, hdu.index)
+                try:
+                    location = {"source": filepath, "hdu": hdu.index}
+                    thumbnails.append(
+                        (
+                            hdu.index,
+                            _image_thumbnail(
+                                reader, size, location, disk_cache
+                            ),
+                        )
+                    )
+                finally:
+                    reader.close()
+        case _:
+            raise ValueError(f"Can't read {filepath}")
+
+    if cache_path is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.tmp{os.getpid()}.npz"
+        np.savez(
+            tmp_path,
+            names=json.dumps([name for name, _ in thumbnails]),
+            **{
+                f"thumb{i}": thumbnail
+                for i, (_, thumbnail) in enumerate(thumbnails)
+            },
+        )
+        os.replace(tmp_path, cache_path)
+
+    return thumbnails
+
+
+def evict_cache(cache_dir, max_bytes):
+    """
+    Bring the disk cache (thumbnails included) within its size limit.
+
+    Thumbnails are written by worker processes, this lets a worker evict
+    once a batch of thumbnails is done rather than on every write.
+
+    Args:
+        cache_dir (str): The disk cache directory.
+        max_bytes (int): The maximum size of the cache.
+    """
+    DiskCache(cache_dir, max_bytes).evict()
@@ -0,0 +1,80 @@
+"""Definition of the LazyRegistry class.
+
+A registry maps names (tools, file formats, ...) to the modules, or objects
+within modules, which provide them. Nothing is imported when an entry is
+registered, the module is imported the first time the entry is looked up,
+so dependencies like h5py and PIL only cost time when a file needing them
+is opened rather than every time IMage starts.
+
+Entries are given as "package.module" (the module itself) or
+"package.module:name" (an object defined in the module).
+
+Example usage:
+
+    TOOLS = LazyRegistry(
+        {"Histogram": "imagemage.tools.hist:HistogramWidget"}
+    )
+    widget = TOOLS["Histogram"](parent)
+"""
+import importlib
+import sys
+from collections.abc import Mapping
+
+
+class LazyRegistry(Mapping):
+    """
+    Named modules (or objects within them) imported on first use.
+
+    Looking up a name imports its module and returns the module or the
+    object. Iterating over the registry (or testing whether it contains a
+    name) doesn't import anything.
+    """
+
+    def __init__(self, entries=None):
+        """
+        Set up the registry.
+
+        Args:
+            entries (dict): The target ("module" or "module:name") of each
+                name.
+        """
+        self._targets = dict(entries or {})
+
+    def register(self, name, target):
+        """
+        Add (or replace) an entry.
+
+        Args:
+            name (str): The name the entry is looked up by.
+            target (str): "package.module" or "package.module:name".
+        """
+        self._targets[name] = target
+
+    def __getitem__(self, name):
+        module_name, _, attr = self._targets[name].partition(":")
+        module = importlib.import_module(module_name)
+        return getattr(module, attr) if attr else module
+
+    def __iter__(self):
+        return iter(self._targets)
+
+    def __len__(self):
+        return len(self._targets)
+
+    def loaded(self, name):
+        """
+        Get an entry only if its module has already been imported.
+
+        This is for checks like isinstance, which can't be true of an
+        object whose class was never imported.
+
+        Args:
+            name (str): The name of the entry.
+
+        Returns:
+            object: The module or object (None if it isn't imported yet).
+        """
+        module_name = self._targets[name].partition(":")[0]
+        if module_name not in sys.modules:
+            return None
+        return self[name]
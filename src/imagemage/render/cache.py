@@ -0,0 +1,171 @@
+"""Definition of the RenderCache class.
+
+Normalizing a tile is the most expensive part of a redraw. The RenderCache
+keeps normalized tiles keyed by everything that determines their pixels, so
+going back to a display state seen recently (undoing a slider move,
+toggling between two stretches) costs a dictionary lookup rather than a
+render.
+
+Keys are tuples beginning with the id of the image the entry was rendered
+from, followed by the display state and the location of the tile:
+
+    (image_id, vmin, vmax, stretch_key, level, row, col)
+
+Entries are evicted least recently used first once the cache holds more
+than its byte budget.
+
+Example usage:
+
+    cache = RenderCache(budget=128 * 2**20)
+    display = cache.get(key)
+    if display is None:
+        display = render(key)
+        cache.put(key, display, display.nbytes)
+"""
+from collections import OrderedDict
+
+# The default maximum number of bytes of normalized tiles to keep
+DEFAULT_RENDER_CACHE_BUDGET = 256 * 2**20
+
+
+class RenderCache:
+    """
+    A least recently used cache of normalized tiles with a byte budget.
+
+    Attributes:
+        budget (int): The maximum number of bytes held.
+        nbytes (int): The number of bytes currently held.
+        hits (int): The number of lookups found in the cache.
+        misses (int): The number of lookups not found in the cache.
+    """
+
+    def __init__(self, budget=DEFAULT_RENDER_CACHE_BUDGET):
+        """
+        Set up an empty cache.
+
+        Args:
+            budget (int): The maximum number of bytes to hold.
+        """
+        self.budget = budget
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (value, nbytes), least recently used first
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def hit_rate(self):
+        """The fraction of lookups found in the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def get(self, key):
+        """
+        Look up an entry, marking it as recently used.
+
+        Args:
+            key (tuple): The key of the entry.
+
+        Returns:
+            object: The cached value (None if it is not cached).
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, nbytes):
+        """
+        Add an entry, evicting the least recently used entries if needed.
+
+        Entries larger than the whole budget are not cached.
+
+        Args:
+            key (tuple): The key of the entry.
+            value (object): The value to cache.
+            nbytes (int): The memory held by the value.
+        """
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        if nbytes > self.budget:
+            return
+
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        self._evict(self.budget)
+
+    def set_budget(self, budget):
+        """
+        Change the byte budget, evicting entries if it has shrunk.
+
+        Args:
+            budget (int): The new maximum number of bytes to hold.
+        """
+        self.budget = budget
+        self._evict(budget)
+
+    def _evict(self, budget):
+        """Drop least recently used entries until at most budget is held."""
+        while self.nbytes > budget and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+    def image_nbytes(self, image_id):
+        """
+        Count the bytes held for one image.
+
+        Args:
+            image_id (int): The id of the image.
+
+        Returns:
+            int: The bytes of the image's entries.
+        """
+        return sum(
+            nbytes
+            for key, (_, nbytes) in self._entries.items()
+            if key[0] == image_id
+        )
+
+    def clear(self, image_id=None):
+        """
+        Remove entries from the cache.
+
+        Args:
+            image_id (int): Only remove the entries rendered from this image
+                (all entries if None).
+        """
+        if image_id is None:
+            self._entries.clear()
+            self.nbytes = 0
+            return
+
+        for key in [key for key in self._entries if key[0] == image_id]:
+            self.nbytes -= self._entries.pop(key)[1]
+
+    def stats(self):
+        """
+        Get a summary of the cache's state and effectiveness.
+
+        Returns:
+            dict: The number of entries, bytes held, budget, hits, misses
+                and hit rate.
+        """
+        return {
+            "entries": len(self._entries),
+            "nbytes": self.nbytes,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
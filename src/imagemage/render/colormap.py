@@ -0,0 +1,61 @@
+"""Colour tables for displaying normalized images with a colormap.
+
+A colormap is applied by displaying the normalized uint8 image as an
+Indexed8 QImage whose 256 entry colour table is sampled from a matplotlib
+colormap. The pixels never change, so switching colormap only swaps the
+table rather than converting every pixel to RGB.
+
+matplotlib is only imported the first time a table is built.
+
+Example usage:
+
+    table = get_color_table("viridis")
+    q_image = array_to_qimage(normalized, color_table=table)
+"""
+from functools import lru_cache
+
+import numpy as np
+from PyQt5.QtGui import qRgb
+
+# The colormaps offered in the GUI ("gray" needs no table)
+COLORMAPS = (
+    "gray",
+    "viridis",
+    "plasma",
+    "inferno",
+    "magma",
+    "cividis",
+    "hot",
+    "afmhot",
+    "cubehelix",
+    "coolwarm",
+    "RdBu_r",
+    "twilight",
+)
+
+# The number of entries in a colour table (one per uint8 display value)
+TABLE_SIZE = 256
+
+
+@lru_cache(maxsize=None)
+def get_color_table(name):
+    """
+    Get the colour table for a colormap.
+
+    Args:
+        name (str): The name of a matplotlib colormap (a "_r" suffix
+            reverses it).
+
+    Returns:
+        list: The TABLE_SIZE QRgb values of the colormap (None for "gray",
+            which is displayed as Grayscale8 directly).
+    """
+    if name == "gray":
+        return None
+
+    import matplotlib
+
+    cmap = matplotlib.colormaps[name]
+    rgba = cmap(np.linspace(0, 1, TABLE_SIZE), bytes=True)
+
+    return [qRgb(int(r), int(g), int(b)) for r, g, b, _ in rgba]
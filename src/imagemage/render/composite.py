@@ -0,0 +1,494 @@
+"""Definition of the Composite and CompositeBand classes.
+
+A Composite combines N single band images (FITS, HDF5 or PIL readers) into
+one RGB image. Each band has its own display limits, stretch and colour,
+a band's normalized values are multiplied by its colour and the bands are
+summed (and clipped) to give the RGB image.
+
+The blend never touches floats: each band's contribution is a gather from
+a (256, 3) uint16 table of its colour times every display value, the
+contributions are summed in uint16 in cache sized blocks of rows and
+clipped into the uint8 output. The normalized tiles of each band are
+cached by the band's display state, so re-stretching one band only
+renormalizes that band and re-colouring a band only re-blends.
+
+Bands needn't be aligned: a band given a transform (see
+render.registration) is resampled onto the first band's pixel grid as its
+tiles and regions are read, the resampled band is never stored.
+
+Example usage:
+
+    composite = Composite()
+    composite.add_band(CompositeBand(red_reader, color=(1, 0, 0)))
+    composite.add_band(CompositeBand(green_reader, color=(0, 1, 0)))
+    composite.add_band(CompositeBand(blue_reader, color=(0, 0, 1)))
+    composite.set_band_display(2, vmin, vmax, get_stretch("asinh"))
+    rgb = composite.tile(level, row, col)
+"""
+import itertools
+
+import numpy as np
+
+from imagemage.readers.sampling import sample_pixels, samples_for_accuracy
+from imagemage.render.cache import DEFAULT_RENDER_CACHE_BUDGET, RenderCache
+from imagemage.render.limits import DEFAULT_RANK_ERROR, compute_limits
+from imagemage.render.normalize import BLOCK_SIZE, Normalizer, iter_blocks
+from imagemage.render.pyramid import ImagePyramid
+from imagemage.render.registration import (
+    ResampledImage,
+    ResampledPyramid,
+    Transform,
+)
+from imagemage.render.stretch import get_stretch
+
+# The colours given to bands which aren't given one (red, green, blue, ...)
+DEFAULT_BAND_COLORS = (
+    (1.0, 0.0, 0.0),
+    (0.0, 1.0, 0.0),
+    (0.0, 0.0, 1.0),
+    (0.0, 1.0, 1.0),
+    (1.0, 0.0, 1.0),
+    (1.0, 1.0, 0.0),
+)
+
+# Source of unique ids for bands (part of their cache keys)
+_band_ids = itertools.count()
+
+
+def color_lut(color):
+    """
+    Build the table of a colour's contribution for every display value.
+
+    Args:
+        color (tuple): The (r, g, b) weights of the colour (0-1, larger
+            weights brighten the band).
+
+    Returns:
+        np.ndarray: The (256, 3) uint16 contributions.
+    """
+    values = np.arange(256, dtype=np.float32)[:, None]
+    weights = np.asarray(color, dtype=np.float32)[None, :]
+    return np.rint(np.clip(values * weights, 0, 255)).astype(np.uint16)
+
+
+def blend(normalized, luts, out=None, scratch=None, block_size=BLOCK_SIZE):
+    """
+    Blend normalized bands into an RGB image.
+
+    Args:
+        normalized (list): The normalized uint8 bands (all the same shape).
+        luts (list): The (256, 3) uint16 colour tables of the bands (see
+            color_lut).
+        out (np.ndarray): An optional (h, w, 3) uint8 output array.
+        scratch (tuple): Optional pair of uint16 arrays of at least
+            (block rows, w, 3) to accumulate in.
+        block_size (int): The number of pixels blended at once.
+
+    Returns:
+        np.ndarray: The (h, w, 3) uint8 RGB image.
+    """
+    shape = normalized[0].shape
+    if out is None:
+        out = np.empty(shape + (3,), dtype=np.uint8)
+
+    block_rows = max(1, block_size // max(shape[1], 1))
+    if scratch is None:
+        scratch = (
+            np.empty((block_rows, shape[1], 3), dtype=np.uint16),
+            np.empty((block_rows, shape[1], 3), dtype=np.uint16),
+        )
+    acc_buf, tmp_buf = scratch
+
+    for start, end in iter_blocks(normalized[0], block_size):
+        acc = acc_buf[: end - start, : shape[1]]
+        tmp = tmp_buf[: end - start, : shape[1]]
+
+        np.take(luts[0], normalized[0][start:end], axis=0, out=acc)
+        for band, lut in zip(normalized[1:], luts[1:]):
+            np.take(lut, band[start:end], axis=0, out=tmp)
+            np.add(acc, tmp, out=acc)
+
+        np.minimum(acc, 255, out=acc)
+        out[start:end] = acc
+
+    return out
+
+
+class CompositeBand:
+    """
+    One single band image in a Composite.
+
+    Attributes:
+        source (array-like): The band's image (can be lazy).
+        pyramid (ImagePyramid): The band's own pyramid.
+        transform (Transform): The transform from the composite's
+            reference grid to the band (None if the band is the grid).
+        image (array-like): The band on the reference grid (the source
+            itself without a transform).
+        image_pyramid (ImagePyramid/ResampledPyramid): The pyramid the
+            band is rendered from (on the reference grid).
+        name (str): The name shown for the band.
+        color (tuple): The (r, g, b) weights of the band's colour.
+        vmin (float): The band's lower display limit.
+        vmax (float): The band's upper display limit.
+        stretch (Stretch): The band's stretch.
+        sample (np.ndarray): A sample of the band's pixel values.
+        hist_index (HistogramIndex): The band's fine histogram (built by
+            whoever needs it first).
+        normalizer (Normalizer): The band's own normalizer (so each band
+            keeps its lookup tables).
+        id (int): A unique id for the band.
+    """
+
+    def __init__(
+        self,
+        source,
+        pyramid=None,
+        name="band",
+        color=(1.0, 1.0, 1.0),
+        limits=None,
+        stretch=None,
+        sample=None,
+    ):
+        """
+        Set up the band.
+
+        Args:
+            source (array-like): The band's (2D) image.
+            pyramid (ImagePyramid): The band's pyramid (built if None).
+            name (str): The name shown for the band.
+            color (tuple): The (r, g, b) weights of the band's colour.
+            limits (tuple): The initial (vmin, vmax) (the extent of the
+                sample if None).
+            stretch (Stretch): The initial stretch (linear if None).
+            sample (np.ndarray): A sample of the band's values (drawn if
+                None).
+        """
+        if len(source.shape) != 2:
+            raise ValueError(
+                f"A composite band must be a single band (2D) image, "
+                f"got shape {source.shape}"
+            )
+
+        self.source = source
+        self.pyramid = pyramid if pyramid is not None else ImagePyramid(source)
+        self.transform = None
+        self.image = source
+        self.image_pyramid = self.pyramid
+        self.name = name
+        self.color = tuple(float(c) for c in color)
+        self.lut = color_lut(self.color)
+
+        if sample is None:
+            sample = sample_pixels(
+                source, samples_for_accuracy(DEFAULT_RANK_ERROR)
+            )
+        self.sample = sample
+        self.hist_index = None
+
+        if limits is None:
+            limits = compute_limits(None, "minmax", sample=sample)
+        self.vmin, self.vmax = limits
+        self.stretch = (
+            stretch if stretch is not None else get_stretch("linear")
+        )
+
+        self.normalizer = Normalizer()
+        self.id = next(_band_ids)
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def key(self):
+        """A hashable key identifying the band's normalized pixels."""
+        transform = self.transform.key if self.transform is not None else None
+        return (self.id, self.vmin, self.vmax, self.stretch.key, transform)
+
+    def set_transform(self, transform, shape=None):
+        """
+        Resample the band onto a reference pixel grid.
+
+        Args:
+            transform (Transform): The reference to band transform (None
+                to display the band's own pixels).
+            shape (tuple): The (rows, columns) of the reference (the
+                band's own shape if None).
+        """
+        shape = tuple(shape if shape is not None else self.source.shape)
+        self.transform = transform
+        if transform is None and shape == tuple(self.source.shape):
+            self.image = self.source
+            self.image_pyramid = self.pyramid
+        else:
+            transform = transform if transform is not None else Transform()
+            self.image = ResampledImage(self.source, transform, shape)
+            self.image_pyramid = ResampledPyramid(
+                self.pyramid, transform, shape
+            )
+
+    def set_display(self, vmin, vmax, stretch=None):
+        """
+        Change the band's limits and (optionally) stretch.
+
+        Args:
+            vmin (float): The value mapped to black.
+            vmax (float): The value mapped to the band's colour.
+            stretch (Stretch): The new stretch (unchanged if None).
+        """
+        self.vmin = vmin
+        self.vmax = vmax
+        if stretch is not None:
+            self.stretch = stretch
+
+        # Make sure data dependent stretches are keyed by the new limits
+        self.stretch.update_limits(vmin, vmax)
+
+    def set_color(self, color):
+        """
+        Change the band's colour.
+
+        Args:
+            color (tuple): The (r, g, b) weights of the colour.
+        """
+        self.color = tuple(float(c) for c in color)
+        self.lut = color_lut(self.color)
+
+    def normalize(self, arr):
+        """
+        Normalize some of the band's values with its display settings.
+
+        The result is the normalizer's reused buffer.
+
+        Args:
+            arr (np.ndarray): The values.
+
+        Returns:
+            np.ndarray: The normalized uint8 values.
+        """
+        return self.normalizer(arr, self.vmin, self.vmax, self.stretch)
+
+    def close(self):
+        """Close any file backing the band."""
+        if hasattr(self.source, "close"):
+            self.source.close()
+
+
+class Composite:
+    """
+    An RGB composite of single band images.
+
+    The first band is the reference: tiles and levels follow its pyramid
+    and every other band is displayed on its pixel grid (bands of another
+    shape are resampled onto it, see set_band_transform).
+
+    Attributes:
+        bands (list): The CompositeBands.
+        active (int): The index of the band being edited (e.g. by the
+            histogram tool).
+        cache (RenderCache): The normalized tiles of the bands, keyed by
+            each band's display state.
+    """
+
+    def __init__(self, bands=(), cache_budget=DEFAULT_RENDER_CACHE_BUDGET):
+        """
+        Set up the composite.
+
+        Args:
+            bands (list): The initial CompositeBands.
+            cache_budget (int): The maximum number of bytes of normalized
+                band tiles to keep.
+        """
+        self.bands = []
+        self.active = 0
+        self.cache = RenderCache(cache_budget)
+
+        # Scratch buffers for blending keyed by their shape
+        self._scratch = {}
+
+        for band in bands:
+            self.add_band(band)
+
+    def __len__(self):
+        return len(self.bands)
+
+    @property
+    def shape(self):
+        return self.bands[0].shape if self.bands else None
+
+    @property
+    def pyramid(self):
+        """The pyramid defining the composite's tiles and levels."""
+        return self.bands[0].pyramid if self.bands else None
+
+    @property
+    def active_band(self):
+        return self.bands[self.active] if self.bands else None
+
+    @property
+    def key(self):
+        """A hashable key identifying the composite's rendered pixels."""
+        return tuple(band.key + band.color for band in self.bands)
+
+    def next_color(self):
+        """The default colour for the next band added."""
+        return DEFAULT_BAND_COLORS[len(self.bands) % len(DEFAULT_BAND_COLORS)]
+
+    def add_band(self, band):
+        """
+        Add a band to the composite.
+
+        A band of a different shape to the reference is placed on the
+        reference's grid with an identity transform (its top left corner on
+        the reference's) until it is aligned.
+
+        Args:
+            band (CompositeBand): The band.
+        """
+        if self.bands and band.shape != self.shape:
+            band.set_transform(band.transform or Transform(), self.shape)
+        self.bands.append(band)
+
+    def remove_band(self, index):
+        """
+        Remove (and close) a band.
+
+        Args:
+            index (int): The index of the band.
+        """
+        band = self.bands.pop(index)
+        self.cache.clear(band.id)
+        band.close()
+        self.active = min(self.active, max(len(self.bands) - 1, 0))
+
+    def set_band_display(self, index, vmin, vmax, stretch=None):
+        """
+        Change the limits and (optionally) stretch of a band.
+
+        Args:
+            index (int): The index of the band.
+            vmin (float): The value mapped to black.
+            vmax (float): The value mapped to the band's colour.
+            stretch (Stretch): The new stretch (unchanged if None).
+        """
+        self.bands[index].set_display(vmin, vmax, stretch)
+
+    def set_band_color(self, index, color):
+        """
+        Change the colour of a band.
+
+        Args:
+            index (int): The index of the band.
+            color (tuple): The (r, g, b) weights of the colour.
+        """
+        self.bands[index].set_color(color)
+
+    def set_band_transform(self, index, transform):
+        """
+        Align a band with the reference (the first band).
+
+        Args:
+            index (int): The index of the band.
+            transform (Transform): The reference to band transform (see
+                render.registration.register), None to remove it.
+
+        Raises:
+            ValueError: If the band is the reference.
+        """
+        if index == 0:
+            raise ValueError("The first band is the composite's reference")
+        band = self.bands[index]
+        self.cache.clear(band.id)
+        band.set_transform(transform, self.shape)
+
+    def band_tile(self, band, level, row, col):
+        """
+        Get a band's normalized tile, from the cache if possible.
+
+        Args:
+            band (CompositeBand): The band.
+            level (int): The pyramid level.
+            row (int): The tile row.
+            col (int): The tile column.
+
+        Returns:
+            np.ndarray: The normalized uint8 tile.
+        """
+        key = band.key + (level, row, col)
+        normalized = self.cache.get(key)
+        if normalized is None:
+            tile = band.image_pyramid.tile(level, row, col)
+            normalized = band.normalize(tile).copy()
+            self.cache.put(key, normalized, normalized.nbytes)
+        return normalized
+
+    def _get_scratch(self, ncols):
+        """Get the blend scratch buffers for images ncols wide."""
+        block_rows = max(1, BLOCK_SIZE // max(ncols, 1))
+        shape = (block_rows, ncols, 3)
+        if shape not in self._scratch:
+            self._scratch.clear()
+            self._scratch[shape] = (
+                np.empty(shape, dtype=np.uint16),
+                np.empty(shape, dtype=np.uint16),
+            )
+        return self._scratch[shape]
+
+    def tile(self, level, row, col, out=None):
+        """
+        Render one tile of the composite.
+
+        Args:
+            level (int): The pyramid level.
+            row (int): The tile row.
+            col (int): The tile column.
+            out (np.ndarray): An optional (h, w, 3) uint8 output array.
+
+        Returns:
+            np.ndarray: The (h, w, 3) uint8 RGB tile.
+        """
+        normalized = [
+            self.band_tile(band, level, row, col) for band in self.bands
+        ]
+        return blend(
+            normalized,
+            [band.lut for band in self.bands],
+            out=out,
+            scratch=self._get_scratch(normalized[0].shape[1]),
+        )
+
+    def render(self, rows=slice(None), cols=slice(None), out=None):
+        """
+        Render a region of the composite at full resolution.
+
+        The bands are read straight from their sources, resampled if they
+        have transforms (so this is the path for exporting the composite,
+        the display uses tile). Each band
+        has its own normalizer so their buffers can be blended directly.
+
+        Args:
+            rows (slice): The rows to render.
+            cols (slice): The columns to render.
+            out (np.ndarray): An optional (h, w, 3) uint8 output array.
+
+        Returns:
+            np.ndarray: The (h, w, 3) uint8 RGB image.
+        """
+        normalized = [
+            band.normalize(np.asarray(band.image[rows, cols]))
+            for band in self.bands
+        ]
+        return blend(
+            normalized,
+            [band.lut for band in self.bands],
+            out=out,
+            scratch=self._get_scratch(normalized[0].shape[1]),
+        )
+
+    def close(self):
+        """Close all the bands."""
+        for band in self.bands:
+            band.close()
+        self.bands = []
+        self.cache.clear()
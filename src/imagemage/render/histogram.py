@@ -0,0 +1,187 @@
+"""Definition of the HistogramIndex class.
+
+A HistogramIndex is a very fine histogram of an image built once when the
+image is opened, stored as its cumulative sum. Any coarser histogram (any
+number of bins, any range, linear or log spaced) is then derived by
+interpolating the cumulative sum at the new bin edges, which costs time
+proportional to the number of bins rather than the number of pixels.
+
+Indexes are remembered for the arrays they were built from (see
+index_for), so showing an image again (or an image whose index was read
+from the disk cache) doesn't rebuild its index.
+
+Example usage:
+
+    index = HistogramIndex(img_sample)
+    counts = index.rebin(np.linspace(vmin, vmax, 51))
+"""
+import weakref
+
+import numpy as np
+
+# The number of fine bins used for float data
+FINE_BINS = 2**16
+
+# The largest range of integer values binned exactly with bincount
+MAX_INT_RANGE = 2**20
+
+# The index of each array an index has been built for, keyed by the id of
+# the array (with a weak reference to check the array is still the same)
+_indexes = {}
+
+
+class HistogramIndex:
+    """
+    A fine cumulative histogram supporting fast rebinning.
+
+    Attributes:
+        edges (np.ndarray): The edges of the fine bins.
+        cumulative (np.ndarray): The number of values below each edge.
+        total (int): The total number of (finite) values.
+        exact (bool): Whether each fine bin holds exactly one integer value.
+    """
+
+    def __init__(self, data, nbins=FINE_BINS):
+        """
+        Build the index.
+
+        Args:
+            data (np.ndarray): The image values (or a sample of them).
+            nbins (int): The number of fine bins to use for float data.
+        """
+        data = np.ravel(data)
+        if data.dtype.kind == "f":
+            data = data[np.isfinite(data)]
+
+        if data.size == 0:
+            self.edges = np.array([0.0, 1.0])
+            self.cumulative = np.array([0.0, 0.0])
+            self.total = 0
+            self.exact = False
+            return
+
+        vmin, vmax = data.min(), data.max()
+
+        if data.dtype.kind in "iub" and int(vmax) - int(vmin) < MAX_INT_RANGE:
+            # One bin per integer value, [v, v + 1)
+            counts = np.bincount(
+                (data.astype(np.int64) - int(vmin)).astype(np.intp)
+            )
+            self.edges = int(vmin) + np.arange(counts.size + 1, dtype=float)
+            self.exact = True
+        else:
+            if vmax <= vmin:
+                vmax = vmin + 1
+            counts, self.edges = np.histogram(
+                data, bins=nbins, range=(float(vmin), float(vmax))
+            )
+            self.exact = False
+
+        self.cumulative = np.zeros(counts.size + 1, dtype=float)
+        np.cumsum(counts, out=self.cumulative[1:])
+        self.total = int(self.cumulative[-1])
+
+    @classmethod
+    def from_cumulative(cls, edges, cumulative, exact=False):
+        """
+        Make an index from a cumulative histogram built earlier.
+
+        Args:
+            edges (np.ndarray): The edges of the fine bins.
+            cumulative (np.ndarray): The number of values below each edge.
+            exact (bool): Whether each fine bin holds exactly one integer
+                value.
+
+        Returns:
+            HistogramIndex: The index.
+        """
+        index = cls.__new__(cls)
+        index.edges = edges
+        index.cumulative = cumulative
+        index.total = int(cumulative[-1])
+        index.exact = exact
+        return index
+
+    @property
+    def min(self):
+        return self.edges[0]
+
+    @property
+    def max(self):
+        return self.edges[-1]
+
+    def count_below(self, values):
+        """
+        The number of values below each of the given values.
+
+        Counts are interpolated linearly within a fine bin.
+
+        Args:
+            values (np.ndarray): The values to evaluate at.
+
+        Returns:
+            np.ndarray: The (interpolated) counts.
+        """
+        return np.interp(values, self.edges, self.cumulative)
+
+    def rebin(self, bins):
+        """
+        Derive a histogram with the given bin edges.
+
+        Args:
+            bins (np.ndarray): The monotonically increasing bin edges.
+
+        Returns:
+            np.ndarray: The counts in each bin.
+        """
+        return np.diff(self.count_below(bins))
+
+    def quantile(self, q):
+        """
+        The value below which a given fraction of the values lie.
+
+        Args:
+            q (float/np.ndarray): The fraction(s) in [0, 1].
+
+        Returns:
+            float/np.ndarray: The value(s).
+        """
+        return np.interp(
+            np.asarray(q) * self.total, self.cumulative, self.edges
+        )
+
+
+def remember_index(data, index):
+    """
+    Remember the index of an array (see index_for).
+
+    Args:
+        data (np.ndarray): The array.
+        index (HistogramIndex): Its index.
+
+    Returns:
+        HistogramIndex: The index.
+    """
+    # Forget the arrays which have since been freed
+    for key, (ref, _) in list(_indexes.items()):
+        if ref() is None:
+            del _indexes[key]
+
+    _indexes[id(data)] = (weakref.ref(data), index)
+    return index
+
+
+def index_for(data):
+    """
+    Get the index of an array, only building it the first time.
+
+    Args:
+        data (np.ndarray): The image values (or a sample of them).
+
+    Returns:
+        HistogramIndex: The index.
+    """
+    entry = _indexes.get(id(data))
+    if entry is not None and entry[0]() is data:
+        return entry[1]
+    return remember_index(data, HistogramIndex(data))
@@ -0,0 +1,153 @@
+"""Automatic display limits.
+
+Display limits are estimated from a sample of the image rather than every
+pixel, so the limits of a huge lazily read image arrive without reading all
+of it. The sample size is chosen from the accuracy wanted for the quantiles
+(see readers.sampling.samples_for_accuracy).
+
+The available modes are:
+
+    - "minmax": the minimum and maximum of the sample.
+    - "percentile": clip to a pair of percentiles (e.g. 0.5 and 99.5).
+    - "zscale": the IRAF zscale algorithm, which fits a line to the sorted
+      sample to find limits around the median suited to astronomical images.
+
+Example usage:
+
+    vmin, vmax = compute_limits(img_arr, "percentile", low=1, high=99)
+"""
+import numpy as np
+
+from imagemage.readers.sampling import sample_pixels, samples_for_accuracy
+
+# The available modes
+AUTO_LIMITS = ("minmax", "percentile", "zscale")
+
+# The default rank accuracy of the sampled quantiles (fraction of pixels)
+DEFAULT_RANK_ERROR = 0.001
+
+# The number of pixels zscale fits a line to
+ZSCALE_NSAMPLES = 1000
+
+
+def zscale(
+    sample,
+    contrast=0.25,
+    krej=2.5,
+    max_reject=0.5,
+    min_npixels=5,
+    max_iterations=5,
+):
+    """
+    Compute limits with the IRAF zscale algorithm.
+
+    Args:
+        sample (np.ndarray): The (finite) sample of pixel values.
+        contrast (float): The scaling applied to the slope of the fit.
+        krej (float): The rejection threshold in standard deviations.
+        max_reject (float): The maximum fraction of pixels to reject.
+        min_npixels (int): The minimum number of pixels left after
+            rejection.
+        max_iterations (int): The maximum number of rejection iterations.
+
+    Returns:
+        tuple: The (vmin, vmax) limits.
+    """
+    # Fit to an evenly spaced subset
+    if sample.size > ZSCALE_NSAMPLES:
+        sample = sample[:: sample.size // ZSCALE_NSAMPLES]
+    sample = np.sort(sample)
+
+    npix = sample.size
+    vmin, vmax = sample[0], sample[-1]
+    center = (npix - 1) // 2
+    if npix % 2 == 1:
+        median = sample[center]
+    else:
+        median = 0.5 * (sample[center] + sample[center + 1])
+
+    minpix = max(min_npixels, int(npix * max_reject))
+    ngrow = max(1, int(npix * 0.01))
+    x = np.arange(npix)
+
+    # Iteratively fit a line, rejecting outliers
+    badpix = np.zeros(npix, dtype=bool)
+    ngoodpix = npix
+    last_ngoodpix = npix + 1
+    slope = 0.0
+    for _ in range(max_iterations):
+        if ngoodpix >= last_ngoodpix or ngoodpix < minpix:
+            break
+
+        slope, intercept = np.polyfit(x, sample, 1, w=(~badpix).astype(int))
+        flat = sample - (slope * x + intercept)
+
+        threshold = krej * flat[~badpix].std()
+        badpix[(flat < -threshold) | (flat > threshold)] = True
+
+        # Grow the rejected pixels
+        badpix = np.convolve(badpix, np.ones(ngrow), mode="same") > 0
+
+        last_ngoodpix = ngoodpix
+        ngoodpix = np.sum(~badpix)
+
+    if ngoodpix >= minpix:
+        if contrast > 0:
+            slope /= contrast
+        vmin = max(vmin, median - center * slope)
+        vmax = min(vmax, median + (npix - center - 1) * slope)
+
+    return vmin, vmax
+
+
+def compute_limits(
+    source,
+    mode="minmax",
+    low=0.5,
+    high=99.5,
+    rank_error=DEFAULT_RANK_ERROR,
+    confidence=0.99,
+    sample=None,
+):
+    """
+    Compute display limits from a sample of an image.
+
+    Args:
+        source (array-like): The image array, can be lazy.
+        mode (str): One of AUTO_LIMITS.
+        low (float): The lower percentile for the "percentile" mode.
+        high (float): The upper percentile for the "percentile" mode.
+        rank_error (float): The accuracy of the sampled quantiles as a
+            fraction of the number of pixels, sets the sample size.
+        confidence (float): The probability of the sampled quantiles being
+            within rank_error.
+        sample (np.ndarray): A precomputed sample of the pixels, if given
+            source is not read.
+
+    Returns:
+        tuple: The (vmin, vmax) limits as floats.
+    """
+    if mode not in AUTO_LIMITS:
+        raise ValueError(
+            f"Unknown limits mode {mode} (available: {AUTO_LIMITS})"
+        )
+
+    if sample is None:
+        sample = sample_pixels(
+            source, samples_for_accuracy(rank_error, confidence)
+        )
+
+    # Ignore NaNs (e.g. FITS blanks) and infinities
+    if sample.dtype.kind == "f":
+        sample = sample[np.isfinite(sample)]
+    if sample.size == 0:
+        return 0.0, 1.0
+
+    if mode == "minmax":
+        vmin, vmax = sample.min(), sample.max()
+    elif mode == "percentile":
+        vmin, vmax = np.percentile(sample, (low, high))
+    else:
+        vmin, vmax = zscale(sample)
+
+    return float(vmin), float(vmax)
@@ -0,0 +1,266 @@
+"""Definition of the Normalizer class.
+
+The Normalizer maps raw image values onto the 8-bit range used for display
+given the current display limits. It avoids the full size temporaries a naive
+clip/subtract/divide/cast would allocate:
+
+    - 8 and 16 bit integer images are mapped with a lookup table holding the
+      display value of every possible pixel value. The table is only rebuilt
+      when the limits change and is applied with a single gather.
+    - All other images are processed in float32 in blocks of rows small
+      enough to stay in cache, writing into a reused output buffer, so each
+      pixel is read from and written to main memory once.
+
+Example usage:
+
+    normalizer = Normalizer()
+    display = normalizer(img_arr, vmin, vmax)
+"""
+import numpy as np
+
+from imagemage.render.stretch import LinearStretch
+
+# The number of elements processed at once on the float path
+BLOCK_SIZE = 2**16
+
+# The number of entries in the lookup table of a stretch used for floats
+FLOAT_LUT_SIZE = 2**16
+
+# The dtypes which are mapped with a lookup table
+LUT_DTYPES = (
+    np.dtype(np.uint8),
+    np.dtype(np.int8),
+    np.dtype(np.uint16),
+    np.dtype(np.int16),
+)
+
+
+def linear_scale(vmin, vmax, top=255.0):
+    """
+    Get the multiplier mapping the range [vmin, vmax] onto [0, top].
+
+    Args:
+        vmin (float): The value mapped to 0.
+        vmax (float): The value mapped to top.
+        top (float): The top of the output range.
+
+    Returns:
+        float: The scale factor.
+    """
+    span = float(vmax) - float(vmin)
+    if span <= 0:
+        return np.inf
+    return top / span
+
+
+def to_uint8(values):
+    """
+    Convert stretched values in [0, 1] to uint8 display values.
+
+    Args:
+        values (np.ndarray): The float values (overwritten).
+
+    Returns:
+        np.ndarray: The uint8 display values.
+    """
+    np.clip(values, 0, 1, out=values)
+    np.multiply(values, 255, out=values)
+    np.nan_to_num(values, copy=False, nan=0.0)
+    return values.astype(np.uint8)
+
+
+def iter_blocks(arr, block_size=BLOCK_SIZE):
+    """
+    Split an array into blocks of whole rows of roughly block_size elements.
+
+    Args:
+        arr (np.ndarray): The array to split.
+        block_size (int): The target number of elements per block.
+
+    Yields:
+        tuple: The (start, end) rows of each block.
+    """
+    nrows = arr.shape[0]
+    row_size = max(arr[0].size, 1) if nrows > 0 else 1
+    block_rows = max(1, block_size // row_size)
+    for start in range(0, nrows, block_rows):
+        yield start, min(start + block_rows, nrows)
+
+
+class Normalizer:
+    """
+    Maps image values to uint8 display values.
+
+    Attributes:
+        lut (np.ndarray): The current lookup table (None until an integer
+            image has been normalized).
+        float_lut (np.ndarray): The current lookup table of the stretch used
+            for float images (None until a float image has been normalized
+            with a non-linear stretch).
+    """
+
+    def __init__(self):
+        """Initialise the (empty) lookup tables and buffers."""
+        self.lut = None
+        self._lut_key = None
+        self.float_lut = None
+        self._float_lut_key = None
+
+        # Reused output and scratch buffers keyed by shape
+        self._out_buffers = {}
+        self._scratch = np.empty(BLOCK_SIZE, dtype=np.float32)
+
+    def __call__(self, arr, vmin, vmax, stretch=None, out=None):
+        """
+        Normalize an array to uint8 for display.
+
+        Args:
+            arr (np.ndarray): The image values.
+            vmin (float): The value mapped to 0.
+            vmax (float): The value mapped to 255.
+            stretch (Stretch): The stretch to apply (linear if None).
+            out (np.ndarray): The uint8 array to write into. If not given a
+                buffer owned by the Normalizer is reused, this is only valid
+                until the next call with an array of the same shape.
+
+        Returns:
+            np.ndarray: The normalized uint8 image.
+        """
+        arr = np.asarray(arr)
+        if out is None:
+            out = self._get_buffer(arr.shape)
+
+        if stretch is None:
+            stretch = LinearStretch()
+        stretch.update_limits(vmin, vmax)
+
+        if arr.dtype in LUT_DTYPES:
+            self._apply_lut(arr, vmin, vmax, stretch, out)
+        elif stretch.is_linear:
+            self._apply_float(arr, vmin, vmax, out)
+        else:
+            self._apply_float_lut(arr, vmin, vmax, stretch, out)
+
+        return out
+
+    def _get_buffer(self, shape):
+        """Get a reusable uint8 output buffer of the given shape."""
+        buf = self._out_buffers.get(shape)
+        if buf is None:
+            # Edge tiles come in a handful of shapes, don't keep every one
+            if len(self._out_buffers) > 8:
+                self._out_buffers.clear()
+            buf = np.empty(shape, dtype=np.uint8)
+            self._out_buffers[shape] = buf
+        return buf
+
+    def build_lut(self, dtype, vmin, vmax, stretch):
+        """
+        Build the lookup table for an integer dtype (if not already built).
+
+        The table is indexed by the pixel's bit pattern as an unsigned
+        integer, so signed images are viewed as unsigned before the lookup.
+
+        Args:
+            dtype (np.dtype): The dtype of the image.
+            vmin (float): The value mapped to 0.
+            vmax (float): The value mapped to 255.
+            stretch (Stretch): The stretch to apply.
+
+        Returns:
+            np.ndarray: The lookup table.
+        """
+        key = (dtype, vmin, vmax, stretch.key)
+        if key == self._lut_key:
+            return self.lut
+
+        # Every possible value in bit pattern order
+        udtype = np.dtype(f"u{dtype.itemsize}")
+        values = np.arange(2 ** (8 * dtype.itemsize), dtype=udtype)
+        values = values.view(dtype).astype(np.float32)
+
+        # Normalize to [0, 1] and stretch
+        values -= np.float32(vmin)
+        values *= np.float32(linear_scale(vmin, vmax, top=1.0))
+        np.clip(values, 0, 1, out=values)
+        np.nan_to_num(values, copy=False, nan=0.0)
+
+        self.lut = to_uint8(stretch(values))
+        self._lut_key = key
+        return self.lut
+
+    def build_float_lut(self, stretch):
+        """
+        Build the lookup table of a stretch (if not already built).
+
+        The table holds the display value of FLOAT_LUT_SIZE evenly spaced
+        normalized values, it does not depend on the limits.
+
+        Args:
+            stretch (Stretch): The stretch to apply.
+
+        Returns:
+            np.ndarray: The lookup table.
+        """
+        if stretch.key == self._float_lut_key:
+            return self.float_lut
+
+        values = np.linspace(0, 1, FLOAT_LUT_SIZE, dtype=np.float32)
+        self.float_lut = to_uint8(stretch(values))
+        self._float_lut_key = stretch.key
+        return self.float_lut
+
+    def _apply_lut(self, arr, vmin, vmax, stretch, out):
+        """Normalize an 8/16 bit integer array with a lookup table."""
+        lut = self.build_lut(arr.dtype, vmin, vmax, stretch)
+        udtype = np.dtype(f"u{arr.dtype.itemsize}")
+        arr = arr.view(udtype)
+
+        # Working in blocks keeps numpy's index conversion in cache
+        for start, end in iter_blocks(arr):
+            np.take(lut, arr[start:end], out=out[start:end])
+
+    def _scale_blocks(self, arr, vmin, vmax, top):
+        """
+        Linearly scale an array onto [0, top] one cache sized block at a time.
+
+        Args:
+            arr (np.ndarray): The image values.
+            vmin (float): The value mapped to 0.
+            vmax (float): The value mapped to top.
+            top (float): The top of the output range.
+
+        Yields:
+            tuple: The (start, end) rows of the block and the scaled float32
+                values of the block (a reused scratch buffer).
+        """
+        scale = np.float32(linear_scale(vmin, vmax, top))
+        offset = np.float32(vmin)
+
+        for start, end in iter_blocks(arr):
+            src = arr[start:end]
+            if src.size > self._scratch.size:
+                self._scratch = np.empty(src.size, dtype=np.float32)
+            tmp = self._scratch[: src.size].reshape(src.shape)
+
+            np.subtract(src, offset, out=tmp, casting="unsafe")
+            np.multiply(tmp, scale, out=tmp)
+            np.clip(tmp, 0, top, out=tmp)
+
+            # NaNs (e.g. FITS blanks) are shown as the minimum
+            np.nan_to_num(tmp, copy=False, nan=0.0)
+
+            yield start, end, tmp
+
+    def _apply_float(self, arr, vmin, vmax, out):
+        """Normalize any array with the linear stretch."""
+        for start, end, tmp in self._scale_blocks(arr, vmin, vmax, 255):
+            np.copyto(out[start:end], tmp, casting="unsafe")
+
+    def _apply_float_lut(self, arr, vmin, vmax, stretch, out):
+        """Normalize any array with a non-linear stretch."""
+        lut = self.build_float_lut(stretch)
+        top = FLOAT_LUT_SIZE - 1
+        for start, end, tmp in self._scale_blocks(arr, vmin, vmax, top):
+            index = tmp.astype(np.uint16)
+            np.take(lut, index, out=out[start:end])
@@ -0,0 +1,330 @@
+"""Definition of the ImagePyramid class.
+
+An image pyramid holds a series of downsampled copies (levels) of an image,
+each half the size of the last, so a view of any part of the image at any
+zoom can be rendered by reading roughly a screen's worth of pixels. Level 0
+is the (possibly lazy) source itself.
+
+The coarse levels are built once by streaming over the source in row strips
+and averaging blocks of pixels, these are held in memory. Any finer levels
+which would not fit in the memory budget are never built, tiles for those
+levels are instead read on demand from the source with a stride. Levels
+built earlier (e.g. memory mapped from the disk cache) can be given
+instead of building them again.
+
+Example usage:
+
+    pyramid = ImagePyramid(source)
+    level = pyramid.level_for_scale(0.1)
+    tile = pyramid.tile(level, 3, 4)
+"""
+import math
+
+import numpy as np
+
+from imagemage.readers.sampling import decimate
+
+# The size of a square tile (pixels)
+TILE_SIZE = 256
+
+# The default memory budget for the in memory levels (bytes)
+DEFAULT_PYRAMID_BUDGET = 256 * 1024**2
+
+# The approximate number of bytes read from the source per strip while
+# building the pyramid
+STRIP_BYTES = 64 * 1024**2
+
+
+def block_mean(arr, factor):
+    """
+    Downsample an array by averaging factor x factor blocks of pixels.
+
+    Edges which are not a whole block are padded by repeating the final
+    row/column so the output has ceil(n / factor) pixels along each axis.
+    Any trailing (colour) axes are left untouched.
+
+    Args:
+        arr (np.ndarray): The array to downsample.
+        factor (int): The downsampling factor.
+
+    Returns:
+        np.ndarray: The downsampled array (float32).
+    """
+    nrows, ncols = arr.shape[:2]
+    pad_rows = -nrows % factor
+    pad_cols = -ncols % factor
+    if pad_rows or pad_cols:
+        pad = [(0, pad_rows), (0, pad_cols)] + [(0, 0)] * (arr.ndim - 2)
+        arr = np.pad(arr, pad, mode="edge")
+
+    blocks = arr.reshape(
+        arr.shape[0] // factor,
+        factor,
+        arr.shape[1] // factor,
+        factor,
+        *arr.shape[2:],
+    )
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+class ImagePyramid:
+    """
+    A multi-resolution pyramid of an image.
+
+    Attributes:
+        source (array-like): The full resolution (possibly lazy) image.
+        tile_size (int): The size of a square tile in pixels.
+        nlevels (int): The number of levels in the pyramid.
+        levels (dict): The in memory levels keyed by level index.
+        min_memory_level (int): The finest level held in memory.
+    """
+
+    def __init__(
+        self,
+        source,
+        tile_size=TILE_SIZE,
+        budget=DEFAULT_PYRAMID_BUDGET,
+        progress=None,
+        levels=None,
+    ):
+        """
+        Build the in memory levels of the pyramid.
+
+        Args:
+            source (array-like): The full resolution image, anything
+                supporting numpy slicing (including lazy readers).
+            tile_size (int): The size of a square tile in pixels.
+            budget (int): The maximum number of bytes to hold in memory
+                across all levels.
+            progress (callable): An optional function called with the
+                fraction of the build completed after each strip. It may
+                raise to abort the build.
+            levels (dict): Levels built earlier for this source, keyed by
+                level index, used instead of building them (budget is
+                then ignored).
+
+        Raises:
+            ValueError: If the levels given don't fit the source.
+        """
+        self.source = source
+        self.tile_size = tile_size
+
+        # Work out how many levels we need to get the whole image in a tile
+        nrows, ncols = source.shape[:2]
+        self.nlevels = (
+            max(0, math.ceil(math.log2(max(nrows, ncols) / tile_size))) + 1
+        )
+
+        # Integer levels keep the source dtype so they can use the same
+        # display path, floats are stored as float32
+        if np.issubdtype(source.dtype, np.integer):
+            self.dtype = source.dtype
+        else:
+            self.dtype = np.dtype(np.float32)
+
+        if levels is not None:
+            self._use_levels(levels)
+            return
+
+        # Find the finest level which fits in the budget (the coarser
+        # levels are at most a third of the size of this one)
+        pix_bytes = self.dtype.itemsize * int(np.prod(source.shape[2:]))
+        self.min_memory_level = self.nlevels
+        for level in range(1, self.nlevels):
+            nbytes = math.prod(self.level_shape(level)) * pix_bytes
+            if nbytes * 4 / 3 <= budget:
+                self.min_memory_level = level
+                break
+
+        self.levels = {}
+        if self.min_memory_level < self.nlevels:
+            self._build(progress)
+
+    def _use_levels(self, levels):
+        """Use levels built earlier, checking they match the source."""
+        self.min_memory_level = min(levels, default=self.nlevels)
+        expected = set(range(self.min_memory_level, self.nlevels))
+        if set(levels) != expected:
+            raise ValueError(
+                f"Expected pyramid levels {sorted(expected)}, got "
+                f"{sorted(levels)}"
+            )
+        for ilevel, level in levels.items():
+            shape = self.level_shape(ilevel) + self.source.shape[2:]
+            if level.shape != shape or level.dtype != self.dtype:
+                raise ValueError(
+                    f"Pyramid level {ilevel} is {level.shape} {level.dtype}, "
+                    f"expected {shape} {self.dtype}"
+                )
+        self.levels = dict(levels)
+
+    def _build(self, progress=None):
+        """Stream over the source and build the in memory levels."""
+        factor = 2**self.min_memory_level
+        nrows, ncols = self.source.shape[:2]
+
+        # Read whole blocks of rows at a time
+        row_bytes = ncols * self.source.dtype.itemsize
+        strip_rows = max(1, STRIP_BYTES // (row_bytes * factor)) * factor
+
+        # Build the finest in memory level strip by strip
+        level = np.empty(
+            self.level_shape(self.min_memory_level) + self.source.shape[2:],
+            dtype=self.dtype,
+        )
+        for start in range(0, nrows, strip_rows):
+            end = min(start + strip_rows, nrows)
+            strip = block_mean(np.asarray(self.source[start:end]), factor)
+            self._store(level, start // factor, strip)
+            if progress is not None:
+                progress(end / nrows)
+        self.levels[self.min_memory_level] = level
+
+        # Each coarser level is built from the one before it
+        for ilevel in range(self.min_memory_level + 1, self.nlevels):
+            level = np.empty(
+                self.level_shape(ilevel) + self.source.shape[2:],
+                dtype=self.dtype,
+            )
+            self._store(level, 0, block_mean(self.levels[ilevel - 1], 2))
+            self.levels[ilevel] = level
+
+    def _store(self, level, row, data):
+        """Write downsampled data into a level, rounding integer levels."""
+        if np.issubdtype(self.dtype, np.integer):
+            data = np.rint(data, out=data)
+        level[row : row + data.shape[0]] = data
+
+    def level_shape(self, level):
+        """
+        The (rows, columns) shape of a level.
+
+        Args:
+            level (int): The level index.
+
+        Returns:
+            tuple: The shape.
+        """
+        factor = 2**level
+        nrows, ncols = self.source.shape[:2]
+        return (-(-nrows // factor), -(-ncols // factor))
+
+    def level_for_scale(self, scale):
+        """
+        Choose the level to render for a given view scale.
+
+        This is the coarsest level with at least one level pixel per screen
+        pixel.
+
+        Args:
+            scale (float): The number of screen pixels per source pixel.
+
+        Returns:
+            int: The level index.
+        """
+        if scale <= 0:
+            return self.nlevels - 1
+        level = int(math.floor(math.log2(1 / scale))) if scale < 1 else 0
+        return min(max(level, 0), self.nlevels - 1)
+
+    def tile_grid(self, level):
+        """
+        The number of (rows, columns) of tiles in a level.
+
+        Args:
+            level (int): The level index.
+
+        Returns:
+            tuple: The number of tile rows and columns.
+        """
+        nrows, ncols = self.level_shape(level)
+        return (-(-nrows // self.tile_size), -(-ncols // self.tile_size))
+
+    def level_offset(self, level):
+        """
+        The full resolution coordinate of the centre of a level's first
+        pixel.
+
+        In memory levels average blocks of pixels so their pixels sit in
+        the middle of the block, levels read with a stride sit on the first
+        pixel of the block.
+
+        Args:
+            level (int): The level index.
+
+        Returns:
+            float: The offset (full resolution pixels).
+        """
+        if level in self.levels:
+            return (2**level - 1) / 2
+        return 0.0
+
+    def region(self, level, row_start, row_end, col_start, col_end):
+        """
+        Get the pixels of a region of a level.
+
+        Args:
+            level (int): The level index.
+            row_start (int): The first row (level pixels).
+            row_end (int): The end row (level pixels, None for the last).
+            col_start (int): The first column (level pixels).
+            col_end (int): The end column (level pixels, None for the
+                last).
+
+        Returns:
+            np.ndarray: The region's pixels (clipped to the level).
+        """
+        nrows, ncols = self.level_shape(level)
+        row_end = nrows if row_end is None else min(row_end, nrows)
+        col_end = ncols if col_end is None else min(col_end, ncols)
+
+        # In memory level
+        if level in self.levels:
+            return self.levels[level][row_start:row_end, col_start:col_end]
+
+        # Otherwise read (with a stride) from the source
+        factor = 2**level
+        return np.asarray(
+            self.source[
+                row_start * factor : row_end * factor : factor,
+                col_start * factor : col_end * factor : factor,
+            ]
+        )
+
+    def tile(self, level, row, col):
+        """
+        Get the pixels of a single tile.
+
+        Args:
+            level (int): The level index.
+            row (int): The row of the tile in the tile grid.
+            col (int): The column of the tile in the tile grid.
+
+        Returns:
+            np.ndarray: The tile's pixels (edge tiles may be smaller than
+                tile_size).
+        """
+        size = self.tile_size
+        return self.region(
+            level, row * size, (row + 1) * size, col * size, (col + 1) * size
+        )
+
+    def overview(self, max_size):
+        """
+        Get an in memory copy of the image no larger than max_size.
+
+        This is the finest level which fits within max_size along both axes.
+
+        Args:
+            max_size (int): The maximum number of pixels along either axis.
+
+        Returns:
+            np.ndarray: The overview image.
+        """
+        for level in range(self.nlevels):
+            if max(self.level_shape(level)) > max_size:
+                continue
+            if level in self.levels:
+                return self.levels[level]
+            return np.asarray(self.source[:: 2**level, :: 2**level])
+        return decimate(self.source, max_size)
@@ -0,0 +1,90 @@
+"""Functions for displaying numpy arrays as QImages without copying them.
+
+A QImage can be constructed directly on top of a numpy array's memory. The
+QImage then shares the pixels with the array, so no copy is made until Qt
+uploads them (QPixmap.fromImage). The array must outlive the QImage, which
+array_to_qimage guarantees by keeping a reference to it on the QImage.
+
+The QImage format follows from the array's dtype and shape:
+
+    - (h, w) uint8 -> Grayscale8 (or Indexed8 given a colour table)
+    - (h, w) uint16 -> Grayscale16
+    - (h, w) uint32 -> RGB32 (pixels packed as 0xffRRGGBB)
+    - (h, w, 3) uint8 -> RGB888
+    - (h, w, 4) uint8 -> RGBA8888
+
+Example usage:
+
+    display = normalizer(tile, vmin, vmax)
+    pixmap = QPixmap.fromImage(array_to_qimage(display))
+"""
+import numpy as np
+from PyQt5 import sip
+from PyQt5.QtGui import QImage
+
+
+def qimage_format(arr, indexed=False):
+    """
+    Get the QImage format which matches an array's memory layout.
+
+    Args:
+        arr (np.ndarray): The array.
+        indexed (bool): Whether 8 bit images are colour table indices.
+
+    Returns:
+        QImage.Format: The matching format.
+
+    Raises:
+        ValueError: If no QImage format matches the array.
+    """
+    if arr.ndim == 2 and arr.dtype == np.uint8:
+        return QImage.Format_Indexed8 if indexed else QImage.Format_Grayscale8
+    if arr.ndim == 2 and arr.dtype == np.uint16:
+        return QImage.Format_Grayscale16
+    if arr.ndim == 2 and arr.dtype == np.uint32:
+        return QImage.Format_RGB32
+    if arr.ndim == 3 and arr.dtype == np.uint8 and arr.shape[2] == 3:
+        return QImage.Format_RGB888
+    if arr.ndim == 3 and arr.dtype == np.uint8 and arr.shape[2] == 4:
+        return QImage.Format_RGBA8888
+
+    raise ValueError(
+        f"Can't display an array of shape {arr.shape} and dtype {arr.dtype}"
+    )
+
+
+def array_to_qimage(arr, color_table=None):
+    """
+    Wrap an array in a QImage sharing its memory.
+
+    The array is only copied if its rows are not contiguous in memory.
+
+    Args:
+        arr (np.ndarray): The display values (see the module docstring for
+            the supported dtypes and shapes).
+        color_table (list): An optional list of 256 QRgb values, 8 bit
+            images are then displayed as Indexed8 with this table.
+
+    Returns:
+        QImage: The image (which keeps arr alive).
+    """
+    # Each row must be contiguous but the rows can be strided (e.g. a view
+    # of part of a larger buffer)
+    if not arr[0].flags.c_contiguous or arr.strides[0] < arr[0].nbytes:
+        arr = np.ascontiguousarray(arr)
+
+    height, width = arr.shape[:2]
+    q_image = QImage(
+        sip.voidptr(arr.ctypes.data),
+        width,
+        height,
+        arr.strides[0],
+        qimage_format(arr, indexed=color_table is not None),
+    )
+    if color_table is not None:
+        q_image.setColorTable(color_table)
+
+    # The QImage doesn't own its pixels
+    q_image._array = arr
+
+    return q_image
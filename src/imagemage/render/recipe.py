@@ -0,0 +1,402 @@
+"""Definition of the Recipe and BandRecipe classes.
+
+A recipe captures everything needed to reproduce a rendered image: the
+source file (and its HDF5 dataset or FITS HDU), the display limits, the
+stretch, the colormap and, for RGB composites, the display settings,
+colour and alignment of every band. Recipes are saved as JSON or TOML and hash
+deterministically, so anything rendered from a recipe can be cached by
+its digest and re-renders skipped when nothing has changed.
+
+Limits are either fixed, [vmin, vmax], or the keyword arguments of
+render.limits.compute_limits (e.g. {"mode": "percentile", "low": 1,
+"high": 99}) so one recipe can be applied to many images.
+
+A recipe without a source describes only how to display an image, e.g. a
+recipe applied to every file in a batch.
+
+Example usage:
+
+    recipe = Recipe(
+        source="mosaic.fits",
+        hdu=1,
+        limits={"mode": "zscale"},
+        stretch="asinh",
+        stretch_param=0.05,
+        cmap="viridis",
+    )
+    recipe.save("mosaic.toml")
+    assert Recipe.load("mosaic.toml").digest() == recipe.digest()
+"""
+import hashlib
+import json
+import math
+import os
+from dataclasses import dataclass, field
+
+from imagemage.readers.sampling import sample_pixels, samples_for_accuracy
+from imagemage.render.limits import DEFAULT_RANK_ERROR, compute_limits
+from imagemage.render.stretch import get_stretch
+
+# The version of the recipe format (saved with every recipe)
+RECIPE_VERSION = 1
+
+# The keys which only say where the pixels come from
+SOURCE_KEYS = ("source", "dataset", "hdu")
+
+
+def _normalize_limits(limits):
+    """Get limits in a canonical form (so equal limits hash equally)."""
+    if limits is None:
+        return None
+    if isinstance(limits, dict):
+        return {
+            key: (
+                float(value)
+                if isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                else value
+            )
+            for key, value in limits.items()
+        }
+    vmin, vmax = limits
+    return (float(vmin), float(vmax))
+
+
+def _display_dict(spec):
+    """Serialize the source and display settings shared by recipes."""
+    data = {key: getattr(spec, key) for key in SOURCE_KEYS}
+    if spec.limits is not None:
+        data["limits"] = (
+            dict(spec.limits)
+            if isinstance(spec.limits, dict)
+            else list(spec.limits)
+        )
+    data["stretch"] = {"name": spec.stretch, "param": spec.stretch_param}
+    return data
+
+
+def _display_kwargs(data):
+    """Parse the source and display settings shared by recipes."""
+    kwargs = {key: data.get(key) for key in SOURCE_KEYS}
+    kwargs["limits"] = data.get("limits")
+
+    # The stretch is either a name or a name and parameter
+    stretch = data.get("stretch", "linear")
+    if isinstance(stretch, str):
+        stretch = {"name": stretch}
+    kwargs["stretch"] = stretch["name"]
+    kwargs["stretch_param"] = stretch.get("param")
+    return kwargs
+
+
+def _drop_none(value):
+    """Remove None values (TOML has no null and they add nothing)."""
+    if isinstance(value, dict):
+        return {k: _drop_none(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_drop_none(v) for v in value]
+    return value
+
+
+def _toml_value(value):
+    """Format a value as TOML."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        # JSON string escapes are valid TOML basic string escapes
+        return json.dumps(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "nan"
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return repr(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_toml_value(v) for v in value) + "]"
+    if isinstance(value, dict):
+        items = ", ".join(f"{k} = {_toml_value(v)}" for k, v in value.items())
+        return "{" + items + "}"
+    raise TypeError(f"Can't write {type(value).__name__} values to TOML")
+
+
+def to_toml(data):
+    """
+    Format a recipe dictionary as TOML.
+
+    Only what recipes contain is supported: top level values (nested
+    dictionaries become inline tables) and a list of band tables.
+
+    Args:
+        data (dict): The recipe dictionary (without None values).
+
+    Returns:
+        str: The TOML document.
+    """
+    lines = []
+    tables = {}
+    for key, value in data.items():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            tables[key] = value
+        else:
+            lines.append(f"{key} = {_toml_value(value)}")
+
+    for key, items in tables.items():
+        for item in items:
+            lines += ["", f"[[{key}]]"]
+            lines += [f"{k} = {_toml_value(v)}" for k, v in item.items()]
+
+    return "\n".join(lines) + "\n"
+
+
+def from_toml(text):
+    """
+    Parse a TOML document.
+
+    Args:
+        text (str): The TOML document.
+
+    Returns:
+        dict: The parsed document.
+    """
+    try:
+        import tomllib
+    except ImportError:
+        # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError(
+                "Reading TOML recipes needs Python 3.11 or the tomli "
+                "package, save the recipe as JSON instead"
+            )
+    return tomllib.loads(text)
+
+
+def resolve_display(spec, source, sample=None):
+    """
+    Get the limits and stretch a recipe (or band recipe) asks for.
+
+    Args:
+        spec (Recipe/BandRecipe): The recipe.
+        source (array-like): The image, only a sample of it is read (and
+            only if the limits or stretch depend on the data).
+        sample (np.ndarray): A sample of the image's pixels (drawn from
+            source if None and needed).
+
+    Returns:
+        tuple: The (vmin, vmax, stretch).
+    """
+    needs_sample = (
+        spec.limits is None
+        or isinstance(spec.limits, dict)
+        or spec.stretch == "histeq"
+    )
+    if sample is None and needs_sample:
+        sample = sample_pixels(
+            source, samples_for_accuracy(DEFAULT_RANK_ERROR)
+        )
+
+    if spec.limits is None:
+        vmin, vmax = compute_limits(None, "minmax", sample=sample)
+    elif isinstance(spec.limits, dict):
+        vmin, vmax = compute_limits(None, sample=sample, **spec.limits)
+    else:
+        vmin, vmax = spec.limits
+
+    stretch = get_stretch(spec.stretch, spec.stretch_param, data=sample)
+    stretch.update_limits(vmin, vmax)
+
+    return vmin, vmax, stretch
+
+
+@dataclass
+class BandRecipe:
+    """
+    The display settings of one band of a composite.
+
+    Attributes:
+        source (str): The band's file (the recipe's source if None).
+        dataset (str): The band's HDF5 dataset.
+        hdu (int): The index of the band's FITS HDU.
+        limits (tuple/dict): Fixed (vmin, vmax) limits or the arguments
+            of compute_limits (minmax if None).
+        stretch (str): The name of the band's stretch.
+        stretch_param (float): The stretch's parameter (its default if
+            None).
+        color (tuple): The (r, g, b) weights of the band's colour.
+        transform (dict): The serialized registration.Transform aligning
+            the band with the first band (None if it isn't aligned).
+    """
+
+    source: str = None
+    dataset: str = None
+    hdu: int = None
+    limits: object = None
+    stretch: str = "linear"
+    stretch_param: float = None
+    color: tuple = (1.0, 1.0, 1.0)
+    transform: dict = None
+
+    def __post_init__(self):
+        self.limits = _normalize_limits(self.limits)
+        self.color = tuple(float(c) for c in self.color)
+        if self.transform is not None:
+            self.transform = dict(self.transform)
+        if self.stretch_param is not None:
+            self.stretch_param = float(self.stretch_param)
+
+    def to_dict(self):
+        """Serialize the band recipe."""
+        data = _display_dict(self)
+        data["color"] = list(self.color)
+        data["transform"] = self.transform
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Parse a serialized band recipe."""
+        return cls(
+            color=data.get("color", (1.0, 1.0, 1.0)),
+            transform=data.get("transform"),
+            **_display_kwargs(data),
+        )
+
+
+@dataclass
+class Recipe:
+    """
+    Everything needed to reproduce a rendered image.
+
+    Attributes:
+        source (str): The image file (None for a display only recipe).
+        dataset (str): The HDF5 dataset to display.
+        hdu (int): The index of the FITS HDU to display.
+        limits (tuple/dict): Fixed (vmin, vmax) limits or the arguments
+            of compute_limits (minmax if None).
+        stretch (str): The name of the stretch.
+        stretch_param (float): The stretch's parameter (its default if
+            None).
+        cmap (str): The colormap of single channel images.
+        bands (list): The BandRecipes of a composite (empty for a single
+            image).
+    """
+
+    source: str = None
+    dataset: str = None
+    hdu: int = None
+    limits: object = None
+    stretch: str = "linear"
+    stretch_param: float = None
+    cmap: str = "gray"
+    bands: list = field(default_factory=list)
+
+    def __post_init__(self):
+        self.limits = _normalize_limits(self.limits)
+        if self.stretch_param is not None:
+            self.stretch_param = float(self.stretch_param)
+
+    @property
+    def is_composite(self):
+        return len(self.bands) > 0
+
+    def to_dict(self):
+        """
+        Serialize the recipe.
+
+        Returns:
+            dict: The recipe as plain JSON/TOML types.
+        """
+        data = {"version": RECIPE_VERSION}
+        data.update(_display_dict(self))
+        data["cmap"] = self.cmap
+        if self.bands:
+            data["composite"] = [band.to_dict() for band in self.bands]
+        return _drop_none(data)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Parse a serialized recipe.
+
+        Args:
+            data (dict): The serialized recipe.
+
+        Returns:
+            Recipe: The recipe.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("A recipe must be a table/object")
+        version = data.get("version", RECIPE_VERSION)
+        if version > RECIPE_VERSION:
+            raise ValueError(
+                f"Recipe version {version} is newer than this IMage "
+                f"understands ({RECIPE_VERSION})"
+            )
+        return cls(
+            cmap=data.get("cmap", "gray"),
+            bands=[
+                BandRecipe.from_dict(band)
+                for band in data.get("composite", [])
+            ],
+            **_display_kwargs(data),
+        )
+
+    def digest(self, include_source=True):
+        """
+        Hash the recipe.
+
+        Equal recipes always give the same digest (the hash is of a
+        canonical serialization), whichever format they were saved in.
+
+        Args:
+            include_source (bool): Whether the source files are part of
+                the hash, without them the digest identifies only how
+                images are displayed.
+
+        Returns:
+            str: The hex SHA-256 digest.
+        """
+        data = self.to_dict()
+        if not include_source:
+            for spec in [data] + data.get("composite", []):
+                for key in SOURCE_KEYS:
+                    spec.pop(key, None)
+
+        canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def save(self, filepath):
+        """
+        Save the recipe, as TOML for .toml files and JSON otherwise.
+
+        Args:
+            filepath (str): The path to the recipe file.
+        """
+        data = self.to_dict()
+        if os.path.splitext(filepath)[1].lower() == ".toml":
+            text = to_toml(data)
+        else:
+            text = json.dumps(data, indent=4) + "\n"
+        with open(filepath, "w") as f:
+            f.write(text)
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Load a recipe saved as TOML (.toml files) or JSON.
+
+        Args:
+            filepath (str): The path to the recipe file.
+
+        Returns:
+            Recipe: The recipe.
+        """
+        with open(filepath) as f:
+            text = f.read()
+        if os.path.splitext(filepath)[1].lower() == ".toml":
+            data = from_toml(text)
+        else:
+            data = json.loads(text)
+        return cls.from_dict(data)
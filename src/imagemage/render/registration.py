@@ -0,0 +1,729 @@
+"""Image registration by phase correlation and lazy resampling.
+
+Registration estimates the transform taking a reference image onto another
+exposure of the same field: a translation and optionally a rotation and
+scale (about the centre of the reference). Everything is done with numpy
+FFTs:
+
+    - Translations come from the peak of the phase correlation (the inverse
+      FFT of the normalized cross power spectrum), refined to a fraction of
+      a pixel by evaluating the correlation on an upsampled grid around the
+      peak with a matrix DFT (Guizar-Sicairos et al. 2008).
+    - Rotation and scale become translations of the log-polar resampled
+      Fourier magnitudes (which don't depend on the translation), so they
+      are found the same way before the translation is.
+
+Large images are registered coarse to fine: the transform is estimated on
+a pyramid level no larger than COARSE_SIZE and the translation is then
+refined on a REFINE_SIZE window at full resolution, so only a small part
+of either image is ever read at full resolution.
+
+Registered images are never shifted and stored, ResampledImage and
+ResampledPyramid resample the pixels a region at a time as they are read
+(bilinearly), so an aligned composite band costs no more memory than an
+unaligned one.
+
+Example usage:
+
+    transform = register(ref_pyramid, pyramid, rotation=True)
+    composite.set_band_transform(1, transform)
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+# The largest pyramid level (pixels along either axis) the coarse estimate
+# is made on
+COARSE_SIZE = 512
+
+# The size of the full resolution window the translation is refined on
+REFINE_SIZE = 512
+
+# The precision of the sub-pixel translation (1 / UPSAMPLE pixels)
+UPSAMPLE = 20
+
+# The number of output rows resampled at once (limits the source region
+# read for each block)
+ROW_BLOCK = 64
+
+
+@dataclass
+class Transform:
+    """
+    The transform from reference pixel coordinates to image coordinates.
+
+    A pixel at (y, x) in the reference is found at
+
+        center + scale * R(angle) @ ((y, x) - center) + (dy, dx)
+
+    in the image.
+
+    Attributes:
+        dy (float): The row shift (pixels).
+        dx (float): The column shift (pixels).
+        angle (float): The rotation (radians).
+        scale (float): The scale factor.
+        center (tuple): The (y, x) centre of rotation and scaling.
+    """
+
+    dy: float = 0.0
+    dx: float = 0.0
+    angle: float = 0.0
+    scale: float = 1.0
+    center: tuple = (0.0, 0.0)
+
+    def __post_init__(self):
+        self.dy = float(self.dy)
+        self.dx = float(self.dx)
+        self.angle = float(self.angle)
+        self.scale = float(self.scale)
+        self.center = tuple(float(c) for c in self.center)
+
+    @property
+    def key(self):
+        """A hashable key identifying the transform."""
+        return (self.dy, self.dx, self.angle, self.scale, tuple(self.center))
+
+    @property
+    def is_translation(self):
+        return self.angle == 0 and self.scale == 1
+
+    def rotate(self, vy, vx):
+        """Apply the rotation and scale (but not the shift) to a vector."""
+        cos = self.scale * math.cos(self.angle)
+        sin = self.scale * math.sin(self.angle)
+        return cos * vy - sin * vx, sin * vy + cos * vx
+
+    def apply(self, y, x):
+        """
+        Map reference coordinates to image coordinates.
+
+        Args:
+            y (np.ndarray): The reference rows.
+            x (np.ndarray): The reference columns.
+
+        Returns:
+            tuple: The image (rows, columns).
+        """
+        if self.is_translation:
+            return y + self.dy, x + self.dx
+        cy, cx = self.center
+        ry, rx = self.rotate(y - cy, x - cx)
+        return ry + cy + self.dy, rx + cx + self.dx
+
+    def to_dict(self):
+        """Serialize the transform."""
+        return {
+            "dy": float(self.dy),
+            "dx": float(self.dx),
+            "angle": float(self.angle),
+            "scale": float(self.scale),
+            "center": [float(c) for c in self.center],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Parse a serialized transform."""
+        return cls(
+            dy=float(data.get("dy", 0.0)),
+            dx=float(data.get("dx", 0.0)),
+            angle=float(data.get("angle", 0.0)),
+            scale=float(data.get("scale", 1.0)),
+            center=tuple(float(c) for c in data.get("center", (0.0, 0.0))),
+        )
+
+
+def bilinear(arr, y, x, fill=np.nan):
+    """
+    Sample an array at fractional coordinates.
+
+    Args:
+        arr (np.ndarray): The (2D) array.
+        y (np.ndarray): The rows to sample at.
+        x (np.ndarray): The columns to sample at (broadcast against y).
+        fill (float): The value of samples outside the array.
+
+    Returns:
+        np.ndarray: The float32 samples.
+    """
+    y, x = np.broadcast_arrays(y, x)
+    out = np.full(y.shape, fill, dtype=np.float32)
+    nrows, ncols = arr.shape[:2]
+    if nrows == 0 or ncols == 0:
+        return out
+
+    inside = (y >= 0) & (y <= nrows - 1) & (x >= 0) & (x <= ncols - 1)
+    y = y[inside]
+    x = x[inside]
+
+    # The top left neighbour (kept off the last row/column so the bottom
+    # right neighbour exists, the weights then reach 1 at the edge)
+    y0 = np.minimum(np.floor(y).astype(np.intp), max(nrows - 2, 0))
+    x0 = np.minimum(np.floor(x).astype(np.intp), max(ncols - 2, 0))
+    y1 = np.minimum(y0 + 1, nrows - 1)
+    x1 = np.minimum(x0 + 1, ncols - 1)
+    wy = (y - y0).astype(np.float32)
+    wx = (x - x0).astype(np.float32)
+
+    top = arr[y0, x0] * (1 - wx) + arr[y0, x1] * wx
+    bottom = arr[y1, x0] * (1 - wx) + arr[y1, x1] * wx
+    out[inside] = top * (1 - wy) + bottom * wy
+    return out
+
+
+def _as_indices(key, size):
+    """Convert a slice, integer or index array to an index array."""
+    if isinstance(key, slice):
+        return np.arange(*key.indices(size))
+    return np.atleast_1d(np.asarray(key)) % size
+
+
+def _warp_rows(read_region, shape, transform, rows, cols, offset=0.0, step=1):
+    """
+    Resample rows of an image onto the reference grid.
+
+    Args:
+        read_region (callable): Returns the image pixels in
+            [row_start, row_end) x [col_start, col_end).
+        shape (tuple): The (rows, columns) of the image being read.
+        transform (Transform): The reference to image transform (in full
+            resolution coordinates).
+        rows (np.ndarray): The reference rows to produce (full resolution
+            coordinates).
+        cols (np.ndarray): The reference columns to produce.
+        offset (float): The full resolution coordinate of the first pixel
+            of the image being read.
+        step (int): The full resolution pixels per pixel of the image
+            being read.
+
+    Returns:
+        np.ndarray: The (len(rows), len(cols)) float32 pixels, NaN outside
+            the image.
+    """
+    src_y, src_x = transform.apply(rows[:, None], cols[None, :])
+    src_y = (src_y - offset) / step
+    src_x = (src_x - offset) / step
+
+    nrows, ncols = shape
+    out = np.full(src_y.shape, np.nan, dtype=np.float32)
+
+    # Only read the part of the image the rows land on
+    row_start = max(int(math.floor(src_y.min())), 0)
+    row_end = min(int(math.floor(src_y.max())) + 2, nrows)
+    col_start = max(int(math.floor(src_x.min())), 0)
+    col_end = min(int(math.floor(src_x.max())) + 2, ncols)
+    if row_start >= row_end or col_start >= col_end:
+        return out
+
+    region = np.asarray(
+        read_region(row_start, row_end, col_start, col_end), dtype=np.float32
+    )
+    return bilinear(region, src_y - row_start, src_x - col_start)
+
+
+class ResampledImage:
+    """
+    A lazy image resampled onto a reference grid.
+
+    The object behaves like a read only (2D, float32) numpy array with the
+    reference's shape. Pixels are resampled from the source as they are
+    sliced, only the part of the source under the slice is read. Pixels
+    falling outside the source are NaN (shown as black).
+
+    Attributes:
+        source (array-like): The (possibly lazy) image being resampled.
+        transform (Transform): The reference to source transform.
+        shape (tuple): The (rows, columns) of the reference.
+    """
+
+    def __init__(self, source, transform, shape):
+        """
+        Set up the resampled image.
+
+        Args:
+            source (array-like): The (2D) image.
+            transform (Transform): The reference to source transform.
+            shape (tuple): The (rows, columns) of the reference.
+        """
+        self.source = source
+        self.transform = transform
+        self.shape = tuple(shape[:2])
+
+    @property
+    def dtype(self):
+        return np.dtype(np.float32)
+
+    @property
+    def ndim(self):
+        return 2
+
+    def _read(self, row_start, row_end, col_start, col_end):
+        return self.source[row_start:row_end, col_start:col_end]
+
+    def __getitem__(self, key):
+        if key is Ellipsis:
+            key = (slice(None), slice(None))
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rows = _as_indices(key[0], self.shape[0])
+        cols = _as_indices(key[1], self.shape[1])
+
+        # Consecutive rows are resampled in blocks, strided rows (e.g. a
+        # sample) one at a time so the region read stays small
+        if len(rows) > 1 and rows[1] - rows[0] == 1:
+            block = ROW_BLOCK
+        else:
+            block = 1
+
+        out = np.empty((len(rows), len(cols)), dtype=np.float32)
+        for start in range(0, len(rows), block):
+            out[start : start + block] = _warp_rows(
+                self._read,
+                self.source.shape[:2],
+                self.transform,
+                rows[start : start + block].astype(np.float64),
+                cols.astype(np.float64),
+            )
+
+        # Integer indices drop their axis as they would for an array
+        if np.ndim(key[1]) == 0 and not isinstance(key[1], slice):
+            out = out[:, 0]
+        if np.ndim(key[0]) == 0 and not isinstance(key[0], slice):
+            out = out[0]
+        return out
+
+    def close(self):
+        """Close the source."""
+        if hasattr(self.source, "close"):
+            self.source.close()
+
+
+class ResampledPyramid:
+    """
+    An image pyramid resampled onto a reference grid.
+
+    Tiles follow the reference's tile grid and are resampled from the
+    matching level of the image's own pyramid, so aligning an image never
+    rebuilds (or re-reads) its pyramid.
+
+    Attributes:
+        pyramid (ImagePyramid): The image's pyramid.
+        transform (Transform): The reference to image transform.
+        shape (tuple): The (rows, columns) of the reference.
+        tile_size (int): The size of a square tile in pixels.
+    """
+
+    def __init__(self, pyramid, transform, shape):
+        """
+        Set up the resampled pyramid.
+
+        Args:
+            pyramid (ImagePyramid): The image's pyramid.
+            transform (Transform): The reference to image transform.
+            shape (tuple): The (rows, columns) of the reference.
+        """
+        self.pyramid = pyramid
+        self.transform = transform
+        self.shape = tuple(shape[:2])
+        self.tile_size = pyramid.tile_size
+
+    def level_shape(self, level):
+        """The (rows, columns) of a level of the reference."""
+        factor = 2**level
+        return (-(-self.shape[0] // factor), -(-self.shape[1] // factor))
+
+    def region(self, level, row_start, row_end, col_start, col_end):
+        """
+        Get a region of a level resampled onto the reference grid.
+
+        Args:
+            level (int): The level index.
+            row_start (int): The first row (level pixels).
+            row_end (int): The end row (level pixels, None for the last).
+            col_start (int): The first column (level pixels).
+            col_end (int): The end column (level pixels, None for the
+                last).
+
+        Returns:
+            np.ndarray: The float32 pixels, NaN outside the image.
+        """
+        nrows, ncols = self.level_shape(level)
+        row_end = nrows if row_end is None else min(row_end, nrows)
+        col_end = ncols if col_end is None else min(col_end, ncols)
+        factor = 2**level
+        src_level = min(level, self.pyramid.nlevels - 1)
+
+        # Level pixels are centred on the middle of the block they average
+        rows = np.arange(row_start, row_end) * factor + (factor - 1) / 2
+        cols = np.arange(col_start, col_end) * factor + (factor - 1) / 2
+
+        return _warp_rows(
+            partial_region(self.pyramid, src_level),
+            self.pyramid.level_shape(src_level),
+            self.transform,
+            rows,
+            cols,
+            offset=self.pyramid.level_offset(src_level),
+            step=2**src_level,
+        )
+
+    def tile(self, level, row, col):
+        """
+        Get the resampled pixels of a tile of the reference grid.
+
+        Args:
+            level (int): The level index.
+            row (int): The row of the tile in the tile grid.
+            col (int): The column of the tile in the tile grid.
+
+        Returns:
+            np.ndarray: The tile's float32 pixels.
+        """
+        size = self.tile_size
+        return self.region(
+            level, row * size, (row + 1) * size, col * size, (col + 1) * size
+        )
+
+
+def partial_region(pyramid, level):
+    """Get a function reading regions of one level of a pyramid."""
+
+    def read_region(row_start, row_end, col_start, col_end):
+        return pyramid.region(level, row_start, row_end, col_start, col_end)
+
+    return read_region
+
+
+def _prepare(arr):
+    """Get an image ready for correlation (finite, zero mean, windowed)."""
+    arr = np.array(arr, dtype=np.float64)
+    finite = np.isfinite(arr)
+    mean = arr[finite].mean() if finite.any() else 0.0
+    arr[~finite] = mean
+    arr -= mean
+
+    # A Hann window stops the image edges dominating the spectrum
+    window = np.outer(np.hanning(arr.shape[0]), np.hanning(arr.shape[1]))
+    return arr * window
+
+
+def _upsampled_dft(data, region_size, upsample, offsets):
+    """
+    Evaluate the inverse DFT of data on an upsampled grid around a point.
+
+    Args:
+        data (np.ndarray): The (2D) spectrum.
+        region_size (int): The size of the upsampled region.
+        upsample (int): The upsampling factor.
+        offsets (tuple): The (row, column) of the region's origin in
+            upsampled pixels.
+
+    Returns:
+        np.ndarray: The (region_size, region_size) upsampled values.
+    """
+    for size, offset in zip(data.shape[::-1], offsets[::-1]):
+        kernel = (np.arange(region_size) - offset)[:, None] * np.fft.fftfreq(
+            size, upsample
+        )
+        data = np.tensordot(np.exp(-2j * np.pi * kernel), data, axes=(1, -1))
+    return data
+
+
+def phase_correlate(ref, img, upsample=UPSAMPLE):
+    """
+    Find the translation between two images by phase correlation.
+
+    Args:
+        ref (np.ndarray): The reference image.
+        img (np.ndarray): The image (the same shape as ref).
+        upsample (int): The sub-pixel precision (1 / upsample pixels).
+
+    Returns:
+        tuple: The (dy, dx) shift, img[y + dy, x + dx] ~ ref[y, x], and
+            the height of the correlation peak (1 for a perfect match).
+    """
+    spectrum = np.fft.fft2(_prepare(img)) * np.fft.fft2(_prepare(ref)).conj()
+    spectrum /= np.abs(spectrum) + 1e-12
+    correlation = np.fft.ifft2(spectrum)
+
+    peak = np.unravel_index(np.argmax(np.abs(correlation)), spectrum.shape)
+    shape = np.array(spectrum.shape)
+    shift = np.array(peak, dtype=np.float64)
+    shift[shift > shape // 2] -= shape[shift > shape // 2]
+    height = np.abs(correlation[peak])
+
+    # Refine on an upsampled grid 1.5 pixels across centred on the peak
+    if upsample > 1:
+        shift = np.round(shift * upsample) / upsample
+        region_size = int(math.ceil(upsample * 1.5))
+        centre = region_size // 2
+        upsampled = _upsampled_dft(
+            spectrum.conj(), region_size, upsample, centre - shift * upsample
+        ).conj()
+        fine = np.unravel_index(np.argmax(np.abs(upsampled)), upsampled.shape)
+        shift += (np.array(fine) - centre) / upsample
+        height = np.abs(upsampled[fine]) / spectrum.size
+
+    return float(shift[0]), float(shift[1]), float(height)
+
+
+def _log_polar_magnitude(arr):
+    """
+    Resample the high passed Fourier magnitude of an image onto a log-polar
+    grid (rows are angles over [0, pi), columns are log radii).
+    """
+    magnitude = np.abs(np.fft.fftshift(np.fft.fft2(_prepare(arr))))
+
+    # Suppress the low frequencies, which the window distorts most
+    fy = np.fft.fftshift(np.fft.fftfreq(arr.shape[0]))[:, None]
+    fx = np.fft.fftshift(np.fft.fftfreq(arr.shape[1]))[None, :]
+    cos = np.cos(np.pi * fy) * np.cos(np.pi * fx)
+    magnitude *= (1 - cos) * (2 - cos)
+
+    nangles, nradii = arr.shape
+    cy, cx = arr.shape[0] // 2, arr.shape[1] // 2
+    max_radius = min(cy, cx)
+    log_base = math.log(max_radius) / nradii
+
+    angles = np.arange(nangles) * np.pi / nangles
+    radii = np.exp(np.arange(nradii) * log_base)
+    y = cy + radii[None, :] * np.sin(angles)[:, None]
+    x = cx + radii[None, :] * np.cos(angles)[:, None]
+    return bilinear(magnitude, y, x, fill=0.0), log_base
+
+
+def estimate_rotation_scale(ref, img, upsample=UPSAMPLE):
+    """
+    Estimate the rotation and scale between two images.
+
+    Args:
+        ref (np.ndarray): The reference image.
+        img (np.ndarray): The image (the same shape as ref).
+        upsample (int): The sub-pixel precision of the log-polar shift.
+
+    Returns:
+        tuple: The (angle, scale) of the image relative to the reference,
+            the angle is only known modulo pi.
+    """
+    ref_lp, log_base = _log_polar_magnitude(ref)
+    img_lp, _ = _log_polar_magnitude(img)
+    dangle, dradius, _ = phase_correlate(ref_lp, img_lp, upsample)
+
+    # A feature at angle a in the reference's spectrum is at a - angle in
+    # the image's, and radii shrink by the scale
+    angle = -dangle * np.pi / ref_lp.shape[0]
+    scale = math.exp(-dradius * log_base)
+    return angle, scale
+
+
+def compose(outer, inner):
+    """
+    Combine two transforms.
+
+    Args:
+        outer (Transform): The transform applied second.
+        inner (Transform): The transform applied first.
+
+    Returns:
+        Transform: The transform equivalent to outer(inner(p)) (about
+            outer's centre).
+    """
+    combined = Transform(
+        angle=outer.angle + inner.angle,
+        scale=outer.scale * inner.scale,
+        center=outer.center,
+    )
+    (coy, cox), (ciy, cix) = outer.center, inner.center
+    ay, ax = outer.rotate(ciy - coy + inner.dy, cix - cox + inner.dx)
+    by, bx = combined.rotate(coy - ciy, cox - cix)
+    combined.dy = outer.dy + ay + by
+    combined.dx = outer.dx + ax + bx
+    return combined
+
+
+def _to_full_resolution(transform, factor, offset):
+    """Convert a transform in level pixels to full resolution pixels."""
+    cy, cx = transform.center
+    return Transform(
+        dy=transform.dy * factor,
+        dx=transform.dx * factor,
+        angle=transform.angle,
+        scale=transform.scale,
+        center=(cy * factor + offset, cx * factor + offset),
+    )
+
+
+def _estimate(ref, resample, rotation, upsample):
+    """
+    Estimate the transform between a reference and an image.
+
+    Args:
+        ref (np.ndarray): The reference.
+        resample (callable): Returns the image resampled onto the
+            reference's grid by a transform (in the reference's pixels).
+        rotation (bool): Whether to estimate a rotation and scale.
+        upsample (int): The sub-pixel precision.
+
+    Returns:
+        tuple: The Transform (in the reference's pixels) and the height of
+            its correlation peak.
+    """
+    center = ((ref.shape[0] - 1) / 2, (ref.shape[1] - 1) / 2)
+
+    # Rotation and scale first (the Fourier magnitudes don't depend on the
+    # translation), the angle is ambiguous by pi so try both
+    candidates = [Transform(center=center)]
+    if rotation:
+        angle, scale = estimate_rotation_scale(
+            ref, resample(Transform(center=center)), upsample
+        )
+        angle = (angle + np.pi / 2) % np.pi - np.pi / 2
+        candidates = [
+            Transform(angle=a, scale=scale, center=center)
+            for a in (angle, angle + np.pi)
+        ]
+
+    best = None
+    for candidate in candidates:
+        dy, dx, height = phase_correlate(ref, resample(candidate), upsample)
+        if best is None or height > best[1]:
+            # The shift was measured in the rotated and scaled frame
+            candidate.dy, candidate.dx = candidate.rotate(dy, dx)
+            best = (candidate, height)
+    return best
+
+
+def _fit_residual(points, shifts, center, rotation):
+    """
+    Fit the residual transform to the shifts measured in windows.
+
+    Args:
+        points (list): The (y, x) centres of the windows.
+        shifts (list): The (dy, dx, peak height) measured in each window.
+        center (tuple): The (y, x) centre of the residual's rotation.
+        rotation (bool): Whether to fit a rotation and scale (needs
+            several windows) or only a translation.
+
+    Returns:
+        Transform: The residual transform.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    shifts = np.asarray(shifts, dtype=np.float64)
+    weights = shifts[:, 2]
+    if not rotation:
+        dy, dx = np.average(shifts[:, :2], axis=0, weights=weights + 1e-12)
+        return Transform(dy=dy, dx=dx, center=center)
+
+    # Small rotations and scalings move each window by
+    # [[a, -b], [b, a]] @ (p - center) + (dy, dx)
+    vy = points[:, 0] - center[0]
+    vx = points[:, 1] - center[1]
+    ones = np.ones_like(vy)
+    zeros = np.zeros_like(vy)
+    design = np.concatenate(
+        [
+            np.stack([vy, -vx, ones, zeros], axis=1),
+            np.stack([vx, vy, zeros, ones], axis=1),
+        ]
+    )
+    target = np.concatenate([shifts[:, 0], shifts[:, 1]])
+    sqrt_w = np.sqrt(np.concatenate([weights, weights]))[:, None]
+    (a, b, dy, dx), *_ = np.linalg.lstsq(
+        design * sqrt_w, target * sqrt_w[:, 0], rcond=None
+    )
+    return Transform(
+        dy=dy,
+        dx=dx,
+        angle=math.atan2(b, 1 + a),
+        scale=math.hypot(1 + a, b),
+        center=center,
+    )
+
+
+def _coarse_level(pyramid, max_size):
+    """The finest level of a pyramid no larger than max_size."""
+    for level in range(pyramid.nlevels):
+        if max(pyramid.level_shape(level)) <= max_size:
+            return level
+    return pyramid.nlevels - 1
+
+
+def register(
+    ref_pyramid,
+    pyramid,
+    rotation=False,
+    coarse_size=COARSE_SIZE,
+    refine_size=REFINE_SIZE,
+    upsample=UPSAMPLE,
+):
+    """
+    Estimate the transform aligning an image with a reference.
+
+    The transform is estimated on a coarse pyramid level and then refined
+    on a window at full resolution (only needed if the coarse level wasn't
+    the full resolution image).
+
+    Args:
+        ref_pyramid (ImagePyramid): The reference's pyramid.
+        pyramid (ImagePyramid): The image's pyramid.
+        rotation (bool): Whether to estimate a rotation and scale as well
+            as the translation.
+        coarse_size (int): The largest level (pixels along either axis)
+            the coarse estimate is made on.
+        refine_size (int): The size of the full resolution window the
+            estimate is refined on.
+        upsample (int): The sub-pixel precision (1 / upsample pixels).
+
+    Returns:
+        Transform: The reference to image transform (full resolution
+            pixels).
+    """
+    shape = ref_pyramid.source.shape[:2]
+    level = _coarse_level(ref_pyramid, coarse_size)
+    factor = 2**level
+    offset = (factor - 1) / 2
+
+    # The coarse estimate
+    ref_coarse = ref_pyramid.region(level, 0, None, 0, None)
+    resampled = ResampledPyramid(pyramid, Transform(), shape)
+
+    def resample_coarse(transform):
+        resampled.transform = _to_full_resolution(transform, factor, offset)
+        return resampled.region(level, 0, None, 0, None)
+
+    transform, _ = _estimate(ref_coarse, resample_coarse, rotation, 1)
+    transform = _to_full_resolution(transform, factor, offset)
+    if level == 0:
+        return _estimate(ref_coarse, resample_coarse, rotation, upsample)[0]
+
+    # Refine at full resolution by measuring the remaining shift in
+    # windows spread over the image (one central window for a translation)
+    size = min(refine_size, shape[0], shape[1])
+    if rotation:
+        size = min(size, shape[0] // 3, shape[1] // 3)
+        fractions = (1 / 6, 1 / 2, 5 / 6)
+    else:
+        fractions = (1 / 2,)
+    image = ResampledImage(pyramid.source, transform, shape)
+
+    points = []
+    shifts = []
+    for fy in fractions:
+        for fx in fractions:
+            row_start = int(shape[0] * fy) - size // 2
+            col_start = int(shape[1] * fx) - size // 2
+            rows = slice(row_start, row_start + size)
+            cols = slice(col_start, col_start + size)
+            dy, dx, height = phase_correlate(
+                np.asarray(ref_pyramid.source[rows, cols]),
+                image[rows, cols],
+                upsample,
+            )
+            points.append(
+                (row_start + (size - 1) / 2, col_start + (size - 1) / 2)
+            )
+            shifts.append((dy, dx, height))
+
+    residual = _fit_residual(points, shifts, transform.center, rotation)
+    return compose(transform, residual)
@@ -0,0 +1,106 @@
+"""Definition of the RenderScheduler class.
+
+Interactive events (slider drags, window resizes, zooming) can arrive far
+faster than the screen refreshes. Rather than rendering on every event, the
+widgets mark themselves dirty by scheduling their render method. All pending
+renders are then run together at most once per display frame, and a render
+scheduled several times before the frame only runs once, with whatever the
+latest state is, so stale intermediate states are dropped.
+
+Example usage:
+
+    get_scheduler().schedule(self.update_img)
+"""
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+# The minimum time between two frames (ms), ~60 frames per second
+FRAME_INTERVAL = 16
+
+# The shared scheduler
+_scheduler = None
+
+
+class RenderScheduler(QObject):
+    """
+    Coalesces render requests into at most one batch per frame.
+
+    Attributes:
+        interval (int): The minimum time between two frames (ms).
+    """
+
+    def __init__(self, parent=None, interval=FRAME_INTERVAL):
+        """
+        Set up the frame timer.
+
+        Args:
+            parent (QObject): The parent object.
+            interval (int): The minimum time between two frames (ms).
+        """
+        super().__init__(parent)
+
+        self.interval = interval
+
+        # The pending callbacks, the callback is its own key so scheduling
+        # the same bound method twice only runs it once
+        self._pending = {}
+        self._last_frame = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+    def schedule(self, callback):
+        """
+        Request that a callback is run in the next frame.
+
+        Args:
+            callback (callable): The function to run (with no arguments).
+                It should read the latest state when it runs.
+        """
+        self._pending[callback] = None
+
+        if not self._timer.isActive():
+            elapsed = (time.perf_counter() - self._last_frame) * 1000
+            self._timer.start(int(max(0, self.interval - elapsed)))
+
+    def cancel(self, callback):
+        """
+        Drop a pending callback.
+
+        Args:
+            callback (callable): The callback to drop.
+        """
+        self._pending.pop(callback, None)
+
+    def flush(self):
+        """Run all pending callbacks now."""
+        self._timer.stop()
+        self._last_frame = time.perf_counter()
+
+        # Callbacks scheduled while flushing (e.g. a histogram update which
+        # triggers an image update) run in this frame too, but each
+        # callback runs at most once per frame
+        done = set()
+        while self._pending:
+            callback = next(iter(self._pending))
+            del self._pending[callback]
+            if callback in done:
+                self.schedule(callback)
+                break
+            done.add(callback)
+            callback()
+
+
+def get_scheduler():
+    """
+    Get the shared scheduler (created on first use).
+
+    Returns:
+        RenderScheduler: The scheduler.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RenderScheduler()
+    return _scheduler
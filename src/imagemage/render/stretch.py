@@ -0,0 +1,270 @@
+"""Definitions of the display stretches.
+
+A stretch is a monotonic function mapping normalized values in [0, 1] (0 at
+vmin, 1 at vmax) onto display values in [0, 1]. Stretches are never applied
+per pixel directly, the Normalizer evaluates them once over a lookup table
+(every possible value of an 8/16 bit image, or 65536 evenly spaced values for
+float images) so every stretch costs the same as the linear one.
+
+Example usage:
+
+    stretch = get_stretch("asinh", 0.05)
+    display = normalizer(img_arr, vmin, vmax, stretch)
+"""
+import itertools
+
+import numpy as np
+
+from imagemage.render.histogram import HistogramIndex
+
+# Source of unique keys for stretches which depend on the data
+_data_keys = itertools.count()
+
+
+class Stretch:
+    """
+    The base class for all stretches, this is the linear stretch.
+
+    Attributes:
+        name (str): The name of the stretch.
+        param_name (str): The name of the stretch's parameter (None if the
+            stretch has no parameter).
+        positive_param (bool): Whether the parameter must be greater than
+            zero (the stretch divides by it or by a function of it).
+        param (float): The stretch's parameter.
+    """
+
+    name = "linear"
+    param_name = None
+    default_param = None
+    positive_param = False
+
+    def __init__(self, param=None):
+        """
+        Set up the stretch.
+
+        Args:
+            param (float): The stretch's parameter, defaults to
+                default_param.
+
+        Raises:
+            ValueError: If the parameter isn't valid for the stretch.
+        """
+        self.param = self.default_param if param is None else param
+        if not self.is_valid_param(self.param):
+            raise ValueError(
+                f"Invalid {self.param_name} for the {self.name} stretch: "
+                f"{self.param} (must be greater than 0)"
+            )
+
+    @classmethod
+    def is_valid_param(cls, param):
+        """
+        Whether a parameter can be used with the stretch.
+
+        Args:
+            param (float): The parameter.
+
+        Returns:
+            bool: Whether the parameter is valid.
+        """
+        if cls.param_name is None or param is None:
+            return True
+        if not np.isfinite(param):
+            return False
+        return param > 0 if cls.positive_param else True
+
+    @property
+    def key(self):
+        """A hashable key identifying the stretch and its state."""
+        return (self.name, self.param)
+
+    @property
+    def is_linear(self):
+        return type(self) is Stretch
+
+    def update_limits(self, vmin, vmax):
+        """
+        Let the stretch know the display limits are changing.
+
+        Only stretches which depend on the data distribution need this.
+
+        Args:
+            vmin (float): The value mapped to 0.
+            vmax (float): The value mapped to 1.
+        """
+
+    def __call__(self, x):
+        """
+        Evaluate the stretch in place.
+
+        Args:
+            x (np.ndarray): Float values in [0, 1], overwritten with the
+                stretched values.
+
+        Returns:
+            np.ndarray: x.
+        """
+        return x
+
+
+# The linear stretch is the base stretch
+LinearStretch = Stretch
+
+
+class LogStretch(Stretch):
+    """y = log(a * x + 1) / log(a + 1)"""
+
+    name = "log"
+    param_name = "a"
+    default_param = 1000.0
+    positive_param = True
+
+    def __call__(self, x):
+        np.multiply(x, self.param, out=x)
+        np.log1p(x, out=x)
+        np.divide(x, np.log1p(self.param), out=x)
+        return x
+
+
+class SqrtStretch(Stretch):
+    """y = sqrt(x)"""
+
+    name = "sqrt"
+
+    def __call__(self, x):
+        return np.sqrt(x, out=x)
+
+
+class SquaredStretch(Stretch):
+    """y = x ** 2"""
+
+    name = "squared"
+
+    def __call__(self, x):
+        return np.square(x, out=x)
+
+
+class PowerStretch(Stretch):
+    """y = x ** power"""
+
+    name = "power"
+    param_name = "power"
+    default_param = 2.0
+    positive_param = True
+
+    def __call__(self, x):
+        return np.power(x, self.param, out=x)
+
+
+class AsinhStretch(Stretch):
+    """y = asinh(x / a) / asinh(1 / a), a is the softening parameter."""
+
+    name = "asinh"
+    param_name = "a"
+    default_param = 0.1
+    positive_param = True
+
+    def __call__(self, x):
+        np.divide(x, self.param, out=x)
+        np.arcsinh(x, out=x)
+        np.divide(x, np.arcsinh(1 / self.param), out=x)
+        return x
+
+
+class HistEqStretch(Stretch):
+    """
+    A histogram equalization stretch.
+
+    The stretch is the cumulative distribution of the (normalized) data so
+    each display value is used by the same number of pixels.
+
+    Attributes:
+        index (HistogramIndex): The fine histogram of the image values.
+        nbins (int): The number of bins in the cumulative distribution.
+    """
+
+    name = "histeq"
+
+    def __init__(self, param=None, data=None, nbins=1024):
+        """
+        Set up the stretch.
+
+        Args:
+            param (float): Unused.
+            data (np.ndarray/HistogramIndex): The image values (or a sample
+                of them) or an already built index of them.
+            nbins (int): The number of bins in the cumulative distribution.
+        """
+        super().__init__(param)
+        if data is None or isinstance(data, HistogramIndex):
+            self.index = data
+        else:
+            self.index = HistogramIndex(data)
+        self.nbins = nbins
+        self._edges = np.linspace(0, 1, nbins + 1, dtype=np.float32)
+        self._cdf = self._edges.copy()
+        self._data_key = next(_data_keys)
+        self._limits = None
+
+    @property
+    def key(self):
+        return (self.name, self._data_key, self._limits)
+
+    def update_limits(self, vmin, vmax):
+        if self.index is None or self._limits == (vmin, vmax):
+            return
+        self._limits = (vmin, vmax)
+
+        # The distribution of the values between the limits
+        cdf = self.index.count_below(
+            np.linspace(vmin, vmax, self.nbins + 1)
+        ).astype(np.float32)
+        cdf -= cdf[0]
+        if cdf[-1] > 0:
+            cdf /= cdf[-1]
+            self._cdf = cdf
+        else:
+            self._cdf = self._edges.copy()
+
+    def __call__(self, x):
+        x[...] = np.interp(x, self._edges, self._cdf)
+        return x
+
+
+# The available stretches
+STRETCHES = {
+    stretch.name: stretch
+    for stretch in (
+        LinearStretch,
+        LogStretch,
+        SqrtStretch,
+        SquaredStretch,
+        AsinhStretch,
+        PowerStretch,
+        HistEqStretch,
+    )
+}
+
+
+def get_stretch(name, param=None, data=None):
+    """
+    Create a stretch by name.
+
+    Args:
+        name (str): The name of the stretch (a key of STRETCHES).
+        param (float): The stretch's parameter (the default if None).
+        data (np.ndarray/HistogramIndex): The image data (or an index of
+            it), only used by stretches which depend on the data
+            distribution.
+
+    Returns:
+        Stretch: The stretch.
+    """
+    if name not in STRETCHES:
+        raise ValueError(
+            f"Unknown stretch {name} (available: {list(STRETCHES)})"
+        )
+    if name == HistEqStretch.name:
+        return HistEqStretch(param, data=data)
+    return STRETCHES[name](param)
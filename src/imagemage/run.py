@@ -4,14 +4,109 @@ All functionality for IMage is contained within the module files or extension
 files. This is the entry point function from which IMage is called on the
 command line.
 
+Given a display recipe with --batch, the files are rendered headlessly
+(see imagemage.batch) rather than opening the GUI.
+
+With --startup-report the time taken to get the window on screen, and the
+modules imported on the way, are printed (see imagemage.startup).
+
 Example usage:
 
-    py-image --hdf5 image_file.hdf5
+    image-mage image_file.hdf5
+    image-mage --startup-report image_file.hdf5
+    image-mage --batch recipe.json -o rendered/ -j 8 nightly/
 """
+import argparse
 import sys
-from PyQt5.QtWidgets import QApplication
+import time
+
+# When IMage started (startup is timed from here)
+START_TIME = time.perf_counter()
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments.
 
-from imagemage.mage import ImageMage
+    Args:
+        argv (list): The arguments (sys.argv[1:] if None).
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="image-mage",
+        description="A customisable image processing interface.",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Image files to open (files or directories to render with "
+        "--batch).",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="RECIPE",
+        help="Render the files headlessly with this display recipe.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=".",
+        help="The directory batch outputs are written to.",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="png",
+        help="The batch output format (png, tiff, h5 or fits).",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="The number of batch worker processes (default: one per core).",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=None,
+        metavar="MIB",
+        help="The memory the open images may share before the least "
+        "recently viewed are unloaded (MiB, default: 2048).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=None,
+        metavar="MIB",
+        help="The maximum size of the disk cache of pyramids and statistics "
+        "(MiB, default: 4096).",
+    )
+    parser.add_argument(
+        "--no-disk-cache",
+        action="store_true",
+        help="Don't use (or add to) the disk cache.",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Empty the disk cache before starting (exits if no files are "
+        "given).",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Re-render files a previous batch already rendered.",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="Print how long each step of starting up took and the slowest "
+        "modules imported once the window is shown.",
+    )
+    return parser.parse_args(argv)
 
 
 def main():
@@ -19,13 +114,77 @@ def main():
     Run IMage.
 
     This simply instantiates the app window and then closes when the
-    application exits.
+    application exits, or runs a headless batch if one was asked for.
     """
-    app = QApplication(sys.argv)
+    args = parse_args()
+
+    report = None
+    if args.startup_report:
+        from imagemage.startup import StartupReport
+
+        report = StartupReport(START_TIME)
+        report.track_imports()
+        report.mark("parse arguments")
+
+    from imagemage.readers.diskcache import DiskCache, set_disk_cache
+
+    if args.no_disk_cache:
+        set_disk_cache(None)
+    else:
+        cache = DiskCache(
+            max_bytes=(
+                args.cache_size * 2**20
+                if args.cache_size is not None
+                else None
+            )
+        )
+        set_disk_cache(cache)
+        if args.clear_cache:
+            freed = cache.clear()
+            print(f"Freed {freed / 2**20:.1f} MiB from {cache.directory}")
+            if not args.files:
+                return 0
+
+    if args.batch is not None:
+        from imagemage.batch import main as batch_main
+
+        return batch_main(args)
+
+    if report is not None:
+        report.mark("set up the disk cache")
+
+    from PyQt5.QtWidgets import QApplication
+
+    if report is not None:
+        report.mark("import Qt")
+
+    from imagemage.mage import ImageMage
+
+    if report is not None:
+        report.mark("import the GUI")
+
+    app = QApplication(sys.argv[:1])
     app.setApplicationName("IMage")
-    main_win = ImageMage()
+    memory_budget = (
+        args.memory_budget * 2**20
+        if args.memory_budget is not None
+        else None
+    )
+    main_win = ImageMage(memory_budget=memory_budget)
+    if report is not None:
+        report.mark("create the window")
     main_win.show()
 
+    if args.files:
+        main_win.image_view.open_file(args.files[0])
+    if report is not None:
+        report.mark("show the window and start opening files")
+
+        # Runs once the event loop has painted the window
+        from PyQt5.QtCore import QTimer
+
+        QTimer.singleShot(0, report.finish)
+
     return app.exec_()
 
 
@@ -0,0 +1,354 @@
+"""Definition of the Session, SessionImage and ImageState classes.
+
+A session holds every image the user has open (each shown in its own tab)
+while only one is displayed at a time. Everything an open image holds in
+memory counts against a single budget shared by the whole session:
+
+    - decoded pixels (formats like PNG and JPEG are decoded in full)
+    - the in memory pyramid levels (and a cube's cached planes)
+    - the normalized tiles in the render caches
+
+When the session goes over budget the images viewed least recently are
+evicted: their readers are closed and everything they held is dropped,
+leaving only a recipe (see render.recipe) saying where the image lives on
+disk and how it was displayed. Switching back to an evicted image opens it
+again from its source with the same display settings, so eviction is
+invisible apart from the time taken to reload.
+
+Example usage:
+
+    session = Session(budget=4 * 2**30)
+    image = session.add("mosaic.fits", state)
+    ...
+    for evicted in session.enforce_budget(render_cache):
+        print(f"Evicted {evicted.name}")
+"""
+import itertools
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from imagemage.readers.cube import DataCube
+
+# The default memory budget of a session (bytes)
+DEFAULT_SESSION_BUDGET = 2 * 2**30
+
+# Source of unique ids for session images
+_session_ids = itertools.count()
+
+
+def _array_nbytes(array):
+    """
+    The bytes of RAM an array holds (memory mapped arrays, e.g. from the
+    disk cache, are paged in and out by the OS so don't count).
+    """
+    if not isinstance(array, np.ndarray) or isinstance(array, np.memmap):
+        return 0
+    return array.nbytes
+
+
+def _pyramid_nbytes(pyramid):
+    """The bytes held by a pyramid's in memory levels."""
+    if pyramid is None:
+        return 0
+    return sum(_array_nbytes(level) for level in pyramid.levels.values())
+
+
+def _reader_nbytes(reader):
+    """The bytes of decoded pixels held by a reader (0 for lazy readers)."""
+    return _array_nbytes(getattr(reader, "array", None))
+
+
+@dataclass
+class ImageState:
+    """
+    Everything an open image holds while it is loaded.
+
+    Attributes:
+        reader (object): The image's reader (or DataCube).
+        image (array-like): The 2D image displayed (the reader itself for
+            plain images, a plane or collapse for cubes).
+        pyramid (ImagePyramid): The pyramid the image is rendered from.
+        overview (np.ndarray): The in memory overview of the image.
+        sample (np.ndarray): A sample of the pixel values.
+        vmin (float): The lower display limit.
+        vmax (float): The upper display limit.
+        stretch (Stretch): The stretch.
+        cmap (str): The colormap.
+        composite (Composite): The composite (None for a single image).
+        cube_view (str): The view of a cube being shown.
+        plane (int): The plane of a cube being shown.
+        cube_sample (np.ndarray): The sample of a whole cube.
+        image_id (int): The render cache id of the image (or view) shown.
+        view_ids (dict): The render cache ids of each view of a cube.
+    """
+
+    reader: object = None
+    image: object = None
+    pyramid: object = None
+    overview: object = None
+    sample: object = None
+    vmin: float = None
+    vmax: float = None
+    stretch: object = None
+    cmap: str = "gray"
+    composite: object = None
+    cube_view: str = "plane"
+    plane: int = 0
+    cube_sample: object = None
+    image_id: int = None
+    view_ids: dict = field(default_factory=dict)
+
+    @property
+    def cube(self):
+        """The DataCube being shown (None for a 2D image)."""
+        return self.reader if isinstance(self.reader, DataCube) else None
+
+    @property
+    def render_ids(self):
+        """The ids of every render cache entry belonging to the image."""
+        ids = set(self.view_ids.values())
+        if self.image_id is not None:
+            ids.add(self.image_id)
+        return ids
+
+    def nbytes(self, render_cache=None):
+        """
+        Count the memory the image holds.
+
+        Args:
+            render_cache (RenderCache): The view's render cache (its
+                entries for this image are counted).
+
+        Returns:
+            int: The bytes held.
+        """
+        nbytes = _reader_nbytes(self.reader) + _pyramid_nbytes(self.pyramid)
+        nbytes += _array_nbytes(self.sample)
+
+        # A cube's cached planes (the displayed pyramid is one of them) and
+        # collapses
+        cube = self.cube
+        if cube is not None:
+            nbytes += cube.nbytes() - _pyramid_nbytes(self.pyramid)
+
+        if self.composite is not None:
+            nbytes += self.composite.cache.nbytes
+            for band in self.composite.bands:
+                nbytes += _reader_nbytes(band.source)
+                nbytes += _pyramid_nbytes(band.pyramid)
+                nbytes += _array_nbytes(band.sample)
+
+        if render_cache is not None:
+            nbytes += sum(
+                render_cache.image_nbytes(image_id)
+                for image_id in self.render_ids
+            )
+        return nbytes
+
+    def close(self, render_cache=None):
+        """
+        Release everything the image holds.
+
+        Args:
+            render_cache (RenderCache): The view's render cache (the
+                image's entries are removed).
+        """
+        if self.composite is not None:
+            self.composite.close()
+        if self.reader is not None:
+            self.reader.close()
+        if render_cache is not None:
+            for image_id in self.render_ids:
+                render_cache.clear(image_id)
+
+        self.reader = None
+        self.image = None
+        self.pyramid = None
+        self.overview = None
+        self.sample = None
+        self.composite = None
+        self.cube_sample = None
+        self.view_ids = {}
+
+
+@dataclass
+class SessionImage:
+    """
+    An image open in a session.
+
+    Attributes:
+        name (str): The name shown for the image.
+        state (ImageState): What the image holds while loaded (None once
+            evicted). The current image's state lives in the view and is
+            only brought up to date when the view switches away from it.
+        recipe (Recipe): Where the image lives and how it was displayed,
+            used to reload it once evicted.
+        view_transform (object): The view's zoom when the image was last
+            shown (a QTransform).
+        view_center (object): The scene point at the centre of the view
+            when the image was last shown.
+        last_viewed (float): When the image was last shown
+            (time.monotonic).
+        id (int): A unique id for the image.
+    """
+
+    name: str
+    state: ImageState = None
+    recipe: object = None
+    view_transform: object = None
+    view_center: object = None
+    last_viewed: float = field(default_factory=time.monotonic)
+    id: int = field(default_factory=lambda: next(_session_ids))
+
+    @property
+    def is_loaded(self):
+        """Whether the image is loaded (rather than evicted)."""
+        return self.state is not None
+
+
+class Session:
+    """
+    The images open in a view and their shared memory budget.
+
+    Attributes:
+        images (list): The SessionImages in the order they were opened.
+        current (SessionImage): The image being shown (None if none is).
+        budget (int): The maximum number of bytes the images may hold.
+    """
+
+    def __init__(self, budget=DEFAULT_SESSION_BUDGET):
+        """
+        Set up an empty session.
+
+        Args:
+            budget (int): The maximum number of bytes the images may hold.
+        """
+        self.images = []
+        self.current = None
+        self.budget = budget
+
+    def __len__(self):
+        return len(self.images)
+
+    def __iter__(self):
+        return iter(self.images)
+
+    def index(self, image):
+        """The position of an image in the session."""
+        return self.images.index(image)
+
+    def add(self, name, state=None):
+        """
+        Add a newly opened image (it becomes the current image).
+
+        Args:
+            name (str): The name shown for the image.
+            state (ImageState): What the image holds.
+
+        Returns:
+            SessionImage: The image.
+        """
+        image = SessionImage(name, state)
+        self.images.append(image)
+        self.activate(image)
+        return image
+
+    def activate(self, image):
+        """
+        Make an image the current image.
+
+        Args:
+            image (SessionImage): The image.
+        """
+        self.current = image
+        image.last_viewed = time.monotonic()
+
+    def remove(self, image, render_cache=None):
+        """
+        Close an image and remove it from the session.
+
+        Args:
+            image (SessionImage): The image.
+            render_cache (RenderCache): The view's render cache.
+        """
+        if image.state is not None:
+            image.state.close(render_cache)
+            image.state = None
+        self.images.remove(image)
+        if self.current is image:
+            self.current = None
+
+    def nbytes(self, render_cache=None, current_state=None):
+        """
+        Count the memory held by every loaded image.
+
+        Args:
+            render_cache (RenderCache): The view's render cache.
+            current_state (ImageState): The up to date state of the
+                current image (its stored state is used if None).
+
+        Returns:
+            int: The bytes held.
+        """
+        nbytes = 0
+        for image in self.images:
+            state = image.state
+            if image is self.current and current_state is not None:
+                state = current_state
+            if state is not None:
+                nbytes += state.nbytes(render_cache)
+        return nbytes
+
+    def evict(self, image, render_cache=None):
+        """
+        Drop everything an image holds, leaving only its recipe.
+
+        Args:
+            image (SessionImage): The image (never the current image).
+            render_cache (RenderCache): The view's render cache.
+        """
+        if image.state is not None:
+            image.state.close(render_cache)
+            image.state = None
+
+    def enforce_budget(self, render_cache=None, current_state=None):
+        """
+        Evict the least recently viewed images until within budget.
+
+        The current image is never evicted (it is kept even if it alone
+        is over budget).
+
+        Args:
+            render_cache (RenderCache): The view's render cache.
+            current_state (ImageState): What the current image holds (it
+                lives in the view while shown).
+
+        Returns:
+            list: The evicted SessionImages.
+        """
+        nbytes = self.nbytes(render_cache, current_state)
+
+        candidates = sorted(
+            (
+                image
+                for image in self.images
+                if image.state is not None and image is not self.current
+            ),
+            key=lambda image: image.last_viewed,
+        )
+
+        evicted = []
+        for image in candidates:
+            if nbytes <= self.budget:
+                break
+            nbytes -= image.state.nbytes(render_cache)
+            self.evict(image, render_cache)
+            evicted.append(image)
+        return evicted
+
+    def close(self, render_cache=None):
+        """Close every image."""
+        for image in list(self.images):
+            self.remove(image, render_cache)
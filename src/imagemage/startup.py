@@ -0,0 +1,161 @@
+"""Definition of the StartupReport class.
+
+Measures how long IMage takes to get its window on screen, to keep an eye
+on time-to-first-window as features are added. Run with --startup-report
+to print, once the window has first been shown:
+
+    - the time taken by each step of starting up
+    - the modules imported before the window appeared, the slowest first,
+      in the style of python -X importtime (microseconds spent importing
+      each module itself and including the modules it imported)
+
+Heavy dependencies (h5py, PIL, matplotlib, ...) should be imported on
+first use (see imagemage.registry) rather than showing up in the report.
+
+Example usage:
+
+    report = StartupReport()
+    report.track_imports()
+    from imagemage.mage import ImageMage
+    report.mark("import GUI")
+    ...
+    report.finish()
+"""
+import sys
+import time
+
+import _frozen_importlib
+
+# The number of slowest imports listed
+TOP_IMPORTS = 25
+
+
+class StartupReport:
+    """
+    The timings of the steps of starting up and the imports made.
+
+    Attributes:
+        steps (list): The (name, seconds) of each step.
+        imports (list): The (module, self us, cumulative us, depth) of each
+            module imported while tracking.
+    """
+
+    def __init__(self, start=None):
+        """
+        Start timing.
+
+        Args:
+            start (float): The time.perf_counter() startup began at (now if
+                None).
+        """
+        self.start = start if start is not None else time.perf_counter()
+        self.steps = []
+        self.imports = []
+
+        self._last = self.start
+
+        # The import machinery's loading function (replaced while tracking)
+        # and the time spent in the imports each import being timed made
+        self._find_and_load = None
+        self._child_times = []
+
+    def mark(self, step):
+        """
+        Record the end of a step.
+
+        Args:
+            step (str): The name of the step.
+        """
+        now = time.perf_counter()
+        self.steps.append((step, now - self._last))
+        self._last = now
+
+    def track_imports(self):
+        """
+        Time every module imported from now on (until finish).
+
+        Every first import (however it's made, import statements,
+        importlib.import_module, ...) goes through the import machinery's
+        _find_and_load, which is wrapped in a timer.
+        """
+        if self._find_and_load is not None:
+            return
+        self._find_and_load = _frozen_importlib._find_and_load
+        find_and_load = self._find_and_load
+
+        def timed_find_and_load(name, *args, **kwargs):
+            self._child_times.append(0.0)
+            start = time.perf_counter()
+            try:
+                return find_and_load(name, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = self._child_times.pop()
+                if self._child_times:
+                    self._child_times[-1] += elapsed
+                self.imports.append(
+                    (
+                        name,
+                        int((elapsed - children) * 1e6),
+                        int(elapsed * 1e6),
+                        len(self._child_times),
+                    )
+                )
+
+        _frozen_importlib._find_and_load = timed_find_and_load
+
+    def stop_tracking(self):
+        """Stop timing imports."""
+        if self._find_and_load is not None:
+            _frozen_importlib._find_and_load = self._find_and_load
+            self._find_and_load = None
+
+    def format(self, top=TOP_IMPORTS):
+        """
+        Lay out the report.
+
+        Args:
+            top (int): The number of slowest imports listed.
+
+        Returns:
+            str: The report.
+        """
+        total = self._last - self.start
+        lines = [f"Startup took {total * 1000:.0f} ms"]
+        for step, seconds in self.steps:
+            lines.append(f"  {seconds * 1000:8.1f} ms  {step}")
+
+        if self.imports:
+            import_us = sum(
+                cumulative
+                for _, _, cumulative, depth in self.imports
+                if depth == 0
+            )
+            lines.append(
+                f"{len(self.imports)} modules imported in "
+                f"{import_us / 1000:.0f} ms, the slowest:"
+            )
+            lines.append(
+                "import time: self [us] | cumulative | imported package"
+            )
+            slowest = sorted(
+                self.imports, key=lambda entry: entry[2], reverse=True
+            )
+            for name, self_us, cumulative, depth in slowest[:top]:
+                lines.append(
+                    f"import time: {self_us:>9} | {cumulative:>10} | "
+                    f"{'  ' * depth}{name}"
+                )
+        return "\n".join(lines)
+
+    def finish(self, step="first window shown", file=None):
+        """
+        Record the last step, stop timing imports and print the report.
+
+        Args:
+            step (str): The name of the last step.
+            file (file): Where the report is printed (stderr if None).
+        """
+        self.mark(step)
+        self.stop_tracking()
+        print(self.format(), file=file if file is not None else sys.stderr)
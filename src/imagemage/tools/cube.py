@@ -0,0 +1,114 @@
+"""Definition of the CubeWidget class.
+
+This widget navigates the planes of a data cube: a slider (and spin box)
+choosing the plane shown and a selector switching between single planes
+and the cube collapsed along its planes (sum, mean or max).
+
+Moving the slider only asks for a plane, the image view reads planes in
+the background and reports each plane it actually shows, so the slider
+never waits on the disk.
+"""
+from PyQt5.QtWidgets import (
+    QComboBox,
+    QFrame,
+    QHBoxLayout,
+    QLabel,
+    QSlider,
+    QSpinBox,
+)
+from PyQt5.QtCore import Qt, pyqtSignal
+
+from imagemage.readers.cube import COLLAPSE_OPS
+
+# The entries of the view selector (the view names are their lower case)
+VIEW_LABELS = ("Plane",) + tuple(op.capitalize() for op in COLLAPSE_OPS)
+
+
+class CubeWidget(QFrame):
+    planeSelected = pyqtSignal(int)
+    viewSelected = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setObjectName("CubeWidget")
+
+        self.view_select = QComboBox(self)
+        self.view_select.addItems(VIEW_LABELS)
+        self.view_select.currentTextChanged.connect(self.select_view)
+
+        self.slider = QSlider(Qt.Horizontal, self)
+        self.slider.setPageStep(10)
+        self.slider.valueChanged.connect(self.select_plane)
+
+        self.plane_entry = QSpinBox(self)
+        self.plane_entry.valueChanged.connect(self.slider.setValue)
+
+        self.status = QLabel(self)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(5, 0, 5, 0)
+        layout.addWidget(self.view_select)
+        layout.addWidget(self.slider, stretch=1)
+        layout.addWidget(self.plane_entry)
+        layout.addWidget(self.status)
+
+        self.nplanes = 0
+
+    def set_nplanes(self, nplanes):
+        """
+        Set up the controls for a newly opened cube.
+
+        Args:
+            nplanes (int): The number of planes (0 if the image isn't a
+                cube).
+        """
+        self.nplanes = nplanes
+        for widget in (self.slider, self.plane_entry, self.view_select):
+            widget.blockSignals(True)
+        self.slider.setRange(0, max(nplanes - 1, 0))
+        self.plane_entry.setRange(0, max(nplanes - 1, 0))
+        self.slider.setValue(0)
+        self.plane_entry.setValue(0)
+        self.view_select.setCurrentIndex(0)
+        for widget in (self.slider, self.plane_entry, self.view_select):
+            widget.blockSignals(False)
+        self.status.setText("")
+
+    def select_plane(self, index):
+        self.plane_entry.blockSignals(True)
+        self.plane_entry.setValue(index)
+        self.plane_entry.blockSignals(False)
+        self.planeSelected.emit(index)
+
+    def select_view(self, label):
+        view = label.lower()
+        if view != "plane":
+            self.status.setText("Computing...")
+        self.viewSelected.emit(view)
+
+    def show_view(self, view, index):
+        """
+        Show which view of the cube the image view is displaying.
+
+        Args:
+            view (str): "plane" or the collapse shown.
+            index (int): The plane shown (or last shown for a collapse).
+        """
+        self.view_select.blockSignals(True)
+        self.view_select.setCurrentText(view.capitalize())
+        self.view_select.blockSignals(False)
+
+        # Only move the slider if the user isn't dragging it elsewhere
+        if not self.slider.isSliderDown():
+            self.slider.blockSignals(True)
+            self.plane_entry.blockSignals(True)
+            self.slider.setValue(index)
+            self.plane_entry.setValue(index)
+            self.slider.blockSignals(False)
+            self.plane_entry.blockSignals(False)
+
+        if view == "plane":
+            self.status.setText(f"of {self.nplanes}")
+        else:
+            self.status.setText(f"{view} of {self.nplanes} planes")
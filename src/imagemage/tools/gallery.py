@@ -0,0 +1,536 @@
+"""Definition of the GalleryWidget class.
+
+The gallery shows a grid of thumbnails of every image in a directory: one
+per picture, HDF5 dataset and FITS image HDU. Double clicking a thumbnail
+opens its image in the image view.
+
+Thumbnails are made by a pool of worker processes (see readers.thumbnails)
+and only for the part of the grid in view and the screen after it, so a
+directory of thousands of files is browsable straight away. Files which
+are scrolled past before a worker gets to them are dropped from the
+pool's queue. A file holding several images starts as one entry and is
+split into an entry per image once its thumbnails are made. A file which
+crashes a worker is shown as crashed, the other files lost with the
+worker are requested again.
+
+Example usage:
+
+    gallery = GalleryWidget()
+    gallery.imageActivated.connect(image_view.open_location)
+    gallery.set_directory("night/")
+"""
+import math
+import os
+import queue
+from dataclasses import dataclass
+
+from PyQt5.QtWidgets import (
+    QApplication,
+    QFileDialog,
+    QFrame,
+    QHBoxLayout,
+    QLabel,
+    QListView,
+    QPushButton,
+    QVBoxLayout,
+)
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtCore import (
+    QAbstractListModel,
+    QModelIndex,
+    QPoint,
+    QSize,
+    Qt,
+    QTimer,
+    pyqtSignal,
+)
+
+from imagemage.readers.diskcache import get_disk_cache
+from imagemage.readers.filmstrip import list_images
+from imagemage.readers.formats import INPUT_FORMATS
+from imagemage.readers.thumbnails import (
+    THUMBNAIL_SIZE,
+    evict_cache,
+    init_worker,
+    make_thumbnails,
+)
+from imagemage.render.qimage import array_to_qimage
+from imagemage.render.scheduler import get_scheduler
+
+# The most worker processes making thumbnails
+MAX_WORKERS = 8
+
+# How often finished thumbnails are collected from the workers (ms)
+POLL_INTERVAL = 50
+
+# The number of screens of thumbnails made beyond the one in view
+LOOKAHEAD_SCREENS = 1
+
+# The space around each thumbnail in the grid (for its label) (pixels)
+GRID_MARGIN = QSize(24, 36)
+
+
+@dataclass
+class GalleryItem:
+    """
+    An entry of the gallery.
+
+    Attributes:
+        path (str): The path of the file.
+        name (object): The HDF5 dataset or FITS HDU index of the image
+            (None for other formats and files not yet looked into).
+        label (str): The text shown below the thumbnail.
+        pixmap (QPixmap): The thumbnail (None until it's made).
+        state (str): "new", "queued", "done" or "failed".
+    """
+
+    path: str
+    name: object
+    label: str
+    pixmap: QPixmap = None
+    state: str = "new"
+
+    @property
+    def location(self):
+        """Where the image comes from (see readers.formats)."""
+        location = {"source": self.path}
+        match INPUT_FORMATS.get(os.path.splitext(self.path)[1].lower()):
+            case "hdf5":
+                location["dataset"] = self.name
+            case "fits":
+                location["hdu"] = self.name
+        return location
+
+
+class GalleryModel(QAbstractListModel):
+    """The entries of the gallery."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.items = []
+
+        # The row of the first entry of each file
+        self._rows = {}
+
+        # Shown in place of thumbnails which aren't made yet (so labels
+        # don't move when they arrive)
+        self._placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self._placeholder.fill(Qt.transparent)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            return item.label
+        if role == Qt.DecorationRole:
+            return (
+                item.pixmap if item.pixmap is not None else self._placeholder
+            )
+        if role == Qt.ToolTipRole:
+            return (
+                item.path if item.name is None else f"{item.path} {item.label}"
+            )
+        return None
+
+    def set_paths(self, paths):
+        """
+        Replace the entries with one per file.
+
+        Args:
+            paths (list): The paths of the files.
+        """
+        self.beginResetModel()
+        self.items = [
+            GalleryItem(path, None, os.path.basename(path)) for path in paths
+        ]
+        self._rows = {path: row for row, path in enumerate(paths)}
+        self.endResetModel()
+
+    def item_at(self, row):
+        """The entry in a row."""
+        return self.items[row]
+
+    def set_state(self, path, state):
+        """Set the state of a file's entry (before its thumbnails exist)."""
+        row = self._rows.get(path)
+        if row is not None:
+            self.items[row].state = state
+
+    def set_thumbnails(self, path, thumbnails):
+        """
+        Show a file's thumbnails, splitting its entry into one per image.
+
+        Args:
+            path (str): The path of the file.
+            thumbnails (list): The (dataset/HDU, uint8 thumbnail) of each
+                image (see readers.thumbnails.make_thumbnails).
+        """
+        row = self._rows.get(path)
+        if row is None:
+            return
+        if not thumbnails:
+            self.set_failed(path, "no images")
+            return
+
+        basename = os.path.basename(path)
+        fmt = INPUT_FORMATS.get(os.path.splitext(path)[1].lower())
+        items = []
+        for name, thumbnail in thumbnails:
+            if len(thumbnails) == 1 or name is None:
+                label = basename
+            elif fmt == "fits":
+                label = f"{basename}[{name}]"
+            else:
+                label = f"{basename}:{name.lstrip('/')}"
+            items.append(
+                GalleryItem(
+                    path,
+                    name,
+                    label,
+                    QPixmap.fromImage(array_to_qimage(thumbnail)),
+                    "done",
+                )
+            )
+
+        self.items[row] = items[0]
+        self.dataChanged.emit(self.index(row), self.index(row))
+        if len(items) > 1:
+            self.beginInsertRows(QModelIndex(), row + 1, row + len(items) - 1)
+            self.items[row + 1 : row + 1] = items[1:]
+            self._rows = {}
+            for irow, item in enumerate(self.items):
+                self._rows.setdefault(item.path, irow)
+            self.endInsertRows()
+
+    def set_failed(self, path, message):
+        """Mark a file which has no thumbnail."""
+        row = self._rows.get(path)
+        if row is None:
+            return
+        item = self.items[row]
+        item.state = "failed"
+        item.label = f"{os.path.basename(path)} ({message})"
+        self.dataChanged.emit(self.index(row), self.index(row))
+
+
+class GalleryWidget(QFrame):
+    """
+    A grid of thumbnails of the images in a directory.
+
+    Attributes:
+        imageActivated (pyqtSignal): Emitted with the location (see
+            readers.formats.source_location) of an image double clicked.
+        directory (str): The directory shown (None before one is chosen).
+    """
+
+    imageActivated = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setObjectName("GalleryWidget")
+
+        self.directory = None
+
+        self.model = GalleryModel(self)
+
+        self.view = QListView(self)
+        self.view.setViewMode(QListView.IconMode)
+        self.view.setMovement(QListView.Static)
+        self.view.setResizeMode(QListView.Adjust)
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.Batched)
+        self.view.setBatchSize(500)
+        self.view.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.view.setGridSize(
+            QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE) + GRID_MARGIN
+        )
+        self.view.setTextElideMode(Qt.ElideMiddle)
+        self.view.setModel(self.model)
+        self.view.activated.connect(self._activate)
+        self.view.verticalScrollBar().valueChanged.connect(
+            self._schedule_request
+        )
+
+        self.dir_label = QLabel(self)
+        self.dir_label.setTextFormat(Qt.PlainText)
+        folder_button = QPushButton("Folder...", self)
+        folder_button.clicked.connect(self.choose_directory)
+
+        header = QHBoxLayout()
+        header.addWidget(self.dir_label, stretch=1)
+        header.addWidget(folder_button)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(5, 5, 5, 5)
+        layout.addLayout(header)
+        layout.addWidget(self.view, stretch=1)
+
+        # The worker processes (started on first use), the thumbnails
+        # being made keyed by path, the thumbnails made waiting to be
+        # shown and the timer collecting them
+        self._pool = None
+        self._futures = {}
+        self._results = queue.Queue()
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL)
+        self._poll_timer.timeout.connect(self._collect)
+
+        # Counts directory changes (so late results are recognised)
+        self._generation = 0
+
+        # Whether thumbnails have been made since the disk cache was last
+        # brought within its size limit
+        self._cache_grown = False
+
+        # The single worker retrying the files being worked on when a
+        # worker died (started on first use) and those files
+        self._isolated_pool = None
+        self._suspects = set()
+
+        # The queue each pool's workers report the files they start on to
+        # and the files being worked on
+        self._started = {}
+        self._running = set()
+
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(
+            self, "Gallery Folder", self.directory or ""
+        )
+        if directory:
+            self.set_directory(directory)
+
+    def set_directory(self, directory):
+        """
+        Show the images in a directory.
+
+        Args:
+            directory (str): The directory.
+        """
+        directory = os.path.abspath(directory)
+        self._cancel_all()
+        self._generation += 1
+        self.directory = directory
+        self.dir_label.setText(directory)
+        self.dir_label.setToolTip(directory)
+        try:
+            paths = list_images(directory)
+        except OSError:
+            paths = []
+        self.model.set_paths(paths)
+        self._schedule_request()
+
+    def shutdown(self):
+        """Stop the worker processes (thumbnails still queued are lost)."""
+        self._poll_timer.stop()
+        for pool in (self._pool, self._isolated_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self._isolated_pool = None
+        self._started = {}
+        self._futures = {}
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._schedule_request()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._schedule_request()
+
+    def _schedule_request(self, *args):
+        get_scheduler().schedule(self._request_visible)
+
+    def _get_pool(self, isolated=False):
+        """
+        Get the worker processes (started on first use).
+
+        Args:
+            isolated (bool): Get the single worker process files suspected
+                of crashing a worker are retried on, so a crash there is
+                down to the one file it was working on.
+
+        Returns:
+            ProcessPoolExecutor: The pool.
+        """
+        pool = self._isolated_pool if isolated else self._pool
+        if pool is None:
+            # Imported here as the gallery is often never used
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Forking a process running Qt's threads isn't safe
+            context = multiprocessing.get_context("spawn")
+            started = context.SimpleQueue()
+            pool = ProcessPoolExecutor(
+                max_workers=(
+                    1 if isolated else min(MAX_WORKERS, os.cpu_count() or 1)
+                ),
+                mp_context=context,
+                initializer=init_worker,
+                initargs=(started,),
+            )
+            self._started[pool] = started
+            if isolated:
+                self._isolated_pool = pool
+            else:
+                self._pool = pool
+        return pool
+
+    def _visible_rows(self):
+        """The rows in view and the screens of rows after them."""
+        nrows = self.model.rowCount()
+        if nrows == 0 or not self.isVisible():
+            return range(0)
+        grid = self.view.gridSize()
+        viewport = self.view.viewport().size()
+        first = self.view.indexAt(
+            QPoint(grid.width() // 2, grid.height() // 2)
+        ).row()
+        first = max(first, 0)
+        columns = max(1, viewport.width() // grid.width())
+        screen = columns * (math.ceil(viewport.height() / grid.height()) + 1)
+        return range(
+            first, min(nrows, first + screen * (1 + LOOKAHEAD_SCREENS))
+        )
+
+    def _request_visible(self):
+        """Make the thumbnails in view, dropping those scrolled past."""
+        wanted = {}
+        for row in self._visible_rows():
+            item = self.model.item_at(row)
+            if item.state in ("new", "queued"):
+                wanted.setdefault(item.path, None)
+
+        # Futures only cancel while they're waiting for a worker
+        for path, future in list(self._futures.items()):
+            if path not in wanted and future.cancel():
+                del self._futures[path]
+                self.model.set_state(path, "new")
+
+        if not wanted:
+            return
+        disk_cache = get_disk_cache()
+        cache_dir = disk_cache.directory if disk_cache is not None else None
+        for path in wanted:
+            if path in self._futures:
+                continue
+            pool = self._get_pool(isolated=path in self._suspects)
+            future = pool.submit(
+                make_thumbnails, path, THUMBNAIL_SIZE, cache_dir
+            )
+            self._futures[path] = future
+            self.model.set_state(path, "queued")
+            request = (self._generation, pool, path)
+            future.add_done_callback(
+                lambda future, request=request: (
+                    self._results.put((*request, future))
+                )
+            )
+        if not self._poll_timer.isActive():
+            self._poll_timer.start()
+
+    def _collect(self):
+        """Show the thumbnails the workers have made."""
+        from concurrent.futures.process import BrokenProcessPool
+
+        while True:
+            try:
+                generation, pool, path, future = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._take_started()
+            if future.cancelled():
+                continue
+            if generation != self._generation:
+                if isinstance(future.exception(), BrokenProcessPool):
+                    self._drop_pool(pool)
+                self._running.discard(path)
+                continue
+            if self._futures.get(path) is future:
+                del self._futures[path]
+            try:
+                self.model.set_thumbnails(path, future.result())
+                self._cache_grown = True
+            except BrokenProcessPool:
+                self._worker_crashed(path, pool)
+            except Exception as error:
+                self.model.set_failed(path, type(error).__name__)
+            self._running.discard(path)
+
+        if not self._futures:
+            self._poll_timer.stop()
+            self._evict_cache()
+
+    def _take_started(self):
+        """Note the files the workers have started on."""
+        for started in self._started.values():
+            while not started.empty():
+                self._running.add(started.get())
+
+    def _drop_pool(self, pool):
+        """
+        Stop using a pool one of whose workers died.
+
+        Args:
+            pool (ProcessPoolExecutor): The pool.
+        """
+        if pool not in self._started:
+            return
+        # The pool's workers have all reported the files they started on
+        self._take_started()
+        del self._started[pool]
+        if pool is self._pool:
+            self._pool = None
+        elif pool is self._isolated_pool:
+            self._isolated_pool = None
+
+    def _worker_crashed(self, path, pool):
+        """
+        Handle a file whose thumbnails were lost to a worker dying.
+
+        Every file queued on a pool is lost when one of its workers dies.
+        The files which were being worked on are retried one at a time on
+        the isolated pool, and shown as crashed if they crash it. The
+        others are requested again from a new pool.
+
+        Args:
+            path (str): The path of the file.
+            pool (ProcessPoolExecutor): The pool the file was queued on.
+        """
+        self._drop_pool(pool)
+        if path in self._running:
+            if path in self._suspects:
+                self.model.set_failed(path, "crashed")
+                return
+            self._suspects.add(path)
+        self.model.set_state(path, "new")
+        self._schedule_request()
+
+    def _evict_cache(self):
+        """Bring the disk cache within its size limit (in a worker)."""
+        disk_cache = get_disk_cache()
+        if not self._cache_grown or disk_cache is None:
+            return
+        self._cache_grown = False
+        self._get_pool().submit(
+            evict_cache, disk_cache.directory, disk_cache.max_bytes
+        )
+
+    def _cancel_all(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+
+    def _activate(self, index):
+        if index.isValid():
+            self.imageActivated.emit(self.model.item_at(index.row()).location)
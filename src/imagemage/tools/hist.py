@@ -1,18 +1,22 @@
 """Definition of the HistogramWidget class.
 
 This class is used to display and manipulate the histogram of an image.
+
+The histogram is drawn natively with a HistogramPlot. Matplotlib is only
+imported (on first use) to export the histogram to a file.
 """
 import numpy as np
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import (
-    FigureCanvasQTAgg as FigureCanvas,
-)
 
 from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QLineEdit, QFrame
-from PyQt5 import QtWidgets, QtCore
+from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import pyqtSignal, QRect, Qt
 
 from imagemage import styles_dir
+from imagemage.render.histogram import HistogramIndex, index_for
+from imagemage.render.limits import AUTO_LIMITS, compute_limits
+from imagemage.render.scheduler import get_scheduler
+from imagemage.render.stretch import STRETCHES, get_stretch
+from imagemage.widgets.histogram_plot import HistogramPlot
 from imagemage.widgets.range_slider import RangeSlider
 
 
@@ -47,8 +51,14 @@ class LabeledLineEdit(QWidget):
         self.label.setText(text)
 
 
+# The number of discrete positions on the range slider
+SLIDER_RESOLUTION = 1000
+
+
 class HistogramWidget(QFrame):
-    histChanged = pyqtSignal(float, float)
+    histChanged = pyqtSignal(float, float, object)
+    bandSelected = pyqtSignal(int)
+    bandColorChanged = pyqtSignal(int, object)
 
     def __init__(self, parent=None, preview=False):
         super().__init__(parent)
@@ -57,26 +67,36 @@ class HistogramWidget(QFrame):
         self.setMinimumSize(350, 200)
 
         # Set up histogram
-        self.fig = Figure()
-        self.canvas = FigureCanvas(self.fig)
-        self.ax = self.fig.add_subplot(111)
+        self.plot = HistogramPlot()
+        self.plot.setContextMenuPolicy(Qt.ActionsContextMenu)
+        export_action = QtWidgets.QAction("Export histogram...", self.plot)
+        export_action.triggered.connect(self.export_hist_dialog)
+        self.plot.addAction(export_action)
 
-        # Set the facecolor to 'none' for a transparent background
-        self.fig.patch.set_facecolor("none")
-        self.fig.patch.set_alpha(0)
+        # The currently displayed histogram
+        self.bins = None
+        self.counts = None
 
         self.setFocusPolicy(Qt.StrongFocus)
         self.setEnabled(True)
 
+        # The stretch applied to the image
+        self.stretch = get_stretch("linear")
+
+        # The composite whose bands each have their own histogram (None
+        # for a single image)
+        self.composite = None
+
         if not preview:
             # Store data specific to this images tab
             self.nbins = 50
 
             self.img_data = None
 
-            self.img_min = self.img_data.min()
-            self.img_max = self.img_data.max()
-            self.img_range = self.img_data.max() - self.img_min
+            self.img_min, self.img_max = compute_limits(
+                None, "minmax", sample=self.img_data
+            )
+            self.img_range = self.img_max - self.img_min
 
         else:
             # Here we set up the preview
@@ -88,8 +108,15 @@ class HistogramWidget(QFrame):
 
             self.img_data = np.random.rand(100) * self.img_max
 
+        # The fine histogram all displayed histograms are derived from
+        self.hist_index = HistogramIndex(self.img_data)
+
+        # The current display limits
+        self.vmin = self.img_min
+        self.vmax = self.img_max
+
         self.setupUi()
-        self.horizontalLayout.addWidget(self.canvas)
+        self.horizontalLayout.addWidget(self.plot)
         self.update_hist()
 
     def _scale_relative_to_size(
@@ -137,39 +164,85 @@ class HistogramWidget(QFrame):
         # Slider for vmin
         self.slider = RangeSlider(self)
         self.slider.setGeometry(
-            self._scale_relative_to_size(0.05, 0.58, 0.9, 0.2)
+            self._scale_relative_to_size(0.05, 0.56, 0.9, 0.14)
         )
         self.slider.setObjectName("slider")
-        self.slider.setMinimum(self.img_min)
-        self.slider.setLow(self.img_min)
-        self.slider.setMaximum(self.img_max)
-        self.slider.setHigh(self.img_max)
+        self.slider.setMinimum(0)
+        self.slider.setMaximum(SLIDER_RESOLUTION)
+        self._update_slider()
         self.slider.sliderMoved.connect(self.update_lims)
 
         # Radio buttons for log scale
         self.log_x = QtWidgets.QCheckBox(self)
         self.log_x.setGeometry(
-            self._scale_relative_to_size(0.05, 0.8, 0.25, 0.18)
+            self._scale_relative_to_size(0.05, 0.7, 0.15, 0.13)
         )
         self.log_x.setObjectName("log_x")
         self.log_x.stateChanged.connect(self.update_hist)
 
         self.log_y = QtWidgets.QCheckBox(self)
         self.log_y.setGeometry(
-            self._scale_relative_to_size(0.30, 0.8, 0.25, 0.18)
+            self._scale_relative_to_size(0.2, 0.7, 0.15, 0.13)
         )
         self.log_y.setObjectName("log_y")
         self.log_y.stateChanged.connect(self.update_hist)
 
+        # Drop down for the composite band shown (and edited)
+        self.band_select = QtWidgets.QComboBox(self)
+        self.band_select.setGeometry(
+            self._scale_relative_to_size(0.36, 0.7, 0.2, 0.13)
+        )
+        self.band_select.setObjectName("band_select")
+        self.band_select.setEnabled(False)
+        self.band_select.activated.connect(self.select_band)
+
+        # Button choosing the colour of the band
+        self.band_color_button = QtWidgets.QPushButton(self)
+        self.band_color_button.setGeometry(
+            self._scale_relative_to_size(0.57, 0.7, 0.08, 0.13)
+        )
+        self.band_color_button.setObjectName("band_color_button")
+        self.band_color_button.setEnabled(False)
+        self.band_color_button.clicked.connect(self.choose_band_color)
+
         # Entry for the number of bins
         self.nbin_entry = LabeledLineEdit(label_text="bins:", parent=self)
         self.nbin_entry.setGeometry(
-            self._scale_relative_to_size(0.6, 0.8, 0.35, 0.18)
+            self._scale_relative_to_size(0.67, 0.7, 0.28, 0.13)
         )
         self.nbin_entry.setText(str(self.nbins))
         self.nbin_entry.setObjectName("nbin_entry")
         self.nbin_entry.textChanged.connect(self.update_nbins)
 
+        # Drop down for the image stretch
+        self.stretch_select = QtWidgets.QComboBox(self)
+        self.stretch_select.setGeometry(
+            self._scale_relative_to_size(0.05, 0.84, 0.3, 0.13)
+        )
+        self.stretch_select.setObjectName("stretch_select")
+        self.stretch_select.addItems(list(STRETCHES))
+        self.stretch_select.currentTextChanged.connect(self.update_stretch)
+
+        # Entry for the stretch parameter
+        self.stretch_param_entry = LabeledLineEdit(
+            label_text="param:", parent=self
+        )
+        self.stretch_param_entry.setGeometry(
+            self._scale_relative_to_size(0.37, 0.84, 0.26, 0.13)
+        )
+        self.stretch_param_entry.setObjectName("stretch_param_entry")
+        self.stretch_param_entry.setEnabled(False)
+        self.stretch_param_entry.textChanged.connect(self.update_stretch)
+
+        # Drop down for automatically setting the limits
+        self.auto_select = QtWidgets.QComboBox(self)
+        self.auto_select.setGeometry(
+            self._scale_relative_to_size(0.65, 0.84, 0.3, 0.13)
+        )
+        self.auto_select.setObjectName("auto_select")
+        self.auto_select.addItems(list(AUTO_LIMITS))
+        self.auto_select.activated.connect(self.auto_lims)
+
         # Connect signals and slots
         self.retranslateUi()
         QtCore.QMetaObject.connectSlotsByName(self)
@@ -181,63 +254,228 @@ class HistogramWidget(QFrame):
         self.setStyleSheet(style_sheet)
 
     def set_img_data(self, img_arr):
-        # Store the image array
-        self.img_data = img_arr
-        self.img_min = self.img_data.min()
-        self.img_max = self.img_data.max()
-        self.img_range = self.img_data.max() - self.img_min
+        # A single image replaces any composite
+        self.composite = None
+        self.band_select.clear()
+        self.band_select.setEnabled(False)
+        self.band_color_button.setEnabled(False)
+        self.band_color_button.setStyleSheet("")
+
+        # Store the image values (usually a sample of the image)
+        self.img_data = np.ravel(img_arr)
+        self.img_min, self.img_max = compute_limits(
+            None, "minmax", sample=self.img_data
+        )
+        self.img_range = self.img_max - self.img_min
+
+        # Build the fine histogram once for this image
+        self.hist_index = index_for(img_arr)
+
+        # Data dependent stretches need rebuilding for the new image
+        if self.stretch.name == "histeq":
+            self.stretch = get_stretch("histeq", data=self.hist_index)
+
+        # Start from the automatic limits (this also updates the histogram)
+        self.auto_lims()
+
+    def set_composite(self, composite):
+        """
+        Show the histograms of a composite's bands.
+
+        Args:
+            composite (Composite): The composite.
+        """
+        self.composite = composite
+
+        self.band_select.blockSignals(True)
+        self.band_select.clear()
+        self.band_select.addItems([band.name for band in composite.bands])
+        self.band_select.blockSignals(False)
+        self.band_select.setEnabled(True)
+        self.band_color_button.setEnabled(True)
+
+        self.select_band(composite.active)
+
+    def select_band(self, index):
+        """
+        Show (and edit) the histogram of one of the composite's bands.
+
+        Args:
+            index (int): The index of the band.
+        """
+        self.bandSelected.emit(index)
+        self.band_select.setCurrentIndex(index)
+        band = self.composite.bands[index]
+
+        # Each band keeps its own fine histogram
+        self.img_data = np.ravel(band.sample)
+        self.img_min, self.img_max = compute_limits(
+            None, "minmax", sample=self.img_data
+        )
+        self.img_range = self.img_max - self.img_min
+        if band.hist_index is None:
+            band.hist_index = index_for(band.sample)
+        self.hist_index = band.hist_index
+
+        # Show the band's display settings
+        self.vmin = band.vmin
+        self.vmax = band.vmax
+        self.stretch = band.stretch
+        self._show_stretch(band.stretch)
+        self._show_band_color(band.color)
+
+        self._update_slider()
+        self.update_hist()
 
-        tolerence = int(self.img_range / self.nbins)
+    def set_display(self, vmin, vmax, stretch):
+        """
+        Show display settings chosen elsewhere (e.g. by a recipe).
+
+        Args:
+            vmin (float): The lower limit.
+            vmax (float): The upper limit.
+            stretch (Stretch): The stretch.
+        """
+        self.vmin = vmin
+        self.vmax = vmax
+        self.stretch = stretch
+        self._show_stretch(stretch)
+        self._update_slider()
+        self.update_hist()
 
-        # Update the slider data
-        self.slider.setMinimum(self.img_min - tolerence)
-        self.slider.setLow(self.img_min)
-        self.slider.setMaximum(self.img_max + tolerence)
-        self.slider.setHigh(self.img_max)
+    def _show_stretch(self, stretch):
+        """Show a stretch in the stretch controls without applying it."""
+        self.stretch_select.blockSignals(True)
+        self.stretch_param_entry.blockSignals(True)
+        self.stretch_select.setCurrentText(stretch.name)
+        has_param = stretch.param_name is not None
+        self.stretch_param_entry.setEnabled(has_param)
+        self.stretch_param_entry.setLabelText(
+            f"{stretch.param_name}:" if has_param else "param:"
+        )
+        self.stretch_param_entry.setText(
+            str(stretch.param) if has_param else ""
+        )
+        self.stretch_select.blockSignals(False)
+        self.stretch_param_entry.blockSignals(False)
+
+    def _show_band_color(self, color):
+        """Show a band's colour on the colour button."""
+        r, g, b = (int(round(min(max(c, 0), 1) * 255)) for c in color)
+        self.band_color_button.setStyleSheet(
+            f"background-color: rgb({r}, {g}, {b});"
+        )
 
-        # And update the histogram to show it
+    def choose_band_color(self):
+        """Ask the user for the colour of the current band."""
+        index = self.band_select.currentIndex()
+        band = self.composite.bands[index]
+        initial = QtGui.QColor.fromRgbF(*band.color)
+        color = QtWidgets.QColorDialog.getColor(
+            initial, self, f"Colour of {band.name}"
+        )
+        if not color.isValid():
+            return
+
+        rgb = color.getRgbF()[:3]
+        self._show_band_color(rgb)
+        self.bandColorChanged.emit(index, rgb)
+
+    def _slider_range(self):
+        """The (min, max) values at the ends of the slider."""
+        tolerence = self.img_range / self.nbins
+        return self.img_min - tolerence, self.img_max + tolerence
+
+    def _to_slider(self, value):
+        """Convert an image value to a slider position."""
+        low, high = self._slider_range()
+        if high <= low:
+            return 0
+        pos = (value - low) / (high - low) * SLIDER_RESOLUTION
+        return int(round(min(max(pos, 0), SLIDER_RESOLUTION)))
+
+    def _from_slider(self, pos):
+        """Convert a slider position to an image value."""
+        low, high = self._slider_range()
+        return low + pos / SLIDER_RESOLUTION * (high - low)
+
+    def _update_slider(self):
+        """Move the slider handles to the current limits."""
+        self.slider.setLow(self._to_slider(self.vmin))
+        self.slider.setHigh(self._to_slider(self.vmax))
+
+    def auto_lims(self, *args):
+        """Set the limits with the chosen automatic limits mode."""
+        self.vmin, self.vmax = compute_limits(
+            None, self.auto_select.currentText(), sample=self.img_data
+        )
+        self._update_slider()
         self.update_hist()
 
     def update_hist(self):
-        # Clear the axes
-        self.ax.clear()
+        get_scheduler().cancel(self.update_hist)
 
         if self.log_x.isChecked():
-            self.ax.set_xscale("log")
             bins = np.logspace(
-                np.log10(self.slider.low()),
-                np.log10(self.slider.high() + self.img_range / self.nbins),
+                np.log10(self.vmin),
+                np.log10(self.vmax + self.img_range / self.nbins),
                 self.nbins + 1,
             )
         else:
-            self.ax.set_xscale("linear")
             bins = np.linspace(
-                self.slider.low(),
-                self.slider.high() + self.img_range / self.nbins,
+                self.vmin,
+                self.vmax + self.img_range / self.nbins,
                 self.nbins + 1,
             )
 
-        if self.log_y.isChecked():
-            self.ax.set_yscale("log")
-        else:
-            self.ax.set_yscale("linear")
+        # Derive the histogram from the fine histogram in a time
+        # independent of the number of pixels
+        self.bins = bins
+        self.counts = self.hist_index.rebin(bins)
 
         # Plot the histogram
-        self.ax.hist(self.img_data.flatten(), bins=bins, alpha=0.7)
-
-        # Set the facecolor of the axis to 'none' for a transparent background
-        self.ax.patch.set_facecolor("none")
-        self.ax.patch.set_alpha(0)
-
-        self.ax.axis("off")
-
-        self.ax.set_xlim(self.img_min, self.img_max)
-
-        # Draw the canvas
-        self.canvas.draw()
+        self.plot.set_data(
+            self.bins,
+            self.counts,
+            log_x=self.log_x.isChecked(),
+            log_y=self.log_y.isChecked(),
+            xlim=(self.img_min, self.img_max),
+        )
 
         # Signal that something happened
-        self.histChanged.emit(self.slider.low(), self.slider.high())
+        self.histChanged.emit(self.vmin, self.vmax, self.stretch)
+
+    def export_hist(self, filepath):
+        """
+        Export the current histogram to a file using matplotlib.
+
+        Args:
+            filepath (str): The path to the output file, the format is
+                taken from the extension (any format matplotlib supports).
+        """
+        # Only pay for importing matplotlib when exporting
+        from matplotlib.figure import Figure
+
+        fig = Figure()
+        ax = fig.add_subplot(111)
+        ax.stairs(self.counts, self.bins, fill=True, alpha=0.7)
+        ax.set_xscale("log" if self.log_x.isChecked() else "linear")
+        ax.set_yscale("log" if self.log_y.isChecked() else "linear")
+        ax.set_xlim(self.img_min, self.img_max)
+        ax.set_xlabel("Pixel value")
+        ax.set_ylabel("Count")
+        fig.savefig(filepath, bbox_inches="tight")
+
+    def export_hist_dialog(self):
+        """Ask the user where to export the histogram to."""
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self,
+            "Export Histogram",
+            "histogram.png",
+            "Images (*.png *.pdf *.svg);;All Files (*)",
+        )
+        if filepath:
+            self.export_hist(filepath)
 
     def update_nbins(self, text):
         try:
@@ -246,10 +484,49 @@ class HistogramWidget(QFrame):
         except ValueError:
             pass  # Handle the case where the input is not a valid integer
 
+    def update_stretch(self, *args):
+        """Create the stretch chosen in the stretch drop down."""
+        name = self.stretch_select.currentText()
+        stretch_class = STRETCHES[name]
+
+        # Only stretches with a parameter need the entry
+        has_param = stretch_class.param_name is not None
+        self.stretch_param_entry.setEnabled(has_param)
+
+        # Switching stretch resets the parameter to its default
+        if self.sender() is self.stretch_select:
+            self.stretch_param_entry.blockSignals(True)
+            self.stretch_param_entry.setLabelText(
+                f"{stretch_class.param_name}:" if has_param else "param:"
+            )
+            self.stretch_param_entry.setText(
+                str(stretch_class.default_param) if has_param else ""
+            )
+            self.stretch_param_entry.blockSignals(False)
+
+        param = None
+        if has_param:
+            try:
+                param = float(self.stretch_param_entry.text())
+            except ValueError:
+                return  # Wait for a valid number
+
+            # e.g. a log or asinh parameter of 0 would divide by zero
+            if not stretch_class.is_valid_param(param):
+                return
+
+        self.stretch = get_stretch(name, param, data=self.hist_index)
+        self.update_hist()
+
     def update_lims(self, low, high):
         self.slider.setLow(low)
         self.slider.setHigh(high)
-        self.update_hist()
+        self.vmin = self._from_slider(low)
+        self.vmax = self._from_slider(high)
+
+        # Slider events arrive much faster than frames, only redraw (and
+        # re-render the image) once per frame
+        get_scheduler().schedule(self.update_hist)
 
     def retranslateUi(self):
         _translate = QtCore.QCoreApplication.translate
@@ -8,9 +8,13 @@ from PyQt5.QtWidgets import (
     QGraphicsRectItem,
 )
 from PyQt5 import QtGui
-from PyQt5.QtGui import QPixmap, QImage
+from PyQt5.QtGui import QPixmap
 from PyQt5.QtCore import Qt
 
+from imagemage.readers.sampling import decimate
+from imagemage.render.qimage import array_to_qimage
+from imagemage.render.scheduler import get_scheduler
+
 
 class ZoomWidget(QWidget):
     def __init__(self, main_view, parent=None):
@@ -61,27 +65,22 @@ class ZoomWidget(QWidget):
         main_view.zoomChanged.connect(self.update_slider)
 
     def set_image(self):
-        # Set up the overview image (low resolution)
-        pil_img = self.main_view.pil_img
-        overview_img = pil_img.copy()
-        overview_img.thumbnail((100, 100))  # Adjust the size as needed
-        overview_pixmap = QPixmap.fromImage(self._pil_to_qimage(overview_img))
-        self.overview_item.setPixmap(overview_pixmap)
-
-    def _pil_to_qimage(self, pil_image):
-        image_byte_array = pil_image.tobytes()
-        q_image = QImage(
-            image_byte_array,
-            pil_image.width,
-            pil_image.height,
-            QImage.Format_Grayscale8,
+        # Set up the overview image (low resolution) from the main view's
+        # in memory overview, displayed with the current limits
+        if self.main_view.display_arr is None:
+            return
+        overview_arr = decimate(self.main_view.display_arr, 100)
+        overview_pixmap = QPixmap.fromImage(
+            array_to_qimage(self.main_view.normalize_image(overview_arr))
         )
-        return q_image
+        self.overview_item.setPixmap(overview_pixmap)
 
     def update_main_view_zoom(self):
         # Update the zoom level in the main view based on the slider value
         zoom_factor = self.zoom_slider.value() / 100.0
         self.main_view.scale(zoom_factor, zoom_factor)
+        self.main_view.begin_interaction()
+        get_scheduler().schedule(self.main_view.update_tiles)
 
     def update_overlay_box(self):
         # Update the position and size of the overlay box based on the visible area in the main view
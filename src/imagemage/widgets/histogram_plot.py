@@ -0,0 +1,114 @@
+"""Definition of the HistogramPlot class.
+
+A lightweight native plot of a histogram drawn with QPainter. The histogram
+is converted to a filled step path once when the data changes (in unit
+coordinates), a repaint then only has to scale and fill that path so it takes
+a fraction of a millisecond however the widget is resized.
+"""
+import numpy as np
+
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QColor, QPainter, QPainterPath, QTransform
+from PyQt5.QtCore import Qt, QPointF
+
+
+class HistogramPlot(QWidget):
+    """
+    A widget drawing a histogram as a filled step path.
+
+    Attributes:
+        bins (np.ndarray): The bin edges of the histogram.
+        counts (np.ndarray): The counts in each bin.
+        log_x (bool): Whether the x axis is logarithmic.
+        log_y (bool): Whether the y axis is logarithmic.
+        xlim (tuple): The (min, max) of the x axis.
+        color (QColor): The fill colour.
+    """
+
+    def __init__(self, parent=None):
+        """
+        Initializes the HistogramPlot widget.
+
+        Args:
+            parent (QWidget): The parent widget.
+        """
+        super().__init__(parent)
+
+        self.bins = None
+        self.counts = None
+        self.log_x = False
+        self.log_y = False
+        self.xlim = None
+
+        # The same blue (and alpha) matplotlib would use
+        self.color = QColor(31, 119, 180, int(0.7 * 255))
+
+        # The step path in unit coordinates
+        self._path = QPainterPath()
+
+        self.setAttribute(Qt.WA_TranslucentBackground)
+
+    def set_data(self, bins, counts, log_x=False, log_y=False, xlim=None):
+        """
+        Set the histogram to draw.
+
+        Args:
+            bins (np.ndarray): The bin edges.
+            counts (np.ndarray): The counts in each bin.
+            log_x (bool): Whether the x axis is logarithmic.
+            log_y (bool): Whether the y axis is logarithmic.
+            xlim (tuple): The (min, max) of the x axis, defaults to the
+                range of the bins.
+        """
+        self.bins = np.asarray(bins, dtype=float)
+        self.counts = np.asarray(counts, dtype=float)
+        self.log_x = log_x
+        self.log_y = log_y
+        self.xlim = (
+            (self.bins[0], self.bins[-1]) if xlim is None else tuple(xlim)
+        )
+
+        self._path = self._build_path()
+        self.update()
+
+    def _build_path(self):
+        """Convert the histogram to a step path in unit coordinates."""
+        path = QPainterPath()
+        if self.bins is None or self.counts.size == 0:
+            return path
+
+        # Map the x values onto [0, 1]
+        xs = self.bins
+        xmin, xmax = self.xlim
+        if self.log_x:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                xs = np.log10(xs)
+                xmin, xmax = np.log10(xmin), np.log10(xmax)
+        if not np.isfinite(xmin) or not np.isfinite(xmax) or xmax <= xmin:
+            xmin, xmax = np.nanmin(xs), np.nanmax(xs)
+        xs = np.nan_to_num((xs - xmin) / max(xmax - xmin, 1e-300))
+
+        # Map the y values onto [0, 1]
+        ys = np.log10(self.counts + 1) if self.log_y else self.counts
+        ymax = ys.max()
+        ys = ys / ymax if ymax > 0 else ys
+
+        # Trace the outline of the bars
+        path.moveTo(QPointF(xs[0], 0))
+        for i, y in enumerate(ys):
+            path.lineTo(QPointF(xs[i], y))
+            path.lineTo(QPointF(xs[i + 1], y))
+        path.lineTo(QPointF(xs[-1], 0))
+        path.closeSubpath()
+
+        return path
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing, False)
+
+        # Flip the y axis and scale the unit path to the widget
+        painter.setTransform(
+            QTransform(self.width(), 0, 0, -self.height(), 0, self.height())
+        )
+        painter.fillPath(self._path, self.color)
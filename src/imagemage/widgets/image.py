@@ -1,14 +1,62 @@
 """
 """
+import itertools
+import os
+from functools import partial
+
 import numpy as np
-from PIL import Image
 
 from PyQt5 import QtWidgets
 from PyQt5.QtWidgets import QGraphicsView, QGraphicsPixmapItem, QGraphicsScene
-from PyQt5.QtGui import QPixmap, QImage, QWheelEvent
+from PyQt5.QtGui import QPixmap, QWheelEvent
 from PyQt5 import QtGui
 from PyQt5 import QtCore
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+
+from imagemage.readers.cube import DataCube
+from imagemage.readers.diskcache import get_disk_cache
+from imagemage.readers.filmstrip import Filmstrip, Prefetcher
+from imagemage.readers.formats import (
+    INPUT_FORMATS,
+    READERS,
+    open_source,
+    source_location,
+)
+from imagemage.readers.loader import (
+    OVERVIEW_SIZE,
+    PREVIEW_SIZE,
+    ImageLoader,
+    LoadedImage,
+    get_loader_pool,
+)
+from imagemage.readers.sampling import sample_pixels, samples_for_accuracy
+from imagemage.render.cache import RenderCache
+from imagemage.render.colormap import get_color_table
+from imagemage.render.composite import Composite, CompositeBand
+from imagemage.render.limits import DEFAULT_RANK_ERROR, compute_limits
+from imagemage.render.normalize import Normalizer
+from imagemage.render.qimage import array_to_qimage
+from imagemage.render.recipe import BandRecipe, Recipe, resolve_display
+from imagemage.render.registration import Transform, register
+from imagemage.render.scheduler import get_scheduler
+from imagemage.render.stretch import get_stretch
+from imagemage.session import ImageState, Session
+from imagemage.writers.export import (
+    DEFAULT_STRIP_BYTES,
+    ExportCancelled,
+    export_composite,
+    export_image,
+)
+
+# While the user is interacting (dragging the limits or zooming) the image is
+# rendered this many pyramid levels coarser than the screen resolution
+PREVIEW_LEVEL_OFFSET = 2
+
+# How long after the last interaction the full resolution render happens (ms)
+IDLE_TIMEOUT = 200
+
+# Source of unique ids for the images opened in a view
+_image_ids = itertools.count()
 
 
 class ImageView(QGraphicsView):
@@ -22,6 +70,12 @@ class ImageView(QGraphicsView):
     transformChanged = pyqtSignal()
     zoomChanged = pyqtSignal(QWheelEvent)
     imgOpened = pyqtSignal(np.ndarray)
+    compositeChanged = pyqtSignal(object)
+    displayChanged = pyqtSignal(float, float, object)
+    cmapChanged = pyqtSignal(str)
+    cubeOpened = pyqtSignal(int)
+    cubeViewShown = pyqtSignal(str, int)
+    sessionChanged = pyqtSignal(object)
 
     def __init__(self, parent):
         """
@@ -40,6 +94,19 @@ class ImageView(QGraphicsView):
         self.pil_img = None
         self.img_arr = None
 
+        # The multi-resolution pyramid the image is rendered from and an in
+        # memory overview of the image (a coarse pyramid level)
+        self.pyramid = None
+        self.display_arr = None
+
+        # A sample of the pixel values used for image statistics
+        self.img_sample = None
+
+        # The reader holding the image (img_arr is the reader itself) and
+        # the loader preparing the next image
+        self.img_reader = None
+        self._loader = None
+
         # Image dimensions
         self._width = None
         self._height = None
@@ -48,9 +115,75 @@ class ImageView(QGraphicsView):
         self.vmin = None
         self.vmax = None
 
+        # How the initial limits of an image are chosen (see render.limits)
+        self.auto_limits = "minmax"
+
+        # The stretch and the engine mapping image values to display values
+        self.stretch = get_stretch("linear")
+        self.normalizer = Normalizer()
+
+        # The colormap single channel images are displayed with and its
+        # colour table (None for plain grayscale)
+        self.cmap = "gray"
+        self.color_table = None
+
         self.scene = QGraphicsScene(self)
         self.setScene(self.scene)
-        self.image_item = None
+
+        # The id of the current image (part of every render cache key)
+        self.image_id = None
+
+        # The RGB composite being displayed (None for a single image)
+        self.composite = None
+
+        # The data cube being displayed (None for a 2D image), the view of
+        # it being shown ("plane" or a collapse), the plane, the view and
+        # plane asked for (shown once read) and the direction of travel
+        self.cube = None
+        self.cube_view = "plane"
+        self.plane = 0
+        self._cube_request = None
+        self._scrub_step = 1
+
+        # The sample of the whole cube (planes share its limits) and the
+        # render cache id of each plane/collapse seen
+        self._cube_sample = None
+        self._view_ids = {}
+
+        # The normalized tiles for recently seen display states and the
+        # tiles currently in the scene (keyed by level, row and column)
+        self.render_cache = RenderCache()
+        self._tile_items = {}
+
+        # Every image open in the view (one is shown at a time, the rest
+        # share its memory budget) and the evicted image being reopened
+        self.session = Session()
+        self._hydrating = None
+
+        # The directory being stepped through (see step_file), the files
+        # around the current file being prepared and the file waiting to
+        # be shown once it's ready
+        self.filmstrip = None
+        self.prefetcher = Prefetcher(self.auto_limits, self)
+        self.prefetcher.prefetched.connect(self._show_prefetched)
+        self.prefetcher.failed.connect(self._prefetch_failed)
+        self._filmstrip_wanted = None
+
+        # A recipe being loaded (applied once its images are open) and the
+        # functions opening its composite bands still to load
+        self._recipe = None
+        self._band_queue = []
+
+        # A low resolution preview shown while an image loads
+        self._preview_item = None
+
+        # Whether we are showing a low resolution preview during an
+        # interaction and the timer ending the interaction when idle
+        self._interacting = False
+        self._idle_timer = QTimer(self)
+        self._idle_timer.setSingleShot(True)
+        self._idle_timer.setInterval(IDLE_TIMEOUT)
+        self._idle_timer.timeout.connect(self.end_interaction)
 
         self.setRenderHint(QtGui.QPainter.Antialiasing, True)
         self.setRenderHint(QtGui.QPainter.SmoothPixmapTransform, True)
@@ -58,6 +191,12 @@ class ImageView(QGraphicsView):
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
 
+        # Whether the image is fitted to the widget (refitted on resize)
+        # rather than zoomed and panned by the user (kept on resize, about
+        # the centre of the view)
+        self._fit_to_window = True
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
+
     def open_image(self):
         options = QtWidgets.QFileDialog.Options()
         filepath, _ = QtWidgets.QFileDialog.getOpenFileName(
@@ -65,31 +204,452 @@ class ImageView(QGraphicsView):
             "Open Image",
             "",
             "Image Files (*.png *.jpg *.jpeg *.bmp *.tiff);;HDF5 Files "
-            "(*.hdf5 *.h5);;Fits Files (*.fits);;All Files (*)",
+            "(*.hdf5 *.h5);;Fits Files (*.fits *.fit *.fts);;All Files (*)",
+            options=options,
+        )
+
+        if filepath:
+            self.open_file(filepath)
+
+    def open_band(self):
+        options = QtWidgets.QFileDialog.Options()
+        filepath, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self,
+            "Add Composite Band",
+            "",
+            "Image Files (*.png *.jpg *.jpeg *.bmp *.tiff);;HDF5 Files "
+            "(*.hdf5 *.h5);;Fits Files (*.fits *.fit *.fts);;All Files (*)",
             options=options,
         )
 
-        # Handle the different possible formats
         if filepath:
-            match filepath.split(".")[-1]:
-                case "png":
-                    self._open_pil(filepath)
-                case "jpg":
-                    self._open_pil(filepath)
-                case "jpeg":
-                    self._open_pil(filepath)
-                case "bmp":
-                    self._open_pil(filepath)
-                case "tiff":
-                    self._open_pil(filepath)
-                case "hdf5":
-                    pass
-                case "h5":
-                    pass
-                case "fits":
-                    pass
-                case _:
-                    pass
+            self.open_band_file(filepath)
+
+    def export_dialog(self):
+        """Ask where to export the displayed image to and export it."""
+        if self.pyramid is None:
+            return
+
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self,
+            "Export Image",
+            "",
+            "PNG (*.png);;TIFF (*.tif *.tiff);;HDF5 (*.h5 *.hdf5);;"
+            "FITS (*.fits *.fit *.fts)",
+        )
+        if not filepath:
+            return
+
+        progress = QtWidgets.QProgressDialog(
+            "Exporting image...", "Cancel", 0, 100, self
+        )
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(500)
+
+        def report(frac):
+            progress.setValue(int(100 * frac))
+            QtWidgets.QApplication.processEvents()
+            if progress.wasCanceled():
+                raise ExportCancelled()
+
+        try:
+            self.export_to(filepath, progress=report)
+        except ExportCancelled:
+            pass
+        except (OSError, ValueError) as err:
+            QtWidgets.QMessageBox.critical(self, "Export Image", str(err))
+        finally:
+            progress.deleteLater()
+
+    def export_to(self, filepath, strip_bytes=DEFAULT_STRIP_BYTES, **kwargs):
+        """
+        Export the displayed image (or composite) at full resolution.
+
+        The image is streamed to the file a strip at a time with the
+        current limits, stretch and colormap.
+
+        Args:
+            filepath (str): The path to the output file (the format is taken
+                from the extension, see writers.export).
+            strip_bytes (int): The memory available for one strip.
+            **kwargs: Passed to export_image/export_composite (e.g.
+                bigtiff, progress).
+        """
+        if self.composite is not None:
+            export_composite(
+                filepath, self.composite, strip_bytes=strip_bytes, **kwargs
+            )
+        else:
+            export_image(
+                filepath,
+                self.img_arr,
+                self.vmin,
+                self.vmax,
+                self.stretch,
+                color_table=self.color_table,
+                strip_bytes=strip_bytes,
+                **kwargs,
+            )
+
+    def save_recipe_dialog(self):
+        """Ask where to save the recipe of the displayed image."""
+        if self.pyramid is None:
+            return
+
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self,
+            "Save Recipe",
+            "",
+            "JSON Recipe (*.json);;TOML Recipe (*.toml)",
+        )
+        if not filepath:
+            return
+
+        try:
+            self.current_recipe().save(filepath)
+        except OSError as err:
+            QtWidgets.QMessageBox.critical(self, "Save Recipe", str(err))
+
+    def load_recipe_dialog(self):
+        """Ask for a recipe and display it."""
+        filepath, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self,
+            "Load Recipe",
+            "",
+            "Recipes (*.json *.toml);;All Files (*)",
+        )
+        if not filepath:
+            return
+
+        try:
+            self._hydrating = None
+            self._filmstrip_wanted = None
+            self.load_recipe(Recipe.load(filepath))
+        except (OSError, ValueError, KeyError, ImportError) as err:
+            QtWidgets.QMessageBox.critical(self, "Load Recipe", str(err))
+
+    def clear_disk_cache(self):
+        """Empty the disk cache of images' pyramids and statistics."""
+        cache = get_disk_cache()
+        if cache is None:
+            return
+        freed = cache.clear()
+        QtWidgets.QMessageBox.information(
+            self,
+            "Clear Disk Cache",
+            f"Freed {freed / 2**20:.1f} MiB from {cache.directory}",
+        )
+
+    def current_recipe(self):
+        """
+        Capture the displayed image and its display settings as a recipe.
+
+        Returns:
+            Recipe: The recipe (with fixed limits).
+        """
+        if self.composite is not None:
+            bands = [
+                BandRecipe(
+                    limits=(band.vmin, band.vmax),
+                    stretch=band.stretch.name,
+                    stretch_param=band.stretch.param,
+                    color=band.color,
+                    transform=(
+                        band.transform.to_dict()
+                        if band.transform is not None
+                        else None
+                    ),
+                    **source_location(band.source),
+                )
+                for band in self.composite.bands
+            ]
+            return Recipe(cmap=self.cmap, bands=bands)
+
+        return Recipe(
+            limits=(self.vmin, self.vmax),
+            stretch=self.stretch.name,
+            stretch_param=self.stretch.param,
+            cmap=self.cmap,
+            **source_location(self.img_reader),
+        )
+
+    def load_recipe(self, recipe):
+        """
+        Open a recipe's image(s) and display them as the recipe says.
+
+        The images load in the background (composite bands one after the
+        other) and the recipe's display settings are applied once they are
+        all open. A recipe without a source is applied to the current
+        image.
+
+        Args:
+            recipe (Recipe): The recipe.
+        """
+        if recipe.is_composite:
+            sources = [band.source or recipe.source for band in recipe.bands]
+            if None in sources:
+                raise ValueError("The recipe doesn't name a source file")
+
+            # The bands make up a new composite
+            self._clear_image()
+            self._band_queue = [
+                partial(open_source, source, band.dataset, band.hdu)
+                for source, band in zip(sources, recipe.bands)
+            ]
+            self._recipe = recipe
+            self.load_image(self._band_queue.pop(0), as_band=True)
+
+        elif recipe.source is not None:
+            self._band_queue = []
+            self._recipe = recipe
+            self.load_image(
+                partial(open_source, recipe.source, recipe.dataset, recipe.hdu)
+            )
+
+        else:
+            self.apply_recipe(recipe)
+
+    def apply_recipe(self, recipe):
+        """
+        Display the current image with a recipe's display settings.
+
+        Args:
+            recipe (Recipe): The recipe (its sources are ignored).
+        """
+        if self.pyramid is None:
+            return
+
+        self.set_cmap(recipe.cmap)
+
+        if self.composite is not None:
+            for index, (band, band_recipe) in enumerate(
+                zip(self.composite.bands, recipe.bands)
+            ):
+                vmin, vmax, stretch = resolve_display(
+                    band_recipe, band.source, sample=band.sample
+                )
+                self.composite.set_band_display(index, vmin, vmax, stretch)
+                self.composite.set_band_color(index, band_recipe.color)
+                if index > 0 and band_recipe.transform is not None:
+                    self.composite.set_band_transform(
+                        index, Transform.from_dict(band_recipe.transform)
+                    )
+
+            # Show the active band's new settings in the tools
+            self.set_active_band(self.composite.active)
+            self.update_img()
+            self.compositeChanged.emit(self.composite)
+            return
+
+        vmin, vmax, stretch = resolve_display(
+            recipe, self.img_arr, sample=self.img_sample
+        )
+        self.update_vlims(vmin, vmax, stretch)
+        self.displayChanged.emit(vmin, vmax, stretch)
+
+    def open_file(self, filepath):
+        """
+        Opens an image file.
+
+        Any questions about what to open (e.g. which dataset) are asked here,
+        the file is then opened and prepared for display in the background.
+
+        Args:
+            filepath (str): The path to the image file.
+        """
+        open_func, preview_func = self._get_open_funcs(filepath)
+        if open_func is None:
+            return
+
+        self._recipe = None
+        self._band_queue = []
+        self._hydrating = None
+        self._filmstrip_wanted = None
+        self.load_image(open_func, preview_func)
+
+    def open_location(self, location):
+        """
+        Opens an image of a file (e.g. one picked from the gallery).
+
+        Args:
+            location (dict): The "source" path and the "dataset" or "hdu"
+                (see readers.formats.source_location). The dataset is asked
+                for (as by open_file) if it isn't given.
+        """
+        filepath = location["source"]
+        ext = os.path.splitext(filepath)[1].lower()
+        if (
+            INPUT_FORMATS.get(ext) == "hdf5"
+            and location.get("dataset") is None
+        ):
+            self.open_file(filepath)
+            return
+
+        self._recipe = None
+        self._band_queue = []
+        self._hydrating = None
+        self._filmstrip_wanted = None
+        self.load_image(
+            partial(
+                open_source,
+                filepath,
+                location.get("dataset"),
+                location.get("hdu"),
+            )
+        )
+
+    def open_band_file(self, filepath):
+        """
+        Opens an image file as a new band of the composite.
+
+        A new composite is opened (as a new image) if there isn't one.
+
+        Args:
+            filepath (str): The path to the (single band) image file.
+        """
+        open_func, _ = self._get_open_funcs(filepath)
+        if open_func is None:
+            return
+
+        self._recipe = None
+        self._band_queue = []
+        self._hydrating = None
+        self._filmstrip_wanted = None
+        self.load_image(open_func, as_band=True)
+
+    def _get_open_funcs(self, filepath):
+        """
+        Get the functions opening an image file.
+
+        Args:
+            filepath (str): The path to the image file.
+
+        Returns:
+            tuple: The function returning the image's reader (None if there
+                is nothing to open) and the function returning a quick
+                preview (None if there isn't a quick way).
+        """
+        # The readers' modules are only imported once a file needs them
+        ext = os.path.splitext(filepath)[1].lower()
+        preview_func = None
+        match INPUT_FORMATS.get(ext):
+            case "pil":
+                open_func = self._open_pil(filepath)
+                if ext in (".jpg", ".jpeg"):
+                    preview_func = partial(
+                        READERS["pil"].read_pil_preview, filepath, PREVIEW_SIZE
+                    )
+            case "hdf5":
+                open_func = self._open_hdf5(filepath)
+            case "fits":
+                open_func = self._open_fits(filepath)
+            case _:
+                open_func = None
+
+        return open_func, preview_func
+
+    def load_image(self, open_func, preview_func=None, as_band=False):
+        """
+        Open and prepare an image on a worker thread.
+
+        A preview is shown as soon as one is available and imgOpened is
+        emitted once the image is ready. Any load already in progress is
+        cancelled.
+
+        Args:
+            open_func (callable): A function returning the image's reader.
+            preview_func (callable): An optional function returning a quick
+                low resolution copy of the image.
+            as_band (bool): Whether to add the image to the composite (no
+                preview is shown) rather than replace the current image.
+        """
+        if self._loader is not None:
+            self._loader.cancel()
+
+        loader = ImageLoader(open_func, preview_func, self.auto_limits)
+        if as_band:
+            loader.signals.finished.connect(self.add_band)
+        else:
+            loader.signals.preview.connect(self.show_preview)
+            loader.signals.finished.connect(self.set_loaded_image)
+        loader.signals.failed.connect(self._load_failed)
+        loader.signals.cancelled.connect(self._load_cancelled)
+
+        # Only shown if the load is slow
+        progress = QtWidgets.QProgressDialog(
+            "Opening image...", "Cancel", 0, 100, self
+        )
+        progress.setMinimumDuration(500)
+        progress.setAutoClose(True)
+        progress.canceled.connect(loader.cancel)
+        loader.signals.progress.connect(progress.setValue)
+        loader.signals.finished.connect(progress.deleteLater)
+        loader.signals.failed.connect(progress.deleteLater)
+        loader.signals.cancelled.connect(progress.deleteLater)
+
+        self._loader = loader
+        get_loader_pool().start(loader)
+
+    def _is_current_load(self):
+        """Whether a loader signal came from the most recent load."""
+        sender = self.sender()
+        return (
+            sender is None
+            or self._loader is not None
+            and sender is self._loader.signals
+        )
+
+    def show_preview(self, preview, vmin, vmax):
+        """
+        Show a low resolution preview of an image which is still loading.
+
+        Args:
+            preview (np.ndarray): The low resolution image.
+            vmin (float): The value mapped to black.
+            vmax (float): The value mapped to white.
+        """
+        if not self._is_current_load():
+            return
+
+        # The old image is being replaced
+        self._clear_image()
+
+        pixmap = self._to_pixmap(self.normalizer(preview, vmin, vmax))
+        self._preview_item = QGraphicsPixmapItem(pixmap)
+        self.scene.addItem(self._preview_item)
+        self.scene.setSceneRect(0, 0, preview.shape[1], preview.shape[0])
+        self.fit_image()
+
+    def set_loaded_image(self, loaded):
+        """
+        Display a newly loaded image.
+
+        Args:
+            loaded (LoadedImage): The prepared image.
+        """
+        if not self._is_current_load():
+            loaded.reader.close()
+            return
+        self._loader = None
+        self._show_loaded(loaded)
+
+    def _show_loaded(self, loaded):
+        """
+        Display a prepared image in place of the current image.
+
+        Args:
+            loaded (LoadedImage): The prepared image.
+        """
+        self._clear_image()
+
+        self.img_reader = loaded.reader
+        self.img_arr = loaded.reader
+        self.pil_img = getattr(loaded.reader, "pil_img", None)
+
+        # Cubes are displayed a plane at a time, starting with the first
+        if isinstance(loaded.reader, DataCube):
+            self.cube = loaded.reader
+            self.img_arr = loaded.pyramid.source
 
         self._width = self.img_arr.shape[0]
         self._height = self.img_arr.shape[1]
@@ -97,31 +657,718 @@ class ImageView(QGraphicsView):
             self.img_arr.shape[2] if len(self.img_arr.shape) > 2 else 1
         )
 
-        self.update_vlims(self.img_arr.min(), self.img_arr.max())
+        self.image_id = next(_image_ids)
+        self.pyramid = loaded.pyramid
+        self.display_arr = loaded.overview
+        self.img_sample = loaded.sample
+
+        if self.cube is not None:
+            self.cube_view = "plane"
+            self.plane = 0
+            self._cube_sample = loaded.sample
+            self._view_ids = {0: self.image_id}
+            self.cube.prefetch(0)
+            self.cubeOpened.emit(self.cube.nplanes)
+            self.cubeViewShown.emit("plane", 0)
+
+        # The scene is in source pixel coordinates
+        self.scene.setSceneRect(
+            0, 0, self.img_arr.shape[1], self.img_arr.shape[0]
+        )
+        self.fit_image()
+
+        self.update_vlims(*loaded.limits)
 
         self.update_img()
 
         # Emit a signal to say the image has been opened!
-        self.imgOpened.emit(self.img_arr)
+        self.imgOpened.emit(self.img_sample)
+
+        if self._recipe is not None:
+            recipe, self._recipe = self._recipe, None
+            self.apply_recipe(recipe)
+
+        self._add_to_session(self._reader_name(loaded.reader))
+
+    def add_band(self, loaded):
+        """
+        Add a newly loaded image to the composite as a new band.
+
+        The band becomes the active band (the one the display limits and
+        stretch apply to).
+
+        Args:
+            loaded (LoadedImage): The prepared (single band) image.
+        """
+        if not self._is_current_load():
+            loaded.reader.close()
+            return
+        self._loader = None
+
+        first = self.composite is None
+        if first:
+            self._clear_image()
+            self.composite = Composite()
+
+        try:
+            band = CompositeBand(
+                loaded.reader,
+                loaded.pyramid,
+                name=self._reader_name(loaded.reader),
+                color=self.composite.next_color(),
+                limits=loaded.limits,
+                sample=loaded.sample,
+            )
+            self.composite.add_band(band)
+        except ValueError as err:
+            loaded.reader.close()
+            if len(self.composite) == 0:
+                self.composite = None
+                self._restore_current()
+            QtWidgets.QMessageBox.critical(
+                self, "Add Composite Band", str(err)
+            )
+            return
+
+        if first:
+            self.image_id = next(_image_ids)
+            self.pyramid = self.composite.pyramid
+            self.scene.setSceneRect(
+                0, 0, self.composite.shape[1], self.composite.shape[0]
+            )
+            self.fit_image()
+
+        self.set_active_band(len(self.composite) - 1)
+        self.update_img()
+
+        self.compositeChanged.emit(self.composite)
+
+        # Carry on loading a recipe's bands
+        if self._band_queue:
+            self.load_image(self._band_queue.pop(0), as_band=True)
+        elif self._recipe is not None:
+            recipe, self._recipe = self._recipe, None
+            self.apply_recipe(recipe)
+
+        if first:
+            self._add_to_session("Composite")
+        else:
+            self._enforce_budget()
+
+    def set_active_band(self, index):
+        """
+        Choose the composite band the display limits and stretch apply to.
+
+        Args:
+            index (int): The index of the band.
+        """
+        self.composite.active = index
+        band = self.composite.active_band
+        self.vmin = band.vmin
+        self.vmax = band.vmax
+        self.stretch = band.stretch
+        self.img_sample = band.sample
+
+    def set_band_color(self, index, color):
+        """
+        Change the colour of a composite band.
+
+        Only the blend is redone, no band is normalized again.
+
+        Args:
+            index (int): The index of the band.
+            color (tuple): The (r, g, b) weights of the colour (0-1).
+        """
+        self.composite.set_band_color(index, color)
+        get_scheduler().schedule(self.update_img)
+
+    def set_plane(self, index):
+        """
+        Show a plane of the cube.
+
+        Planes are read (and the planes beyond them read ahead) in the
+        background, the current view stays up until the plane is ready and
+        only the latest plane asked for is shown, so scrubbing never waits
+        on a read.
+
+        Args:
+            index (int): The index of the plane.
+        """
+        if self.cube is None:
+            return
+
+        index = int(np.clip(index, 0, self.cube.nplanes - 1))
+        previous = (
+            self._cube_request[1]
+            if self._cube_request is not None
+            else self.plane
+        )
+        if index != previous:
+            self._scrub_step = 1 if index > previous else -1
+
+        self._cube_request = ("plane", index)
+        self.cube.prefetch(index, self._scrub_step)
+        get_scheduler().schedule(self._show_cube_request)
+
+    def set_cube_view(self, view):
+        """
+        Show a plane of the cube or the cube collapsed along its planes.
+
+        Collapses are computed (once) in the background.
+
+        Args:
+            view (str): "plane" or one of readers.cube.COLLAPSE_OPS.
+        """
+        if self.cube is None:
+            return
+        if view == "plane":
+            self.set_plane(self.plane)
+            return
+
+        self._cube_request = (view, self.plane)
+        self.cube.collapsed_pyramid(view, wait=False)
+        get_scheduler().schedule(self._show_cube_request)
+
+    def _show_cube_request(self):
+        """Show the cube view asked for if it's ready (or check next frame)."""
+        if self.cube is None or self._cube_request is None:
+            return
+        view, index = self._cube_request
+
+        try:
+            if view == "plane":
+                pyramid = self.cube.cached_pyramid(index)
+                if pyramid is None and not self.cube.is_reading(index):
+                    # The read was dropped (or failed), read it here
+                    pyramid = self.cube.plane_pyramid(index)
+            else:
+                pyramid = self.cube.collapsed_pyramid(view, wait=False)
+        except Exception as err:
+            self._cube_request = None
+            QtWidgets.QMessageBox.critical(self, "Data Cube", str(err))
+            return
+
+        if pyramid is None:
+            get_scheduler().schedule(self._show_cube_request)
+            return
+
+        self._cube_request = None
+        new_stats = view != self.cube_view
+        self.cube_view = view
+        self.plane = index
+
+        self.pyramid = pyramid
+        self.img_arr = pyramid.source
+        self.display_arr = pyramid.overview(OVERVIEW_SIZE)
+        key = index if view == "plane" else view
+        if key not in self._view_ids:
+            self._view_ids[key] = next(_image_ids)
+        self.image_id = self._view_ids[key]
+
+        # Planes share the cube's limits, collapses have their own
+        if new_stats:
+            if view == "plane":
+                self.img_sample = self._cube_sample
+            else:
+                self.img_sample = sample_pixels(
+                    pyramid.source, samples_for_accuracy(DEFAULT_RANK_ERROR)
+                )
+            self.update_vlims(
+                *compute_limits(None, self.auto_limits, sample=self.img_sample)
+            )
+            self.imgOpened.emit(self.img_sample)
+        else:
+            self.update_img()
+
+        self.cubeViewShown.emit(view, index)
+
+    def align_bands(self, rotation=False):
+        """
+        Register every composite band with the first band and display
+        them aligned.
+
+        Only coarse pyramid levels and small full resolution windows are
+        read, the aligned bands are resampled as they are displayed.
+
+        Args:
+            rotation (bool): Whether to correct rotations and scalings as
+                well as translations.
+        """
+        if self.composite is None or len(self.composite) < 2:
+            return
+
+        reference = self.composite.bands[0]
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            for index, band in enumerate(self.composite.bands[1:], 1):
+                transform = register(
+                    reference.pyramid, band.pyramid, rotation=rotation
+                )
+                self.composite.set_band_transform(index, transform)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+
+        self.update_img()
+        self.compositeChanged.emit(self.composite)
+
+    def switch_image(self, index):
+        """
+        Show another image open in the session.
+
+        The image shown is kept open, an image which has been evicted is
+        reopened from its source (in the background) with the display
+        settings it had.
+
+        Args:
+            index (int): The position of the image in the session.
+        """
+        entry = self.session.images[index]
+        if entry is self.session.current and (
+            self.pyramid is not None or self._loader is not None
+        ):
+            return
+
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+        self._recipe = None
+        self._band_queue = []
+        self._hydrating = None
+        self._filmstrip_wanted = None
+
+        self._clear_image()
+        self.session.activate(entry)
+        if entry.is_loaded:
+            self._show_state(entry)
+            self._enforce_budget()
+        else:
+            self._hydrating = entry
+            try:
+                self.load_recipe(entry.recipe)
+            except ValueError as err:
+                self._hydrating = None
+                QtWidgets.QMessageBox.critical(self, "Open Image", str(err))
+        self.sessionChanged.emit(self.session)
+
+    def close_image(self, index):
+        """
+        Close an image open in the session.
+
+        If it's the image shown the next image (or the previous one if it
+        was the last) is shown instead.
+
+        Args:
+            index (int): The position of the image in the session.
+        """
+        entry = self.session.images[index]
+        if entry is self.session.current:
+            if self._loader is not None:
+                self._loader.cancel()
+                self._loader = None
+            self._recipe = None
+            self._band_queue = []
+            self._hydrating = None
+            self._filmstrip_wanted = None
+
+            # Bring the image's state up to date so all of it is closed
+            self._clear_image()
+            self.session.remove(entry, self.render_cache)
+            if len(self.session) > 0:
+                self.switch_image(min(index, len(self.session) - 1))
+                return
+            self.filmstrip = None
+            self.prefetcher.clear()
+        else:
+            self.session.remove(entry, self.render_cache)
+        self.sessionChanged.emit(self.session)
+
+    def step_file(self, step):
+        """
+        Show another file from the directory of the image shown.
+
+        The same dataset or HDU is opened in the new file, which replaces
+        the image in its tab (keeping the zoom). The files around it are
+        prepared in the background so stepping again is immediate, and the
+        file stepped away from is kept ready for stepping back.
+
+        Args:
+            step (int): The number of files to move by (negative to go
+                back).
+        """
+        filmstrip = self._current_filmstrip()
+        if filmstrip is None:
+            return
+        shown = filmstrip.path
+        path = filmstrip.step(step)
+        if path is None:
+            return
+
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+        self._recipe = None
+        self._band_queue = []
+
+        # The image stepped away from is kept ready (its tab keeps the
+        # zoom for the new file)
+        entry = self.session.current
+        if self.pyramid is not None:
+            state = self._image_state()
+            self._clear_image()
+            entry.state = None
+            for image_id in state.render_ids:
+                self.render_cache.clear(image_id)
+            if state.cube is None:
+                self.prefetcher.put(
+                    shown,
+                    LoadedImage(
+                        state.reader,
+                        state.pyramid,
+                        state.overview,
+                        state.sample,
+                        (state.vmin, state.vmax),
+                    ),
+                )
+            else:
+                state.close()
+        self._hydrating = entry
+
+        self.prefetcher.auto_limits = self.auto_limits
+        self.prefetcher.set_window(filmstrip.window(step), filmstrip.open_func)
+        self._filmstrip_wanted = path
+        self._show_prefetched(path)
+
+    def _current_filmstrip(self):
+        """
+        Get the filmstrip of the image shown (None for composites and
+        images which don't come from a file).
+        """
+        # Still waiting for the last file stepped to
+        if self._filmstrip_wanted is not None:
+            return self.filmstrip
+
+        if self.img_reader is None or self.composite is not None:
+            return None
+        location = source_location(self.img_reader)
+        if location["source"] is None:
+            return None
+        if self.filmstrip is None or not self.filmstrip.matches(location):
+            self.prefetcher.clear()
+            self.filmstrip = Filmstrip(
+                location["source"],
+                dataset=location.get("dataset"),
+                hdu=location.get("hdu"),
+            )
+        return self.filmstrip
+
+    def _show_prefetched(self, path):
+        """Show a file stepped to if it's the one waited for and ready."""
+        if path != self._filmstrip_wanted:
+            return
+        loaded = self.prefetcher.take(path)
+        if loaded is None:
+            return
+        self._filmstrip_wanted = None
+        self._show_loaded(loaded)
+
+    def _prefetch_failed(self, path, message):
+        """Report a file stepped to which couldn't be opened."""
+        if path != self._filmstrip_wanted:
+            return
+        self._filmstrip_wanted = None
+        self._hydrating = None
+        QtWidgets.QMessageBox.critical(
+            self, "Open Image", message.strip().splitlines()[-1]
+        )
+
+    def _image_state(self):
+        """Everything the image shown holds, as an ImageState."""
+        return ImageState(
+            reader=self.img_reader,
+            image=self.img_arr,
+            pyramid=self.pyramid,
+            overview=self.display_arr,
+            sample=self.img_sample,
+            vmin=self.vmin,
+            vmax=self.vmax,
+            stretch=self.stretch,
+            cmap=self.cmap,
+            composite=self.composite,
+            cube_view=self.cube_view,
+            plane=self.plane,
+            cube_sample=self._cube_sample,
+            image_id=self.image_id,
+            view_ids=self._view_ids,
+        )
+
+    def _show_state(self, entry):
+        """
+        Show an image of the session which is still loaded.
+
+        Args:
+            entry (SessionImage): The image.
+        """
+        state = entry.state
+        self.img_reader = state.reader
+        self.img_arr = state.image
+        self.pil_img = getattr(state.reader, "pil_img", None)
+        self.pyramid = state.pyramid
+        self.display_arr = state.overview
+        self.img_sample = state.sample
+        self.vmin = state.vmin
+        self.vmax = state.vmax
+        self.stretch = state.stretch
+        self.composite = state.composite
+        self.cube = state.cube
+        self.cube_view = state.cube_view
+        self.plane = state.plane
+        self._cube_sample = state.cube_sample
+        self.image_id = state.image_id
+        self._view_ids = state.view_ids
+
+        shape = (
+            self.composite.shape
+            if self.composite is not None
+            else self.img_arr.shape
+        )
+        self._width = shape[0]
+        self._height = shape[1]
+        self._depth = shape[2] if len(shape) > 2 else 1
+        self.scene.setSceneRect(0, 0, shape[1], shape[0])
+        self._restore_view(entry)
+
+        self.set_cmap(state.cmap)
+        if self.composite is not None:
+            self.set_active_band(self.composite.active)
+            self.update_img()
+            self.compositeChanged.emit(self.composite)
+        else:
+            # The tools start from automatic limits, then get the image's
+            self.imgOpened.emit(self.img_sample)
+            self.update_vlims(state.vmin, state.vmax, state.stretch)
+            self.displayChanged.emit(state.vmin, state.vmax, state.stretch)
+
+        if self.cube is not None:
+            self.cubeOpened.emit(self.cube.nplanes)
+            self.cubeViewShown.emit(self.cube_view, self.plane)
+
+    def _restore_view(self, entry):
+        """Zoom and pan to where an image was last viewed (if it was)."""
+        if entry.view_transform is None:
+            self.fit_image()
+            return
+        self.setTransform(entry.view_transform)
+        self.centerOn(entry.view_center)
+        self._fit_to_window = False
+
+    def _restore_current(self):
+        """Show the session's current image again after a failed load."""
+        entry = self.session.current
+        if self.pyramid is None and entry is not None and entry.is_loaded:
+            self._show_state(entry)
+
+    def _add_to_session(self, name):
+        """
+        Record the image just displayed in the session.
+
+        An evicted image being reopened gets its state back, anything else
+        is a new image.
+
+        Args:
+            name (str): The name shown for a new image.
+        """
+        entry, self._hydrating = self._hydrating, None
+        state = self._image_state()
+        if entry is not None and entry in self.session.images:
+            entry.name = name
+            entry.state = state
+            self.session.activate(entry)
+            self._restore_view(entry)
+        else:
+            self.session.add(name, state)
+
+        self._enforce_budget()
+        self.sessionChanged.emit(self.session)
+
+    def _enforce_budget(self):
+        """Evict the images viewed least recently if over budget."""
+        evicted = self.session.enforce_budget(
+            self.render_cache, self._image_state()
+        )
+        if evicted:
+            self.sessionChanged.emit(self.session)
+
+    @staticmethod
+    def _reader_name(reader):
+        """A short name for the image a reader holds."""
+        name = os.path.basename(getattr(reader, "filepath", "band"))
+        if getattr(reader, "key", None) is not None:
+            name += f":{reader.key}"
+        return name
+
+    def _load_failed(self, message):
+        """Report a failed load."""
+        if not self._is_current_load():
+            return
+        self._loader = None
+        self._recipe = None
+        self._band_queue = []
+        self._hydrating = None
+        if self._preview_item is not None:
+            self.scene.removeItem(self._preview_item)
+            self._preview_item = None
+        self._restore_current()
+        QtWidgets.QMessageBox.critical(
+            self, "Open Image", message.strip().splitlines()[-1]
+        )
+
+    def _load_cancelled(self):
+        """Clean up after a cancelled load."""
+        if not self._is_current_load():
+            return
+        self._loader = None
+        self._recipe = None
+        self._band_queue = []
+        self._hydrating = None
+        if self._preview_item is not None:
+            self.scene.removeItem(self._preview_item)
+            self._preview_item = None
+        self._restore_current()
+
+    def _clear_image(self):
+        """
+        Remove the current image (and any preview) from the view.
+
+        The image stays open in the session (what it holds is handed to
+        the session, which closes it once it's evicted or closed).
+        """
+        entry = self.session.current
+        if entry is not None and self.pyramid is not None:
+            entry.state = self._image_state()
+            entry.recipe = self.current_recipe()
+            # A fitted image is refitted when it's shown again
+            entry.view_transform = (
+                None if self._fit_to_window else self.transform()
+            )
+            entry.view_center = self.mapToScene(
+                self.viewport().rect().center()
+            )
+
+        self.img_reader = None
+        self.img_arr = None
+        self.pil_img = None
+        self.pyramid = None
+        self.display_arr = None
+        self.img_sample = None
+        self.composite = None
+        self.image_id = None
+
+        if self.cube is not None:
+            self.cube = None
+            self._cube_request = None
+            self._cube_sample = None
+            self._view_ids = {}
+            self.cubeOpened.emit(0)
+        for item in self._tile_items.values():
+            self.scene.removeItem(item)
+        self._tile_items.clear()
+
+        if self._preview_item is not None:
+            self.scene.removeItem(self._preview_item)
+            self._preview_item = None
 
     def _open_pil(self, filepath):
         """
-        Opens the image file using PIL.
+        Get the function opening an image file using PIL.
 
         Args:
             filepath (str): The path to the image file.
 
         Returns:
-            PIL.Image: The PIL image object.
+            callable: A function returning a PILImage.
         """
-        # Set up the image
-        self.pil_img = Image.open(filepath).convert("L")
-        self.img_arr = np.array(self.pil_img, dtype=np.uint8)
+        return partial(READERS["pil"].PILImage, filepath)
+
+    def _open_hdf5(self, filepath):
+        """
+        Get the function opening a dataset in an HDF5 file as a lazy image.
+
+        If the file contains more than one image dataset the user is asked
+        which one to open. The dataset is not read, only the pixels needed
+        for display are read from disk.
+
+        Args:
+            filepath (str): The path to the HDF5 file.
 
-    def update_vlims(self, vmin, vmax):
+        Returns:
+            callable: A function returning an HDF5Image (None if there is
+                nothing to open).
+        """
+        hdf5 = READERS["hdf5"]
+        keys = hdf5.list_datasets(filepath)
+        if len(keys) == 0:
+            return None
+        elif len(keys) == 1:
+            key = keys[0]
+        else:
+            key, ok = QtWidgets.QInputDialog.getItem(
+                self, "Open HDF5 Dataset", "Dataset:", keys, 0, False
+            )
+            if not ok:
+                return None
+
+        return partial(hdf5.HDF5Image, filepath, key)
+
+    def _open_fits(self, filepath):
+        """
+        Get the function opening an image HDU in a FITS file.
+
+        If the file contains more than one image HDU the user is asked which
+        one to open. Only the headers are read here, pixels are paged in
+        from disk when they are needed for display.
+
+        Args:
+            filepath (str): The path to the FITS file.
+
+        Returns:
+            callable: A function returning a FITSImage (None if there is
+                nothing to open).
+        """
+        fits = READERS["fits"]
+        hdus = fits.list_hdus(filepath)
+        if len(hdus) == 0:
+            return None
+        elif len(hdus) == 1:
+            hdu = hdus[0]
+        else:
+            names = [str(hdu) for hdu in hdus]
+            name, ok = QtWidgets.QInputDialog.getItem(
+                self, "Open FITS HDU", "HDU:", names, 0, False
+            )
+            if not ok:
+                return None
+            hdu = hdus[names.index(name)]
+
+        return partial(fits.FITSImage, filepath, hdu.index)
+
+    def update_vlims(self, vmin, vmax, stretch=None):
         self.vmin = vmin
         self.vmax = vmax
-        self.update_img()
+        if stretch is not None:
+            self.stretch = stretch
+
+        # For composites the limits belong to the active band
+        if self.composite is not None:
+            self.composite.set_band_display(
+                self.composite.active, vmin, vmax, stretch
+            )
+
+        # Show a preview while the limits are changing
+        if self.pyramid is not None:
+            self.begin_interaction()
+
+        # Render in the next frame (once however many changes arrive)
+        get_scheduler().schedule(self.update_img)
 
     def get_image_dimensions(self):
         """
@@ -133,58 +1380,200 @@ class ImageView(QGraphicsView):
         return self.width, self.height
 
     def update_img(self):
-        # Normalize the image data for display
-        normalized_image = self.normalize_image(self.img_arr)
+        """
+        Re-render the visible part of the image.
 
-        # Convert the normalized NumPy array to a QImage
-        height, width = normalized_image.shape
-        bytes_per_channel = normalized_image.itemsize
-        bytes_per_line = bytes_per_channel * width
-        q_image = QImage(
-            normalized_image.data,
-            height,
-            width,
-            bytes_per_line,
-            QImage.Format_Grayscale16
-            if bytes_per_channel == 2
-            else QImage.Format_Grayscale8,
-        )
+        This replaces all the tiles in the scene so should be called whenever
+        the display settings change. Tiles already rendered with the new
+        settings come from the render cache.
+        """
+        get_scheduler().cancel(self.update_img)
+        if self.pyramid is None:
+            return
+
+        # Make sure data dependent stretches are keyed by the new limits
+        self.stretch.update_limits(self.vmin, self.vmax)
+
+        for item in self._tile_items.values():
+            self.scene.removeItem(item)
+        self._tile_items.clear()
+
+        self.update_tiles()
+
+    def begin_interaction(self):
+        """
+        Switch to low resolution previews until the user stops interacting.
+
+        Each call restarts the idle timer, the full resolution render only
+        happens once the timer runs out.
+        """
+        self._interacting = True
+        self._idle_timer.start()
 
-        # Find the non-white region
-        bounding_rect = q_image.rect()
+    def end_interaction(self):
+        """Replace the preview with the full resolution render."""
+        self._idle_timer.stop()
+        if not self._interacting:
+            return
+        self._interacting = False
+        get_scheduler().schedule(self.update_tiles)
+
+    def fit_image(self):
+        """Scale the view so the whole image fills 95% of the widget."""
+        self.resetTransform()
+        self.fitInView(self.sceneRect(), Qt.KeepAspectRatio)
+        self.scale(0.95, 0.95)
+        self._fit_to_window = True
+
+    def update_tiles(self):
+        """
+        Show the tiles covering the viewport at the current zoom.
+
+        Only tiles intersecting the viewport are rendered, at the pyramid
+        level matching the view's transform, so the cost depends on the
+        size of the screen rather than the size of the image.
+        """
+        get_scheduler().cancel(self.update_tiles)
+        if self.pyramid is None or self.vmin is None:
+            return
+
+        level = self.pyramid.level_for_scale(self.transform().m11())
+        if self._interacting:
+            level = min(level + PREVIEW_LEVEL_OFFSET, self.pyramid.nlevels - 1)
+        factor = 2**level
+        tile_span = self.pyramid.tile_size * factor
+        nrows, ncols = self.pyramid.tile_grid(level)
+
+        # Find the range of tiles covering the visible region
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        visible = visible.intersected(self.sceneRect())
+        row_start = max(0, int(visible.top() // tile_span))
+        row_end = min(nrows, int(visible.bottom() // tile_span) + 1)
+        col_start = max(0, int(visible.left() // tile_span))
+        col_end = min(ncols, int(visible.right() // tile_span) + 1)
+
+        needed = {
+            (level, row, col)
+            for row in range(row_start, row_end)
+            for col in range(col_start, col_end)
+        }
+
+        # Remove tiles we no longer need from the scene
+        for key in list(self._tile_items):
+            if key not in needed:
+                self.scene.removeItem(self._tile_items.pop(key))
+
+        # And add any which are missing
+        for key in needed:
+            if key in self._tile_items:
+                continue
+            _, row, col = key
+            item = QGraphicsPixmapItem(self._get_tile_pixmap(key))
+            item.setPos(col * tile_span, row * tile_span)
+            item.setScale(factor)
+            self.scene.addItem(item)
+            self._tile_items[key] = item
+
+    def _get_tile_pixmap(self, key):
+        """
+        Get a rendered tile.
 
-        # Crop the image to the non-white region
-        q_image = q_image.copy(bounding_rect)
+        Args:
+            key (tuple): The (level, row, column) of the tile.
 
-        # Create a QPixmap from the QImage and set it to the QLabel
-        pixmap = QPixmap.fromImage(q_image)
+        Returns:
+            QPixmap: The rendered tile.
+        """
+        return self._to_pixmap(self._get_tile_display(key))
 
-        # Set the desired size for the pixmap relative to the container
-        width = self.width()
-        height = self.height()
-        new_size = QtCore.QSize(int(width * 0.95), int(height * 0.95))
-        pixmap = pixmap.scaled(new_size, QtCore.Qt.KeepAspectRatio)
+    def _get_tile_display(self, key):
+        """
+        Get the normalized display values of a tile, from the render cache if
+        possible.
 
-        if self.image_item:
-            self.scene.removeItem(self.image_item)
+        Args:
+            key (tuple): The (level, row, column) of the tile.
 
-        self.image_item = QGraphicsPixmapItem(pixmap)
-        self.scene.addItem(self.image_item)
+        Returns:
+            np.ndarray: The normalized tile.
+        """
+        if self.composite is not None:
+            cache_key = (self.image_id, self.composite.key) + key
+            display = self.render_cache.get(cache_key)
+            if display is None:
+                display = self.composite.tile(*key)
+                self.render_cache.put(cache_key, display, display.nbytes)
+            return display
+
+        cache_key = (
+            self.image_id,
+            self.vmin,
+            self.vmax,
+            self.stretch.key,
+        ) + key
+        display = self.render_cache.get(cache_key)
+        if display is not None:
+            return display
+
+        # The normalizer reuses its output buffer so keep a copy
+        display = self.normalize_image(self.pyramid.tile(*key)).copy()
+        self.render_cache.put(cache_key, display, display.nbytes)
+
+        return display
+
+    def _to_pixmap(self, normalized_image):
+        """
+        Convert a normalized array to a QPixmap.
+
+        The QImage wraps the array directly, single channel images are shown
+        through the colour table of the current colormap, so the only copy
+        made is Qt's upload of the pixels into the pixmap.
+
+        Args:
+            normalized_image (np.ndarray): The normalized image.
+
+        Returns:
+            QPixmap: The pixmap.
+        """
+        color_table = self.color_table if normalized_image.ndim == 2 else None
+        return QPixmap.fromImage(
+            array_to_qimage(normalized_image, color_table=color_table)
+        )
+
+    def set_cmap(self, name):
+        """
+        Change the colormap used to display single channel images.
+
+        Only the colour table changes, the tiles are not normalized again.
+
+        Args:
+            name (str): The name of the colormap (see render.colormap).
+        """
+        self.cmap = name
+        self.color_table = get_color_table(name)
+
+        for key, item in self._tile_items.items():
+            item.setPixmap(self._get_tile_pixmap(key))
+
+        self.cmapChanged.emit(name)
 
     def normalize_image(self, image_array):
-        # Clip values to vmin and vmax
-        image_array = np.clip(image_array, self.vmin, self.vmax)
+        """
+        Normalize image data to the 8-bit range for display.
+
+        The returned array is a buffer reused by later calls so must be
+        copied (e.g. into a QPixmap) before normalizing anything else.
+
+        Args:
+            image_array (np.ndarray): The image data.
 
-        # Normalize image data to 8-bit range for display
-        min_val = self.vmin
-        max_val = self.vmax
-        normalized_image = (
-            (image_array - min_val) / (max_val - min_val) * 255
-        ).astype(np.uint8)
-        return normalized_image
+        Returns:
+            np.ndarray: The normalized uint8 image.
+        """
+        return self.normalizer(image_array, self.vmin, self.vmax, self.stretch)
 
     def wheelEvent(self, event):
-        if self.image_item is None:
+        if self.pyramid is None:
             return
         # Zoom in or out based on the wheel delta
         factor = 1.2
@@ -192,12 +1581,15 @@ class ImageView(QGraphicsView):
             factor = 1.0 / factor
 
         self.scale(factor, factor)
+        self._fit_to_window = False
+        self.begin_interaction()
+        get_scheduler().schedule(self.update_tiles)
 
         self.transformChanged.emit()
         self.zoomChanged.emit(event)
 
     def mouseMoveEvent(self, event):
-        if self.image_item is None:
+        if self.pyramid is None:
             return
         # Panning with the mouse drag
         if event.buttons() == Qt.LeftButton:
@@ -205,6 +1597,7 @@ class ImageView(QGraphicsView):
             self._pan_start = event.pos()
 
             delta /= self.transform().m11()
+            self._fit_to_window = False
             self.horizontalScrollBar().setValue(
                 self.horizontalScrollBar().value() - delta.x()
             )
@@ -217,7 +1610,7 @@ class ImageView(QGraphicsView):
         self.sceneRectChanged.emit()
 
     def mousePressEvent(self, event):
-        if self.image_item is None:
+        if self.pyramid is None:
             return
         # Start tracking the position for panning
         if event.button() == Qt.LeftButton:
@@ -227,9 +1620,16 @@ class ImageView(QGraphicsView):
 
         self.sceneRectChanged.emit()
 
+    def scrollContentsBy(self, dx, dy):
+        # Panning exposes new tiles
+        super().scrollContentsBy(dx, dy)
+        get_scheduler().schedule(self.update_tiles)
+
     def resizeEvent(self, event):
-        if self.image_item is None:
-            return
-        # Update the view when the widget is resized
         super().resizeEvent(event)
-        self.update_img()
+        if self.pyramid is None:
+            return
+        # Keep the user's zoom and pan, only a fitted image is refitted
+        if self._fit_to_window:
+            self.fit_image()
+        get_scheduler().schedule(self.update_tiles)
@@ -1,7 +1,9 @@
-from PyQt5.QtWidgets import QMenuBar, QMenu, QAction
+from PyQt5.QtWidgets import QMenuBar, QMenu, QAction, QActionGroup
 from PyQt5.QtGui import QFont, QKeySequence
 from PyQt5 import QtCore
 
+from imagemage.render.colormap import COLORMAPS
+
 
 class MenuBar(QMenuBar):
     def __init__(self, main_window):
@@ -23,6 +25,12 @@ class MenuBar(QMenuBar):
         self.menuFile.setObjectName("menuFile")
         self.addAction(self.menuFile.menuAction())
 
+        self.menuView = QMenu(self)
+        self.menuView.setTitle("View")
+        self.menuView.setFont(font)
+        self.menuView.setObjectName("menuView")
+        self.addAction(self.menuView.menuAction())
+
         QtCore.QMetaObject.connectSlotsByName(self)
 
         # Enable opening of image files
@@ -31,6 +39,51 @@ class MenuBar(QMenuBar):
         open_action.setShortcut(QKeySequence("Ctrl+O"))
         self.menuFile.addAction(open_action)
 
+        # Add an image to the RGB composite
+        add_band_action = QAction("Add Composite Band...", self)
+        add_band_action.triggered.connect(self.parent().image_view.open_band)
+        add_band_action.setShortcut(QKeySequence("Ctrl+Shift+O"))
+        self.menuFile.addAction(add_band_action)
+
+        # Step through the files in the directory of the image shown
+        next_file_action = QAction("Next File", self)
+        next_file_action.triggered.connect(
+            lambda: self.parent().image_view.step_file(1)
+        )
+        next_file_action.setShortcut(QKeySequence("Ctrl+Right"))
+        self.menuFile.addAction(next_file_action)
+        prev_file_action = QAction("Previous File", self)
+        prev_file_action.triggered.connect(
+            lambda: self.parent().image_view.step_file(-1)
+        )
+        prev_file_action.setShortcut(QKeySequence("Ctrl+Left"))
+        self.menuFile.addAction(prev_file_action)
+
+        # Export the displayed image at full resolution
+        export_action = QAction("Export...", self)
+        export_action.triggered.connect(self.parent().image_view.export_dialog)
+        export_action.setShortcut(QKeySequence("Ctrl+E"))
+        self.menuFile.addAction(export_action)
+
+        # Save and load the display settings as a recipe
+        save_recipe_action = QAction("Save Recipe...", self)
+        save_recipe_action.triggered.connect(
+            self.parent().image_view.save_recipe_dialog
+        )
+        self.menuFile.addAction(save_recipe_action)
+        load_recipe_action = QAction("Load Recipe...", self)
+        load_recipe_action.triggered.connect(
+            self.parent().image_view.load_recipe_dialog
+        )
+        self.menuFile.addAction(load_recipe_action)
+
+        # Forget the pyramids and statistics cached for reopening images
+        clear_cache_action = QAction("Clear Disk Cache", self)
+        clear_cache_action.triggered.connect(
+            self.parent().image_view.clear_disk_cache
+        )
+        self.menuFile.addAction(clear_cache_action)
+
         # Add a separator
         self.menuFile.addSeparator()
 
@@ -38,3 +91,48 @@ class MenuBar(QMenuBar):
         close_action = QAction("Close", self)
         close_action.triggered.connect(main_window.close)
         self.menuFile.addAction(close_action)
+
+        # Choose the colormap (only one can be selected)
+        image_view = self.parent().image_view
+        self.menuColormap = self.menuView.addMenu("Colormap")
+        self.menuColormap.setFont(font)
+        cmap_group = QActionGroup(self)
+        self.cmap_actions = {}
+        for name in COLORMAPS:
+            cmap_action = QAction(name, self, checkable=True)
+            cmap_action.setChecked(name == image_view.cmap)
+            cmap_action.triggered.connect(
+                lambda checked, name=name: image_view.set_cmap(name)
+            )
+            cmap_group.addAction(cmap_action)
+            self.menuColormap.addAction(cmap_action)
+            self.cmap_actions[name] = cmap_action
+
+        # Align the composite's bands with its first band
+        self.menuAlign = self.menuView.addMenu("Align Composite Bands")
+        self.menuAlign.setFont(font)
+        align_action = QAction("Translation", self)
+        align_action.triggered.connect(
+            lambda: image_view.align_bands(rotation=False)
+        )
+        self.menuAlign.addAction(align_action)
+        align_rotation_action = QAction(
+            "Translation, Rotation and Scale", self
+        )
+        align_rotation_action.triggered.connect(
+            lambda: image_view.align_bands(rotation=True)
+        )
+        self.menuAlign.addAction(align_rotation_action)
+
+        # Show the thumbnails of a directory's images
+        gallery_action = main_window.gallery_dock.toggleViewAction()
+        gallery_action.setShortcut(QKeySequence("Ctrl+G"))
+        self.menuView.addAction(gallery_action)
+
+        # Keep the menu in step with colormaps chosen elsewhere
+        image_view.cmapChanged.connect(self.check_cmap)
+
+    def check_cmap(self, name):
+        """Check a colormap's menu entry (if it has one)."""
+        if name in self.cmap_actions:
+            self.cmap_actions[name].setChecked(True)
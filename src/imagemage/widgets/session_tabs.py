@@ -0,0 +1,75 @@
+"""Definition of the SessionTabs class.
+
+A tab bar with a tab for every image open in the view's session. Images
+evicted to stay within the session's memory budget are greyed out,
+switching to them reopens them from their source.
+"""
+from PyQt5.QtWidgets import QTabBar
+from PyQt5.QtGui import QPalette
+from PyQt5.QtCore import Qt, pyqtSignal
+
+
+class SessionTabs(QTabBar):
+    """
+    The tabs of the images open in a session.
+
+    Attributes:
+        imageSelected (pyqtSignal): Emitted with the position of an image
+            the user switched to.
+        imageClosed (pyqtSignal): Emitted with the position of an image
+            the user closed.
+    """
+
+    imageSelected = pyqtSignal(int)
+    imageClosed = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.setObjectName("SessionTabs")
+        self.setTabsClosable(True)
+        self.setExpanding(False)
+        self.setDocumentMode(True)
+        self.setElideMode(Qt.ElideMiddle)
+
+        self.currentChanged.connect(self._select)
+        self.tabCloseRequested.connect(self.imageClosed.emit)
+
+        # Whether the tabs are being rebuilt (so changes aren't the user's)
+        self._updating = False
+
+    def set_session(self, session):
+        """
+        Show the images open in a session.
+
+        Args:
+            session (Session): The session.
+        """
+        self._updating = True
+        while self.count() > len(session):
+            self.removeTab(self.count() - 1)
+        for index, image in enumerate(session):
+            if index == self.count():
+                self.addTab(image.name)
+            else:
+                self.setTabText(index, image.name)
+
+            # Evicted images are reopened when switched to
+            group = QPalette.Active if image.is_loaded else QPalette.Disabled
+            self.setTabTextColor(
+                index, self.palette().color(group, QPalette.WindowText)
+            )
+            self.setTabToolTip(
+                index,
+                image.name
+                if image.is_loaded
+                else f"{image.name} (unloaded, reopens from disk)",
+            )
+
+        if session.current is not None:
+            self.setCurrentIndex(session.index(session.current))
+        self._updating = False
+
+    def _select(self, index):
+        if not self._updating and index >= 0:
+            self.imageSelected.emit(index)
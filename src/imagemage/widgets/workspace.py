@@ -6,14 +6,27 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import QPoint, pyqtSignal
 
-from ..tools.hist import HistogramWidget
-from ..tools.zoom import ZoomWidget
+from imagemage.registry import LazyRegistry
+from imagemage.render.scheduler import get_scheduler
+
+# The widget of each tool (its module is imported when the tool is first
+# selected, not when the window opens)
+TOOLS = LazyRegistry(
+    {
+        "Histogram": "imagemage.tools.hist:HistogramWidget",
+        "ZoomView": "imagemage.tools.zoom:ZoomWidget",
+    }
+)
 
 
 class Workspace(QFrame):
     # Create signals to emit emit changes to the image.
-    histChanged = pyqtSignal(float, float)
+    histChanged = pyqtSignal(float, float, object)
     imgOpened = pyqtSignal(np.ndarray)
+    compositeChanged = pyqtSignal(object)
+    displayChanged = pyqtSignal(float, float, object)
+    bandSelected = pyqtSignal(int)
+    bandColorChanged = pyqtSignal(int, object)
 
     def __init__(self, parent=None):
         super(Workspace, self).__init__(parent)
@@ -51,10 +64,10 @@ class Workspace(QFrame):
     def createWidget(self, tool_name):
         match tool_name:
             case "Histogram":
-                return HistogramWidget(self, preview=True)
+                return TOOLS["Histogram"](self, preview=True)
             case "ZoomView":
                 return QLabel("Zoom Widget")
-                return ZoomWidget()
+                return TOOLS["ZoomView"]()
             case _:
                 return QLabel("Placeholder Widget")
 
@@ -79,16 +92,27 @@ class Workspace(QFrame):
         self.nextWidgetPosition(widget.size())
 
         # Connect any signals we need to propagate up.
-        if isinstance(widget, HistogramWidget):
+        hist_widget = TOOLS.loaded("Histogram")
+        if hist_widget is not None and isinstance(widget, hist_widget):
             widget.histChanged.connect(self.emit_hist_signal)
+            widget.bandSelected.connect(self.bandSelected.emit)
+            widget.bandColorChanged.connect(self.bandColorChanged.emit)
             self.imgOpened.connect(widget.set_img_data)
+            self.compositeChanged.connect(widget.set_composite)
+            self.displayChanged.connect(widget.set_display)
 
-    def emit_hist_signal(self, low, high):
-        self.histChanged.emit(low, high)
+    def emit_hist_signal(self, low, high, stretch):
+        self.histChanged.emit(low, high, stretch)
 
     def emit_img_loaded(self, img_arr):
         self.imgOpened.emit(img_arr)
 
+    def emit_composite_changed(self, composite):
+        self.compositeChanged.emit(composite)
+
+    def emit_display_changed(self, vmin, vmax, stretch):
+        self.displayChanged.emit(vmin, vmax, stretch)
+
     def nextWidgetPosition(self, size):
         column_span = int(size.width() / self.col_width)
         row_span = int(size.height() / self.row_height)
@@ -115,8 +139,8 @@ class Workspace(QFrame):
         # Resize the workspace
         self.resize(int(0.5 * size.width()), size.height())
 
-        # Resort the widgets onto the grid
-        self.update_grid_pos()
+        # Resort the widgets onto the grid (once per frame while resizing)
+        get_scheduler().schedule(self.update_grid_pos)
 
     def update_grid_pos(self):
         # Clear the layout and get the widgets
@@ -0,0 +1,358 @@
+"""Streaming export of displayed images and composites.
+
+The image is rendered at full resolution a strip of rows at a time, read
+from the (lazy) source, normalized with the same Normalizer the viewer
+uses and handed straight to a streaming writer for the chosen format. The
+full normalized image never exists in memory, peak memory is bounded by
+the strip size.
+
+Supported formats (chosen by the file extension):
+
+    - PNG (.png)
+    - TIFF (.tif, .tiff), BigTIFF for images over 4 GB
+    - HDF5 (.h5, .hdf5)
+    - FITS (.fits, .fit, .fts)
+
+Example usage:
+
+    export_image("out.tif", reader, vmin, vmax, get_stretch("asinh"))
+    export_composite("rgb.png", composite)
+    export_recipe("out.png", Recipe.load("mosaic.toml"))
+"""
+import os
+
+import numpy as np
+
+from imagemage.readers.formats import open_source
+from imagemage.render.colormap import get_color_table
+from imagemage.render.composite import Composite, CompositeBand
+from imagemage.render.normalize import Normalizer
+from imagemage.render.recipe import resolve_display
+from imagemage.render.registration import Transform
+from imagemage.registry import LazyRegistry
+
+# The default maximum number of bytes used to render one strip
+DEFAULT_STRIP_BYTES = 64 * 2**20
+
+# The format written for each file extension
+EXPORT_FORMATS = {
+    ".png": "png",
+    ".tif": "tiff",
+    ".tiff": "tiff",
+    ".h5": "hdf5",
+    ".hdf5": "hdf5",
+    ".fits": "fits",
+    ".fit": "fits",
+    ".fts": "fits",
+}
+
+# The writer of each format (imported when first exported to)
+WRITERS = LazyRegistry(
+    {
+        "png": "imagemage.writers.png:PNGWriter",
+        "tiff": "imagemage.writers.tiff:TIFFWriter",
+        "hdf5": "imagemage.writers.hdf5:HDF5Writer",
+        "fits": "imagemage.writers.fits:FITSWriter",
+    }
+)
+
+
+class ExportCancelled(Exception):
+    """Raised (e.g. by a progress callback) to abandon an export."""
+
+
+def palette_from_color_table(color_table):
+    """
+    Convert a QImage colour table to an RGB palette.
+
+    Args:
+        color_table (list): The 256 QRgb (0xAARRGGBB) values.
+
+    Returns:
+        np.ndarray: The (256, 3) uint8 palette.
+    """
+    table = np.asarray(color_table, dtype=np.uint32)
+    return np.stack(
+        [(table >> 16) & 255, (table >> 8) & 255, table & 255], axis=1
+    ).astype(np.uint8)
+
+
+def strip_rows(row_bytes, nrows, strip_bytes=DEFAULT_STRIP_BYTES):
+    """
+    Get the number of rows rendered at once.
+
+    Args:
+        row_bytes (int): The memory needed to render one row.
+        nrows (int): The number of rows in the image.
+        strip_bytes (int): The memory available for one strip.
+
+    Returns:
+        int: The number of rows in a strip.
+    """
+    return int(min(nrows, max(1, strip_bytes // max(row_bytes, 1))))
+
+
+def open_writer(filepath, shape, palette=None, bigtiff=None, attrs=None):
+    """
+    Open the streaming writer for a file's format.
+
+    Args:
+        filepath (str): The path to the output file.
+        shape (tuple): The (rows, columns[, channels]) of the image.
+        palette (np.ndarray): An optional (256, 3) uint8 palette for single
+            channel images (PNG, TIFF and HDF5 only).
+        bigtiff (bool): Whether to write a BigTIFF (automatic if None).
+        attrs (dict): Metadata about the export (HDF5 attributes or FITS
+            header cards).
+
+    Returns:
+        object: The writer.
+
+    Raises:
+        ValueError: If the format isn't supported.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    fmt = EXPORT_FORMATS.get(ext)
+    match fmt:
+        case "png":
+            return WRITERS["png"](filepath, shape, palette=palette)
+        case "tiff":
+            return WRITERS["tiff"](
+                filepath, shape, palette=palette, bigtiff=bigtiff
+            )
+        case "hdf5":
+            return WRITERS["hdf5"](
+                filepath, shape, palette=palette, attrs=attrs
+            )
+        case "fits":
+            cards = [
+                (key[:8], value, None) for key, value in (attrs or {}).items()
+            ]
+            return WRITERS["fits"](filepath, shape, cards=cards)
+        case _:
+            raise ValueError(f"Can't export to {ext or filepath} files")
+
+
+def _export(filepath, shape, render_rows, rows_per_strip, progress, **kwargs):
+    """
+    Render an image a strip at a time and stream it to a file.
+
+    Args:
+        filepath (str): The path to the output file.
+        shape (tuple): The (rows, columns[, channels]) of the image.
+        render_rows (callable): Returns the uint8 display values of the
+            rows from start to end.
+        rows_per_strip (int): The number of rows rendered at once.
+        progress (callable): An optional function called with the
+            fraction written after each strip, it can raise
+            ExportCancelled to stop the export.
+        **kwargs: Passed to open_writer.
+    """
+    writer = open_writer(filepath, shape, **kwargs)
+    try:
+        nrows = shape[0]
+        for start in range(0, nrows, rows_per_strip):
+            end = min(start + rows_per_strip, nrows)
+            writer.write_rows(render_rows(start, end))
+            if progress is not None:
+                progress(end / nrows)
+        writer.close()
+
+    except BaseException:
+        # Don't leave a partial file behind
+        writer.close()
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+
+def export_image(
+    filepath,
+    source,
+    vmin,
+    vmax,
+    stretch=None,
+    color_table=None,
+    strip_bytes=DEFAULT_STRIP_BYTES,
+    bigtiff=None,
+    progress=None,
+):
+    """
+    Export an image with the given display settings at full resolution.
+
+    Args:
+        filepath (str): The path to the output file (the format is taken
+            from the extension).
+        source (array-like): The image, can be lazy.
+        vmin (float): The value mapped to black.
+        vmax (float): The value mapped to white.
+        stretch (Stretch): The stretch to apply (linear if None).
+        color_table (list): An optional QImage colour table (the colormap),
+            written as a palette where the format supports one.
+        strip_bytes (int): The memory available for one strip.
+        bigtiff (bool): Whether to write a BigTIFF (automatic if None).
+        progress (callable): An optional function called with the
+            fraction written after each strip, it can raise
+            ExportCancelled to stop the export.
+    """
+    normalizer = Normalizer()
+    shape = tuple(source.shape)
+    channels = shape[2] if len(shape) > 2 else 1
+
+    def render_rows(start, end):
+        return normalizer(np.asarray(source[start:end]), vmin, vmax, stretch)
+
+    # The source rows, the float scratch and the output (plus the writer's
+    # copy of the output)
+    row_bytes = shape[1] * channels * (source.dtype.itemsize + 4 + 2)
+
+    palette = None
+    if color_table is not None and channels == 1:
+        palette = palette_from_color_table(color_table)
+
+    attrs = {"VMIN": vmin, "VMAX": vmax}
+    if stretch is not None:
+        attrs["STRETCH"] = stretch.name
+        if stretch.param is not None:
+            attrs["SPARAM"] = stretch.param
+
+    _export(
+        filepath,
+        shape,
+        render_rows,
+        strip_rows(row_bytes, shape[0], strip_bytes),
+        progress,
+        palette=palette,
+        bigtiff=bigtiff,
+        attrs=attrs,
+    )
+
+
+def export_composite(
+    filepath,
+    composite,
+    strip_bytes=DEFAULT_STRIP_BYTES,
+    bigtiff=None,
+    progress=None,
+):
+    """
+    Export an RGB composite at full resolution.
+
+    Args:
+        filepath (str): The path to the output file (the format is taken
+            from the extension).
+        composite (Composite): The composite.
+        strip_bytes (int): The memory available for one strip.
+        bigtiff (bool): Whether to write a BigTIFF (automatic if None).
+        progress (callable): An optional function called with the
+            fraction written after each strip, it can raise
+            ExportCancelled to stop the export.
+    """
+    shape = tuple(composite.shape) + (3,)
+
+    def render_rows(start, end):
+        return composite.render(rows=slice(start, end))
+
+    # Each band's source rows (and resampled rows if it's aligned), float
+    # scratch and normalized rows, then the RGB output (plus the writer's
+    # copy of it)
+    row_bytes = shape[1] * (
+        sum(
+            band.source.dtype.itemsize
+            + (4 if band.image is not band.source else 0)
+            + 4
+            + 1
+            for band in composite.bands
+        )
+        + 3 * 2
+    )
+
+    _export(
+        filepath,
+        shape,
+        render_rows,
+        strip_rows(row_bytes, shape[0], strip_bytes),
+        progress,
+        bigtiff=bigtiff,
+        attrs={"NBANDS": len(composite)},
+    )
+
+
+def export_recipe(
+    filepath,
+    recipe,
+    source=None,
+    strip_bytes=DEFAULT_STRIP_BYTES,
+    bigtiff=None,
+    progress=None,
+):
+    """
+    Render a recipe at full resolution and export it.
+
+    Args:
+        filepath (str): The path to the output file (the format is taken
+            from the extension).
+        recipe (Recipe): The recipe.
+        source (str): The image file to render (the recipe's source if
+            None), display only recipes must be given one.
+        strip_bytes (int): The memory available for one strip.
+        bigtiff (bool): Whether to write a BigTIFF (automatic if None).
+        progress (callable): An optional function called with the
+            fraction written after each strip, it can raise
+            ExportCancelled to stop the export.
+    """
+    source = source if source is not None else recipe.source
+
+    if recipe.is_composite:
+        composite = Composite()
+        try:
+            for band_recipe in recipe.bands:
+                band_source = band_recipe.source or source
+                if band_source is None:
+                    raise ValueError("The recipe doesn't name a source file")
+                reader = open_source(
+                    band_source, band_recipe.dataset, band_recipe.hdu
+                )
+                try:
+                    band = CompositeBand(reader, color=band_recipe.color)
+                    composite.add_band(band)
+                except ValueError:
+                    reader.close()
+                    raise
+                if band_recipe.transform is not None:
+                    composite.set_band_transform(
+                        len(composite) - 1,
+                        Transform.from_dict(band_recipe.transform),
+                    )
+                band.set_display(
+                    *resolve_display(band_recipe, reader, sample=band.sample)
+                )
+            export_composite(
+                filepath,
+                composite,
+                strip_bytes=strip_bytes,
+                bigtiff=bigtiff,
+                progress=progress,
+            )
+        finally:
+            composite.close()
+        return
+
+    if source is None:
+        raise ValueError("The recipe doesn't name a source file")
+    reader = open_source(source, recipe.dataset, recipe.hdu)
+    try:
+        vmin, vmax, stretch = resolve_display(recipe, reader)
+        export_image(
+            filepath,
+            reader,
+            vmin,
+            vmax,
+            stretch,
+            color_table=get_color_table(recipe.cmap),
+            strip_bytes=strip_bytes,
+            bigtiff=bigtiff,
+            progress=progress,
+        )
+    finally:
+        reader.close()
@@ -0,0 +1,132 @@
+"""Definition of the FITSWriter class.
+
+A minimal streaming FITS encoder for 8 bit images. The header is written
+up front, the file is then extended to its final size and the data unit is
+memory mapped, so rows are written straight to disk as they arrive. Colour
+images are written as a cube of planes (NAXIS3 = channels), the mapping
+lets each strip write its part of every plane.
+
+Rows are written in the order they are given (the order FITSImage reads
+them back in).
+
+Example usage:
+
+    writer = FITSWriter("image.fits", (nrows, ncols))
+    for strip in strips:
+        writer.write_rows(strip)
+    writer.close()
+"""
+import numpy as np
+
+from imagemage.readers.fits import BLOCK_SIZE, CARD_SIZE
+
+
+def format_card(keyword, value, comment=None):
+    """
+    Format a fixed format FITS header card.
+
+    Args:
+        keyword (str): The keyword (at most 8 characters).
+        value (bool/int/float/str): The value.
+        comment (str): An optional comment.
+
+    Returns:
+        str: The 80 character card.
+    """
+    if isinstance(value, bool):
+        value = "T" if value else "F"
+    elif isinstance(value, str):
+        value = "'" + value.replace("'", "''").ljust(8) + "'"
+        value = value.ljust(20)
+    else:
+        value = str(value)
+
+    card = f"{keyword.upper():<8}= {value:>20}"
+    if comment:
+        card += f" / {comment}"
+    return card[:CARD_SIZE].ljust(CARD_SIZE)
+
+
+class FITSWriter:
+    """
+    Writes an 8 bit FITS image a strip of rows at a time.
+
+    Attributes:
+        filepath (str): The path to the output file.
+        shape (tuple): The (rows, columns[, channels]) of the image.
+        rows_written (int): The number of rows written so far.
+    """
+
+    def __init__(self, filepath, shape, cards=()):
+        """
+        Write the header and map the data unit.
+
+        Args:
+            filepath (str): The path to the output file.
+            shape (tuple): The (rows, columns[, channels]) of the image.
+            cards (list): Extra (keyword, value, comment) header cards.
+        """
+        self.filepath = filepath
+        self.shape = tuple(shape)
+        self.rows_written = 0
+
+        nrows, ncols = self.shape[:2]
+        channels = self.shape[2] if len(self.shape) > 2 else 1
+
+        header = [
+            format_card("SIMPLE", True, "conforms to FITS standard"),
+            format_card("BITPIX", 8, "array data type"),
+            format_card("NAXIS", 2 if channels == 1 else 3),
+            format_card("NAXIS1", ncols),
+            format_card("NAXIS2", nrows),
+        ]
+        if channels > 1:
+            header.append(format_card("NAXIS3", channels))
+        header += [format_card(*card) for card in cards]
+        header.append("END".ljust(CARD_SIZE))
+        header = "".join(header).encode("ascii")
+        header = header.ljust(-(-len(header) // BLOCK_SIZE) * BLOCK_SIZE)
+
+        # The data unit is padded to a whole number of blocks (with zeros)
+        data_size = nrows * ncols * channels
+        padded_size = -(-data_size // BLOCK_SIZE) * BLOCK_SIZE
+        with open(filepath, "wb") as f:
+            f.write(header)
+            f.truncate(len(header) + padded_size)
+
+        # Planes of (rows, columns) for colour images
+        data_shape = (
+            (nrows, ncols) if channels == 1 else (channels, nrows, ncols)
+        )
+        self._data = np.memmap(
+            filepath,
+            dtype=np.uint8,
+            mode="r+",
+            offset=len(header),
+            shape=data_shape,
+        )
+
+    def write_rows(self, rows):
+        """
+        Write the next rows of the image.
+
+        Args:
+            rows (np.ndarray): The (n, columns[, channels]) uint8 rows.
+        """
+        start = self.rows_written
+        end = start + rows.shape[0]
+        if rows.ndim == 2:
+            self._data[start:end] = rows
+        else:
+            self._data[:, start:end] = np.moveaxis(rows, -1, 0)
+
+        # Write the rows out rather than letting dirty pages build up
+        self._data.flush()
+        self.rows_written = end
+
+    def close(self):
+        """Flush and unmap the data unit."""
+        if self._data is None:
+            return
+        self._data.flush()
+        self._data = None
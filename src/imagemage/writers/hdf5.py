@@ -0,0 +1,81 @@
+"""Definition of the HDF5Writer class.
+
+Writes an 8 bit image into a chunked HDF5 dataset a strip of rows at a
+time, so an image of any size can be written without ever holding more
+than the rows being written.
+
+Example usage:
+
+    writer = HDF5Writer("image.h5", (nrows, ncols), key="image")
+    for strip in strips:
+        writer.write_rows(strip)
+    writer.close()
+"""
+import h5py
+import numpy as np
+
+from imagemage.readers.hdf5 import DEFAULT_TILE_SHAPE
+
+
+class HDF5Writer:
+    """
+    Writes an 8 bit image to an HDF5 dataset a strip of rows at a time.
+
+    Attributes:
+        filepath (str): The path to the output file.
+        shape (tuple): The (rows, columns[, channels]) of the image.
+        dataset (h5py.Dataset): The dataset being written.
+        rows_written (int): The number of rows written so far.
+    """
+
+    def __init__(self, filepath, shape, key="image", palette=None, attrs=None):
+        """
+        Create the file and the (chunked) dataset.
+
+        Args:
+            filepath (str): The path to the output file.
+            shape (tuple): The (rows, columns[, channels]) of the image.
+            key (str): The name of the dataset.
+            palette (np.ndarray): An optional (256, 3) uint8 palette, stored
+                alongside the image as "<key>_palette".
+            attrs (dict): Optional attributes to attach to the dataset.
+        """
+        self.filepath = filepath
+        self.shape = tuple(shape)
+        self.rows_written = 0
+
+        # Chunk in the same tiles the viewer reads
+        chunks = (
+            tuple(
+                min(size, n) for size, n in zip(DEFAULT_TILE_SHAPE, self.shape)
+            )
+            + self.shape[2:]
+        )
+
+        self.file = h5py.File(filepath, "w")
+        self.dataset = self.file.create_dataset(
+            key, shape=self.shape, dtype=np.uint8, chunks=chunks
+        )
+        for name, value in (attrs or {}).items():
+            self.dataset.attrs[name] = value
+        if palette is not None:
+            self.file.create_dataset(
+                f"{key}_palette", data=np.asarray(palette, dtype=np.uint8)
+            )
+
+    def write_rows(self, rows):
+        """
+        Write the next rows of the image.
+
+        Args:
+            rows (np.ndarray): The (n, columns[, channels]) uint8 rows.
+        """
+        start = self.rows_written
+        end = start + rows.shape[0]
+        self.dataset[start:end] = rows
+        self.rows_written = end
+
+    def close(self):
+        """Close the file."""
+        if self.file.id.valid:
+            self.file.close()
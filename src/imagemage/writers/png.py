@@ -0,0 +1,126 @@
+"""Definition of the PNGWriter class.
+
+A minimal streaming PNG encoder. Rows are compressed with a single zlib
+stream as they arrive and written out as IDAT chunks, so an image of any
+size can be written without ever holding more than the rows being written.
+
+Only 8 bit images are written: grayscale, RGB, RGBA or (given a palette)
+palette indexed.
+
+Example usage:
+
+    writer = PNGWriter("image.png", (nrows, ncols))
+    for strip in strips:
+        writer.write_rows(strip)
+    writer.close()
+"""
+import struct
+import zlib
+
+import numpy as np
+
+# The bytes every PNG file starts with
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# The PNG colour type for each number of channels
+COLOR_TYPES = {1: 0, 3: 2, 4: 6}
+
+# The PNG colour type of palette images
+PALETTE_COLOR_TYPE = 3
+
+# The default zlib compression level (0-9)
+DEFAULT_COMPRESS_LEVEL = 6
+
+
+class PNGWriter:
+    """
+    Writes an 8 bit PNG a strip of rows at a time.
+
+    Attributes:
+        filepath (str): The path to the output file.
+        shape (tuple): The (rows, columns[, channels]) of the image.
+        rows_written (int): The number of rows written so far.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        shape,
+        palette=None,
+        compress_level=DEFAULT_COMPRESS_LEVEL,
+    ):
+        """
+        Write the PNG header.
+
+        Args:
+            filepath (str): The path to the output file.
+            shape (tuple): The (rows, columns[, channels]) of the image.
+            palette (np.ndarray): An optional (256, 3) uint8 palette, single
+                channel images are then written as palette indices.
+            compress_level (int): The zlib compression level (0-9).
+        """
+        self.filepath = filepath
+        self.shape = tuple(shape)
+        self.rows_written = 0
+
+        nrows, ncols = self.shape[:2]
+        channels = self.shape[2] if len(self.shape) > 2 else 1
+        if channels not in COLOR_TYPES:
+            raise ValueError(f"Can't write a PNG with {channels} channels")
+        if palette is not None and channels == 1:
+            color_type = PALETTE_COLOR_TYPE
+        else:
+            color_type = COLOR_TYPES[channels]
+        self._row_bytes = ncols * channels
+
+        self.file = open(filepath, "wb")
+        self.file.write(PNG_SIGNATURE)
+        self._write_chunk(
+            b"IHDR",
+            struct.pack(">IIBBBBB", ncols, nrows, 8, color_type, 0, 0, 0),
+        )
+        if color_type == PALETTE_COLOR_TYPE:
+            self._write_chunk(
+                b"PLTE", np.asarray(palette, dtype=np.uint8).tobytes()
+            )
+
+        self._compressor = zlib.compressobj(compress_level)
+
+        # Reused buffer of rows each preceded by their filter type
+        self._buffer = None
+
+    def _write_chunk(self, chunk_type, data):
+        """Write a PNG chunk (length, type, data and CRC)."""
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        crc = zlib.crc32(data, zlib.crc32(chunk_type))
+        self.file.write(struct.pack(">I", crc & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        """
+        Write the next rows of the image.
+
+        Args:
+            rows (np.ndarray): The (n, columns[, channels]) uint8 rows.
+        """
+        nrows = rows.shape[0]
+        if self._buffer is None or self._buffer.shape[0] < nrows:
+            self._buffer = np.zeros((nrows, self._row_bytes + 1), np.uint8)
+
+        # Every row starts with its filter type (0, no filtering)
+        buffer = self._buffer[:nrows]
+        buffer[:, 1:] = rows.reshape(nrows, self._row_bytes)
+
+        data = self._compressor.compress(buffer)
+        if data:
+            self._write_chunk(b"IDAT", data)
+        self.rows_written += nrows
+
+    def close(self):
+        """Finish the compressed stream and the file."""
+        if self.file.closed:
+            return
+        self._write_chunk(b"IDAT", self._compressor.flush())
+        self._write_chunk(b"IEND", b"")
+        self.file.close()
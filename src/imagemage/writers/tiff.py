@@ -0,0 +1,198 @@
+"""Definition of the TIFFWriter class.
+
+A minimal streaming TIFF encoder. Each strip of rows is written straight to
+the file as an uncompressed TIFF strip and the image file directory (which
+lists where the strips are) is written once all the strips are known, so
+an image of any size can be written without ever holding more than the
+rows being written.
+
+Files too large for the 32 bit offsets of classic TIFF are written as
+BigTIFF (64 bit offsets).
+
+Example usage:
+
+    writer = TIFFWriter("mosaic.tif", (nrows, ncols, 3))
+    for strip in strips:
+        writer.write_rows(strip)
+    writer.close()
+"""
+import struct
+
+import numpy as np
+
+# The largest file written as classic TIFF by default (leaving room for the
+# directory), larger files are written as BigTIFF
+CLASSIC_TIFF_LIMIT = 2**32 - 2**20
+
+# TIFF field types and their struct codes
+SHORT = 3
+LONG = 4
+LONG8 = 16
+TYPE_CODES = {SHORT: "H", LONG: "I", LONG8: "Q"}
+
+# The TIFF tags written
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+STRIP_BYTE_COUNTS = 279
+PLANAR_CONFIGURATION = 284
+COLOR_MAP = 320
+EXTRA_SAMPLES = 338
+
+# Photometric interpretations
+MIN_IS_BLACK = 1
+RGB = 2
+PALETTE = 3
+
+
+class TIFFWriter:
+    """
+    Writes an 8 bit TIFF (or BigTIFF) a strip of rows at a time.
+
+    Every call to write_rows except the last must write the same number of
+    rows (that number becomes the TIFF's RowsPerStrip).
+
+    Attributes:
+        filepath (str): The path to the output file.
+        shape (tuple): The (rows, columns[, channels]) of the image.
+        bigtiff (bool): Whether the file is a BigTIFF.
+        rows_written (int): The number of rows written so far.
+    """
+
+    def __init__(self, filepath, shape, palette=None, bigtiff=None):
+        """
+        Write the TIFF header.
+
+        Args:
+            filepath (str): The path to the output file.
+            shape (tuple): The (rows, columns[, channels]) of the image.
+            palette (np.ndarray): An optional (256, 3) uint8 palette, single
+                channel images are then written as palette indices.
+            bigtiff (bool): Whether to write a BigTIFF (only if the image
+                is too large for classic TIFF if None).
+        """
+        self.filepath = filepath
+        self.shape = tuple(shape)
+        self.rows_written = 0
+        self.palette = palette
+
+        nbytes = int(np.prod(self.shape))
+        self.bigtiff = (
+            nbytes > CLASSIC_TIFF_LIMIT if bigtiff is None else bigtiff
+        )
+
+        self._strip_offsets = []
+        self._strip_byte_counts = []
+        self._rows_per_strip = None
+
+        # The header ends with the offset of the first directory, which is
+        # filled in by close
+        self.file = open(filepath, "wb")
+        if self.bigtiff:
+            self.file.write(b"II+\x00" + struct.pack("<HH", 8, 0))
+            self._ifd_pointer = self.file.tell()
+            self.file.write(struct.pack("<Q", 0))
+        else:
+            self.file.write(b"II*\x00")
+            self._ifd_pointer = self.file.tell()
+            self.file.write(struct.pack("<I", 0))
+
+    def write_rows(self, rows):
+        """
+        Write the next rows of the image as one strip.
+
+        Args:
+            rows (np.ndarray): The (n, columns[, channels]) uint8 rows.
+        """
+        if self._rows_per_strip is None:
+            self._rows_per_strip = rows.shape[0]
+
+        rows = np.ascontiguousarray(rows, dtype=np.uint8)
+        self._strip_offsets.append(self.file.tell())
+        self._strip_byte_counts.append(rows.nbytes)
+        self.file.write(rows.data)
+        self.rows_written += rows.shape[0]
+
+    def _tags(self):
+        """Get the (tag, type, values) of the image's directory."""
+        nrows, ncols = self.shape[:2]
+        channels = self.shape[2] if len(self.shape) > 2 else 1
+        offset_type = LONG8 if self.bigtiff else LONG
+
+        if channels == 1 and self.palette is not None:
+            photometric = PALETTE
+        elif channels == 1:
+            photometric = MIN_IS_BLACK
+        else:
+            photometric = RGB
+
+        tags = [
+            (IMAGE_WIDTH, LONG, [ncols]),
+            (IMAGE_LENGTH, LONG, [nrows]),
+            (BITS_PER_SAMPLE, SHORT, [8] * channels),
+            (COMPRESSION, SHORT, [1]),
+            (PHOTOMETRIC, SHORT, [photometric]),
+            (STRIP_OFFSETS, offset_type, self._strip_offsets),
+            (SAMPLES_PER_PIXEL, SHORT, [channels]),
+            (ROWS_PER_STRIP, LONG, [self._rows_per_strip or nrows]),
+            (STRIP_BYTE_COUNTS, offset_type, self._strip_byte_counts),
+            (PLANAR_CONFIGURATION, SHORT, [1]),
+        ]
+        if photometric == PALETTE:
+            # All the reds, then greens, then blues scaled to 16 bits
+            palette = np.asarray(self.palette, dtype=np.uint16) * 257
+            tags.append((COLOR_MAP, SHORT, palette.T.ravel().tolist()))
+        if channels == 4:
+            # The fourth channel is (unassociated) alpha
+            tags.append((EXTRA_SAMPLES, SHORT, [2]))
+
+        return tags
+
+    def close(self):
+        """Write the image file directory and close the file."""
+        if self.file.closed:
+            return
+
+        if self.bigtiff:
+            count_code, inline_size = "Q", 8
+        else:
+            count_code, inline_size = "I", 4
+
+        # Values which don't fit in an entry are written before the
+        # directory and the entry holds their offset
+        entries = []
+        for tag, field_type, values in self._tags():
+            data = struct.pack(
+                f"<{len(values)}{TYPE_CODES[field_type]}", *values
+            )
+            if len(data) <= inline_size:
+                value = data.ljust(inline_size, b"\x00")
+            else:
+                if self.file.tell() % 2:
+                    self.file.write(b"\x00")
+                offset = self.file.tell()
+                self.file.write(data)
+                value = struct.pack(f"<{count_code}", offset)
+            entries.append(
+                struct.pack(f"<HH{count_code}", tag, field_type, len(values))
+                + value
+            )
+
+        if self.file.tell() % 2:
+            self.file.write(b"\x00")
+        ifd_offset = self.file.tell()
+        self.file.write(
+            struct.pack(f"<{'Q' if self.bigtiff else 'H'}", len(entries))
+        )
+        self.file.write(b"".join(entries))
+        self.file.write(struct.pack(f"<{count_code}", 0))
+
+        # Point the header at the directory
+        self.file.seek(self._ifd_pointer)
+        self.file.write(struct.pack(f"<{count_code}", ifd_offset))
+        self.file.close()